@@ -7,38 +7,57 @@ It handles deduplication, generates summaries only for new emails, and updates s
 
 Usage:
 1. Place your new .mbox file in attached_assets/
-2. Run: python add_mbox.py
+2. Run: python add_mbox.py  (add --workers 0 to parse on every CPU core)
+   Messages whose headers already match the index are skipped before
+   parsing; pass --no-prescan to fully parse every message instead.
+   Add --sqlite to insert new emails straight into data/knowledge.db
+   (no migrate_to_sqlite.py run needed), and --no-json to skip writing
+   parsed_emails.json.
 
 The script will:
 - Load existing parsed_emails.json (if any)
-- Parse the new mbox file
-- Deduplicate emails (by subject + date)
+- Parse the new mbox file (or only the appended tail of a known one)
+- Deduplicate emails against the SQLite dedupe index
+  (Message-ID, normalized body hash, subject + date)
 - Generate AI summaries for NEW emails only
 - Merge with existing data
-- Update the JSON file
+- Update the JSON file once at the end (checkpoints are journaled to
+  parsed_emails.import.jsonl and merged back in after a crash)
 """
 
 import os
 import sys
 import json
 import glob
-import time
 import hashlib
 from datetime import datetime
 from collections import defaultdict
 
-from parse_mbox import parse_mbox_file, categorize_email
-from openai import OpenAI
-
-client = OpenAI(
-    api_key=os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY"),
-    base_url=os.environ.get("AI_INTEGRATIONS_OPENAI_BASE_URL")
+from parse_mbox import iter_parsed_messages, iter_parsed_messages_parallel, categorize_email
+from database import init_database, get_connection, get_email_count
+from services.dedupe import (
+    filter_new_emails,
+    record_dedupe_keys,
+    get_dedupe_key_count,
+    backfill_dedupe_index,
+    prescan_known_offsets
+)
+from services.ingest import insert_emails, refresh_trend_snapshots
+from services.near_duplicates import (
+    assign_clusters,
+    record_clusters,
+    count_near_duplicates,
+    get_minhash_count,
+    backfill_near_duplicate_index
 )
+from services.summarizer import SummaryEngine, DEFAULT_CONCURRENCY
+from services.journal import AppendJournal, read_journal, remove_journal
 
-def generate_email_hash(email):
-    """Create a unique hash for deduplication based on subject + date."""
-    key = f"{email.get('subject', '')}{email.get('date', '')}".lower().strip()
-    return hashlib.md5(key.encode()).hexdigest()
+PROCESSED_FILES_PATH = 'processed_mbox_files.json'
+JOURNAL_PATH = 'parsed_emails.import.jsonl'
+FINGERPRINT_BYTES = 64 * 1024
+CHECKPOINT_EVERY = 200
+DEDUPE_BATCH_SIZE = 500
 
 def load_existing_emails():
     """Load existing parsed emails, return empty list if none exist."""
@@ -50,67 +69,155 @@ def load_existing_emails():
     print("No existing emails found - starting fresh")
     return []
 
-def get_existing_hashes(emails):
-    """Get set of hashes for all existing emails."""
-    return {generate_email_hash(e) for e in emails}
-
-def generate_summary(email):
-    """Generate AI summary for a single email."""
-    subject = email.get('subject', '')
-    content = email.get('content', '')[:2000]
-    links = email.get('links', [])
-    links_text = '\n'.join(links[:10]) if links else 'No external links'
-    
-    prompt = f"""Based on the following email, write a concise 2-3 sentence summary that captures the main topic and key takeaways. If there are external links, infer their content from the URL patterns and how they're referenced in the email.
-
-Subject: {subject}
-
-Content:
-{content}
-
-External Links:
-{links_text}
-
-Write a helpful summary (2-3 sentences):"""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes email newsletters. Be concise and informative."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.3
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating summary: {e}")
-        return None
-
-def find_new_mbox_files(processed_files_path='processed_mbox_files.json'):
-    """Find mbox files that haven't been processed yet."""
+def merge_journal(emails, journal_path=JOURNAL_PATH):
+    """Append emails journaled by an interrupted import; returns how many were added."""
+    journaled = list(read_journal(journal_path))
+    emails.extend(journaled)
+    return len(journaled)
+
+def file_fingerprint(filepath, length):
+    """SHA-1 of the first min(length, FINGERPRINT_BYTES) bytes of a file.
+
+    Appending to an mbox leaves this prefix untouched, so a mismatch means the
+    file was replaced or rewritten rather than grown.
+    """
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        h.update(f.read(min(length, FINGERPRINT_BYTES)))
+    return h.hexdigest()
+
+def tail_fingerprint(filepath, offset):
+    """SHA-1 of the FINGERPRINT_BYTES (or fewer) bytes ending at `offset`.
+
+    Catches a rewrite or compaction past the first FINGERPRINT_BYTES that
+    still leaves the file larger than `offset`, which the prefix misses.
+    """
+    start = max(0, offset - FINGERPRINT_BYTES)
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        h.update(f.read(offset - start))
+    return h.hexdigest()
+
+def load_manifest(processed_files_path=PROCESSED_FILES_PATH):
+    """Load the per-file import manifest: path -> {size, mtime, fingerprint,
+    tail_fingerprint, offset}.
+
+    The old format (a plain list of processed paths) is upgraded on the fly by
+    assuming each listed file was fully read at its current size.
+    """
+    if not os.path.exists(processed_files_path):
+        return {}
+    with open(processed_files_path, 'r') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return data
+    
+    manifest = {}
+    for filepath in data:
+        if os.path.exists(filepath):
+            manifest[filepath] = manifest_entry(filepath, os.path.getsize(filepath))
+    return manifest
+
+def save_manifest(manifest, processed_files_path=PROCESSED_FILES_PATH):
+    """Atomically write the import manifest."""
+    tmp_path = processed_files_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, processed_files_path)
+
+def manifest_entry(filepath, offset):
+    """Build a manifest entry recording that `filepath` was read up to `offset`."""
+    stat = os.stat(filepath)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'fingerprint': file_fingerprint(filepath, offset),
+        'tail_fingerprint': tail_fingerprint(filepath, offset),
+        'offset': offset,
+        'updated_at': datetime.now().isoformat()
+    }
+
+def resume_offset(filepath, entry):
+    """Byte offset to resume `filepath` from, or 0 if it must be read from scratch.
+
+    A changed file resumes at `offset` only if both the prefix and the window
+    ending at `offset` still match. Otherwise it is re-read from 0, where the
+    header pre-scan skips the messages already imported.
+    """
+    if not entry:
+        return 0
+    stat = os.stat(filepath)
+    offset = entry.get('offset', 0)
+    if stat.st_size == entry.get('size') and stat.st_mtime == entry.get('mtime'):
+        return offset
+    if stat.st_size < offset \
+            or file_fingerprint(filepath, offset) != entry.get('fingerprint') \
+            or tail_fingerprint(filepath, offset) != entry.get('tail_fingerprint'):
+        return 0
+    return offset
+
+def find_new_mbox_files(processed_files_path=PROCESSED_FILES_PATH):
+    """Find mbox files that are new or have grown since they were last imported."""
     mbox_files = glob.glob('attached_assets/*.mbox')
     
-    processed = set()
-    if os.path.exists(processed_files_path):
-        with open(processed_files_path, 'r') as f:
-            processed = set(json.load(f))
+    processed = load_manifest(processed_files_path)
     
-    new_files = [f for f in mbox_files if f not in processed]
+    new_files = [
+        f for f in mbox_files
+        if resume_offset(f, processed.get(f)) < os.path.getsize(f)
+    ]
     return new_files, processed
 
-def mark_file_processed(filepath, processed_files_path='processed_mbox_files.json'):
-    """Mark an mbox file as processed."""
-    processed = set()
-    if os.path.exists(processed_files_path):
-        with open(processed_files_path, 'r') as f:
-            processed = set(json.load(f))
+def mark_file_processed(filepath, offset=None, processed_files_path=PROCESSED_FILES_PATH):
+    """Record that `filepath` has been imported up to `offset` (default: its end)."""
+    processed = load_manifest(processed_files_path)
     
-    processed.add(filepath)
+    if offset is None:
+        offset = os.path.getsize(filepath)
+    processed[filepath] = manifest_entry(filepath, offset)
     
-    with open(processed_files_path, 'w') as f:
-        json.dump(list(processed), f, indent=2)
+    save_manifest(processed, processed_files_path)
+
+def save_emails(emails):
+    """Atomically write the full email list to parsed_emails.json."""
+    tmp_path = 'parsed_emails.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(emails, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, 'parsed_emails.json')
+
+def summarize_batch(emails, engine=None):
+    """Generate AI summaries in place for a batch of new emails."""
+    engine = engine or SummaryEngine()
+    engine.run(emails)
+
+def commit_batch(conn, batch, journal, mbox_file, offset, sqlite=False, engine=None):
+    """Cluster, summarize and save a batch of new emails, then record their
+    dedupe keys, fingerprints and the byte offset they were read up to.
+
+    With `sqlite` the emails, links and categories are inserted in the same
+    transaction as their dedupe keys. For the JSON export the batch is
+    appended to `journal` and synced before that commit, and
+    parsed_emails.json itself is written once at the end of the run.
+    `journal` is None when the JSON export is disabled. Returns the number
+    of near-duplicates, which reuse their cluster's summary instead of
+    requesting a new one.
+    """
+    cursor = conn.cursor()
+    cluster_entries = assign_clusters(cursor, batch)
+    summarize_batch(batch, engine)
+    if journal is not None:
+        for email in batch:
+            journal.append(email)
+        journal.sync()
+    if sqlite:
+        email_ids = insert_emails(cursor, batch)
+        refresh_trend_snapshots(cursor, email_ids)
+    record_dedupe_keys(cursor, batch)
+    record_clusters(cursor, cluster_entries)
+    conn.commit()
+    mark_file_processed(mbox_file, offset)
+    return count_near_duplicates(cluster_entries)
 
 def print_statistics(emails):
     """Print summary statistics."""
@@ -134,13 +241,30 @@ def print_statistics(emails):
     for cat, count in sorted(categories_count.items(), key=lambda x: -x[1]):
         print(f"  {cat}: {count}")
 
-def main():
+def main(workers=1, prescan=True, sqlite=False, export_json=True, concurrency=DEFAULT_CONCURRENCY):
     print("=" * 60)
     print("INCREMENTAL UPDATE - Add New Emails to Knowledge Base")
     print("=" * 60)
     
-    existing_emails = load_existing_emails()
-    existing_hashes = get_existing_hashes(existing_emails)
+    existing_emails = load_existing_emails() if export_json else None
+    if existing_emails is not None:
+        # Emails checkpointed by an interrupted run are already in the dedupe
+        # index, so they must be folded back in before anything else
+        resumed = merge_journal(existing_emails)
+        if resumed:
+            print(f"Resumed {resumed} emails from {JOURNAL_PATH}")
+            save_emails(existing_emails)
+        remove_journal(JOURNAL_PATH)
+    
+    init_database()
+    if get_dedupe_key_count() == 0:
+        seed_emails = existing_emails if existing_emails is not None else load_existing_emails()
+        if seed_emails:
+            backfill_dedupe_index(seed_emails)
+    if get_minhash_count() == 0:
+        seed_emails = existing_emails if existing_emails is not None else load_existing_emails()
+        if seed_emails:
+            backfill_near_duplicate_index(seed_emails)
     
     new_files, processed = find_new_mbox_files()
     
@@ -157,7 +281,8 @@ def main():
         
         print("\nOptions:")
         print("1. Add a new mbox file to attached_assets/")
-        print("2. To reprocess a file, delete processed_mbox_files.json")
+        print("2. Appending to an existing mbox file imports only the new tail")
+        print("3. To reprocess a file, remove its entry from processed_mbox_files.json")
         return
     
     print(f"\nFound {len(new_files)} new mbox file(s) to process:")
@@ -179,59 +304,96 @@ def main():
     
     total_new = 0
     total_duplicates = 0
+    engine = SummaryEngine(concurrency=concurrency)
+    journal = AppendJournal(JOURNAL_PATH) if existing_emails is not None else None
     
-    for mbox_file in selected:
-        print(f"\n{'=' * 50}")
-        print(f"Processing: {mbox_file}")
-        print("=" * 50)
-        
-        print("\nStep 1: Parsing emails...")
-        new_emails = parse_mbox_file(mbox_file)
-        print(f"  Found {len(new_emails)} emails in file")
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
-        print("\nStep 2: Checking for duplicates...")
-        unique_new = []
-        for email in new_emails:
-            email_hash = generate_email_hash(email)
-            if email_hash not in existing_hashes:
-                unique_new.append(email)
-                existing_hashes.add(email_hash)
+        for mbox_file in selected:
+            print(f"\n{'=' * 50}")
+            print(f"Processing: {mbox_file}")
+            print("=" * 50)
+            
+            start = resume_offset(mbox_file, processed.get(mbox_file))
+            end = os.path.getsize(mbox_file)
+            if start:
+                print(f"\nResuming at byte {start:,} of {end:,}")
+            
+            skip = set()
+            if prescan:
+                skip = prescan_known_offsets(cursor, mbox_file, start, end)
+                print(f"\nPre-scan: {len(skip)} known duplicates skipped by headers")
+            
+            print("\nStep 1-3: Parsing, deduplicating and summarizing new emails...")
+            # Stream records straight from the mbox and check them against the
+            # dedupe index DEDUPE_BATCH_SIZE at a time. Every CHECKPOINT_EVERY
+            # new emails are summarized, journaled and the byte offset
+            # committed, so a crash resumes at the last checkpoint.
+            candidates = []
+            batch = []
+            pending_keys = set()
+            file_total = len(skip)
+            file_new = 0
+            file_duplicates = len(skip)
+            file_near_duplicates = 0
+            if workers == 1:
+                records = iter_parsed_messages(mbox_file, start, end, skip)
             else:
-                total_duplicates += 1
-        
-        print(f"  New unique emails: {len(unique_new)}")
-        print(f"  Duplicates skipped: {len(new_emails) - len(unique_new)}")
-        
-        if unique_new:
-            print("\nStep 3: Generating AI summaries for new emails...")
-            for i, email in enumerate(unique_new):
-                summary = generate_summary(email)
-                if summary:
-                    email['summary'] = summary
-                else:
-                    email['summary'] = ''
+                records = iter_parsed_messages_parallel(mbox_file, workers or None, start, end, skip)
+            for next_offset, email in records:
+                file_total += 1
+                candidates.append(email)
+                if len(candidates) < DEDUPE_BATCH_SIZE:
+                    continue
                 
-                if (i + 1) % 10 == 0 or i == len(unique_new) - 1:
-                    print(f"  Progress: {i + 1}/{len(unique_new)}")
+                new, duplicates = filter_new_emails(cursor, candidates, pending_keys)
+                batch.extend(new)
+                file_duplicates += len(duplicates)
+                candidates = []
                 
-                time.sleep(0.1)
+                if len(batch) >= CHECKPOINT_EVERY:
+                    file_near_duplicates += commit_batch(conn, batch, journal, mbox_file,
+                                                         next_offset, sqlite, engine)
+                    if existing_emails is not None:
+                        existing_emails.extend(batch)
+                    file_new += len(batch)
+                    print(f"  Checkpoint: {file_new} new emails saved (byte {next_offset:,})")
+                    batch = []
+                    pending_keys.clear()
             
-            existing_emails.extend(unique_new)
-            total_new += len(unique_new)
-        
-        mark_file_processed(mbox_file)
-        print(f"\nMarked {mbox_file} as processed")
+            new, duplicates = filter_new_emails(cursor, candidates, pending_keys)
+            batch.extend(new)
+            file_duplicates += len(duplicates)
+            if batch:
+                file_near_duplicates += commit_batch(conn, batch, journal, mbox_file,
+                                                     end, sqlite, engine)
+                if existing_emails is not None:
+                    existing_emails.extend(batch)
+                file_new += len(batch)
+            total_new += file_new
+            total_duplicates += file_duplicates
+            
+            print(f"  Found {file_total} emails in file")
+            print(f"  New unique emails: {file_new}")
+            print(f"  Duplicates skipped: {file_duplicates}")
+            print(f"  Near-duplicates (clustered, summary reused): {file_near_duplicates}")
+            
+            mark_file_processed(mbox_file, end)
+            print(f"\nMarked {mbox_file} as processed up to byte {end:,}")
     
     print("\n" + "=" * 50)
     print("Step 4: Saving updated database...")
     print("=" * 50)
     
-    with open('parsed_emails.json', 'w', encoding='utf-8') as f:
-        json.dump(existing_emails, f, indent=2, ensure_ascii=False)
-    
-    print(f"  Saved {len(existing_emails)} total emails")
-    
-    print_statistics(existing_emails)
+    if existing_emails is not None:
+        journal.close()
+        save_emails(existing_emails)
+        remove_journal(JOURNAL_PATH)
+        print(f"  Saved {len(existing_emails)} total emails")
+        print_statistics(existing_emails)
+    if sqlite:
+        print(f"  {get_email_count()} total emails in the SQLite database")
     
     # Update the last modified date
     today = datetime.now().strftime('%B %d, %Y')
@@ -244,9 +406,30 @@ def main():
     print("=" * 50)
     print(f"\n  New emails added: {total_new}")
     print(f"  Duplicates skipped: {total_duplicates}")
-    print(f"  Total emails now: {len(existing_emails)}")
+    total = len(existing_emails) if existing_emails is not None else get_email_count()
+    print(f"  Total emails now: {total}")
+    if sqlite:
+        print("\nRun 'python3 services/pipeline.py' to update tools, embeddings, links,")
+        print("categories, trends and the curriculum for the new emails.")
     print("\nRestart the web app to see updated content.")
     print("The search will automatically include all new emails.")
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description='Add new mbox files to the knowledge base')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse with N processes (0 = one per CPU)')
+    parser.add_argument('--no-prescan', action='store_true',
+                        help='Fully parse every message instead of skipping known duplicates by headers')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Number of summary requests in flight at once')
+    parser.add_argument('--sqlite', action='store_true',
+                        help='Insert new emails directly into data/knowledge.db')
+    parser.add_argument('--no-json', action='store_true',
+                        help='Do not rewrite parsed_emails.json (requires --sqlite)')
+    args = parser.parse_args()
+    if args.no_json and not args.sqlite:
+        parser.error('--no-json requires --sqlite')
+    
+    main(workers=args.workers, prescan=not args.no_prescan,
+         sqlite=args.sqlite, export_json=not args.no_json, concurrency=args.concurrency)
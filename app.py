@@ -7,7 +7,6 @@ from flask import Flask, render_template, jsonify, send_file
 import json
 import os
 from datetime import datetime
-from email.utils import parsedate_to_datetime
 
 app = Flask(__name__)
 
@@ -19,6 +18,11 @@ app.register_blueprint(dashboard_bp)
 app.register_blueprint(search_bp)
 app.register_blueprint(learning_bp)
 
+# Serve reads from the published snapshot (services/snapshots.py) so
+# ingestion can rewrite the database without affecting requests
+import database
+database.READ_FROM_SNAPSHOT = True
+
 
 def get_last_updated():
     """Get last updated date from metadata file or fallback to today."""
@@ -28,15 +32,6 @@ def get_last_updated():
     return datetime.now().strftime('%B %d, %Y')
 
 
-def parse_date_safe(date_str):
-    """Parse email date string, return epoch 0 if parsing fails."""
-    try:
-        return parsedate_to_datetime(date_str)
-    except:
-        from datetime import timezone
-        return datetime(1970, 1, 1, tzinfo=timezone.utc)
-
-
 @app.route('/download/template')
 def download_template():
     return send_file('email_guide_template.zip', as_attachment=True, download_name='email_guide_template.zip')
@@ -82,84 +77,70 @@ def tools_page():
 @app.route('/browse')
 def browse():
     """Original email browser view."""
-    from database import get_connection
-    from services.analytics import get_all_categories_alphabetical
+    from database import get_read_connection
     
-    with open('parsed_emails.json', 'r', encoding='utf-8') as f:
-        emails = json.load(f)
-    
-    # Build a lookup of enriched links from SQLite
-    enriched_links = {}
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
+        # Newest first by the indexed epoch column; undated emails sort last
+        cursor.execute('''
+            SELECT id, COALESCE(subject, '') AS subject, date, sender, summary,
+                   COALESCE(content, '') AS content
+            FROM emails_full
+            ORDER BY date_ts DESC
+        ''')
+        emails = [dict(row) for row in cursor.fetchall()]
+        by_id = {email['id']: email for email in emails}
+        for email in emails:
+            email['links'] = []
+            email['enriched_links'] = []
+            email['categories'] = []
+        
         cursor.execute('''
-            SELECT url, title, description, domain 
-            FROM email_links WHERE title IS NOT NULL
+            SELECT el.email_id, u.url, u.title, u.description, u.domain
+            FROM email_links el
+            JOIN urls u ON u.id = el.url_id
         ''')
         for row in cursor.fetchall():
-            enriched_links[row['url']] = {
+            email = by_id[row['email_id']]
+            email['links'].append(row['url'])
+            email['enriched_links'].append({
                 'url': row['url'],
                 'title': row['title'],
                 'description': row['description'],
                 'domain': row['domain']
-            }
+            })
         
-        # Get updated categories from database
+        # Category members come back in date order, so no per-request sort
         cursor.execute('''
-            SELECT e.id, GROUP_CONCAT(ec.category, '|') as cats
-            FROM emails e
-            LEFT JOIN email_categories ec ON e.id = ec.email_id
-            GROUP BY e.id
+            SELECT ec.email_id, ec.category
+            FROM email_categories ec
+            JOIN emails e ON e.id = ec.email_id
+            ORDER BY e.date_ts DESC
         ''')
-        email_categories = {}
+        categories = {}
         for row in cursor.fetchall():
-            if row['cats']:
-                email_categories[row['id']] = row['cats'].split('|')
-    
-    # Enrich email links and update categories from DB
-    for email in emails:
-        if 'links' in email:
-            enriched = []
-            for link in email['links']:
-                if link in enriched_links:
-                    enriched.append(enriched_links[link])
-                else:
-                    # Fall back to just the URL
-                    enriched.append({'url': link, 'title': None, 'description': None, 'domain': None})
-            email['enriched_links'] = enriched
-        
-        # Use database categories if available
-        email_id = email.get('id')
-        if email_id and email_id in email_categories:
-            email['categories'] = email_categories[email_id]
-    
-    # Build categories dict from enriched emails
-    categories = {}
-    for email in emails:
-        for cat in email.get('categories', ['General AI']):
-            if cat not in categories:
-                categories[cat] = []
-            email_with_cat = email.copy()
-            email_with_cat['category'] = cat
-            categories[cat].append(email_with_cat)
+            email = by_id[row['email_id']]
+            email['categories'].append(row['category'])
+            categories.setdefault(row['category'], []).append(email)
     
-    for cat in categories:
-        categories[cat].sort(key=lambda e: parse_date_safe(e.get('date', '')), reverse=True)
+    uncategorized = [email for email in emails if not email['categories']]
+    if uncategorized:
+        categories.setdefault('General AI', []).extend(uncategorized)
     
     # Sort categories alphabetically
     sorted_categories = dict(sorted(categories.items(), key=lambda x: x[0].lower()))
     
     emails_for_search = []
     for email in emails:
-        email_copy = email.copy()
-        email_copy['category'] = email.get('categories', ['General AI'])[0]
+        email_copy = {key: value for key, value in email.items() if key != 'enriched_links'}
+        email_copy['category'] = (email['categories'] or ['General AI'])[0]
         emails_for_search.append(email_copy)
     
     return render_template('index.html', 
                           emails=emails, 
                           categories=sorted_categories,
                           total_emails=len(emails),
-                          total_links=sum(len(e.get('links', [])) for e in emails),
+                          total_links=sum(len(e['links']) for e in emails),
                           emails_json=json.dumps(emails_for_search),
                           last_updated=get_last_updated())
 
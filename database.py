@@ -3,13 +3,39 @@ Database module for AI Knowledge Base.
 Handles SQLite connection, schema creation, and common queries.
 """
 
+import re
+import html
 import sqlite3
 import os
+import threading
 from contextlib import contextmanager
 from datetime import datetime
 
+from services.bodies import decompress_body, move_inline_bodies
+
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'knowledge.db')
 
+# Connection tuning. Connections are pooled, so these costs (and the page
+# cache they fill) are paid once per connection rather than once per query.
+BUSY_TIMEOUT_SECONDS = 30
+CACHE_SIZE_KB = 64 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+# Idle connections kept per database file and mode
+POOL_SIZE = 8
+
+# bm25 column weights for emails_fts: subject, summary, content, sender
+FTS_WEIGHTS = '10.0, 5.0, 1.0, 2.0'
+# Markers snippet() wraps matches in; replaced with <mark> after escaping
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+# Published read-only copies live in this directory next to the database,
+# with a symlink naming the one being served (see services/snapshots.py)
+SNAPSHOT_DIR_NAME = 'snapshots'
+SERVING_LINK_NAME = 'current.db'
+# Set by the web app: its request handlers read the published snapshot.
+# Scripts and ingest always read the database itself.
+READ_FROM_SNAPSHOT = False
+
 
 def get_db_path():
     """Get the database path, ensuring the data directory exists."""
@@ -19,15 +45,173 @@ def get_db_path():
     return DATABASE_PATH
 
 
-@contextmanager
-def get_connection():
-    """Context manager for database connections."""
-    conn = sqlite3.connect(get_db_path())
+def get_snapshot_dir():
+    """Directory holding published snapshots of the database."""
+    return os.path.join(os.path.dirname(get_db_path()), SNAPSHOT_DIR_NAME)
+
+
+def get_serving_path():
+    """The published snapshot request handlers read, or None if none is published."""
+    snapshot_dir = get_snapshot_dir()
+    try:
+        return os.path.join(snapshot_dir, os.readlink(os.path.join(snapshot_dir, SERVING_LINK_NAME)))
+    except OSError:
+        return None
+
+
+def open_connection(path, readonly=False, immutable=False):
+    """Open a tuned connection. Read-only connections cannot write at all.
+
+    Immutable connections are for snapshots that never change: SQLite
+    skips all locking and change detection on them.
+    """
+    if readonly or immutable:
+        mode = 'mode=ro&immutable=1' if immutable else 'mode=ro'
+        conn = sqlite3.connect(f'file:{path}?{mode}', uri=True, timeout=BUSY_TIMEOUT_SECONDS,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON')
+    else:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS,
+                               cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        # WAL lets readers proceed while a writer commits; NORMAL sync is
+        # durable across application crashes in WAL mode
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE_BYTES}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    # Email bodies are stored compressed; the emails_full view and the
+    # full-text triggers decompress them in SQL
+    conn.create_function('decompress_body', 2, decompress_body, deterministic=True)
     conn.row_factory = sqlite3.Row  # Enable column access by name
+    return conn
+
+
+class ConnectionPool:
+    """Idle connections to one database file, handed to one thread at a time.
+
+    A connection checked out by a thread is never shared, so nested
+    get_connection() calls get their own connection, as before pooling.
+    """
+
+    def __init__(self, path, readonly=False, size=POOL_SIZE, immutable=False):
+        self.path = path
+        self.readonly = readonly
+        self.immutable = immutable
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.retired = False
+
+    def acquire(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Connections must not cross a fork; leave the parent's alone
+                self.idle = []
+                self.pid = os.getpid()
+            if self.idle:
+                return self.idle.pop()
+        return open_connection(self.path, self.readonly, self.immutable)
+
+    def release(self, conn):
+        try:
+            # Uncommitted work is discarded, as closing the connection did
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.ProgrammingError:
+            return  # closed by the caller
+        with self.lock:
+            if len(self.idle) < self.size and self.pid == os.getpid() and not self.retired:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def retire(self):
+        """Close idle connections now and checked-out ones when released."""
+        with self.lock:
+            self.retired = True
+        self.close_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_serving_pool = None
+
+
+def get_pool(readonly=False):
+    """The connection pool for the current database path and mode."""
+    key = (get_db_path(), readonly)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(*key)
+        return _pools[key]
+
+
+def get_serving_pool():
+    """The pool for the published snapshot, or None if none is published.
+
+    When a newer snapshot is published the old pool is retired, so its
+    connections close as their current requests finish.
+    """
+    global _serving_pool
+    path = get_serving_path()
+    if path is None:
+        return None
+    with _pools_lock:
+        if _serving_pool is None or _serving_pool.path != path:
+            if _serving_pool is not None:
+                _serving_pool.retire()
+            _serving_pool = ConnectionPool(path, readonly=True, immutable=True)
+        return _serving_pool
+
+
+def close_all_connections():
+    """Close every idle pooled connection, e.g. before replacing the database file."""
+    with _pools_lock:
+        pools = list(_pools.values()) + ([_serving_pool] if _serving_pool else [])
+    for pool in pools:
+        pool.close_all()
+
+
+@contextmanager
+def _pooled_connection(pool):
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+def get_connection(readonly=False):
+    """Context manager for pooled database connections."""
+    return _pooled_connection(get_pool(readonly))
+
+
+def get_read_connection():
+    """Read-only pooled connection for request handlers and reports.
+
+    In the web app this reads the published snapshot when there is one,
+    so ingestion running against the database never blocks requests or
+    shows them half-built tables. A snapshot only changes when ingest
+    publishes a new one: read state the app writes itself (progress,
+    quizzes) with get_connection(readonly=True) instead.
+    """
+    serving = get_serving_pool() if READ_FROM_SNAPSHOT else None
+    return _pooled_connection(serving or get_pool(readonly=True))
+
+
+def ensure_column(cursor, table, column, definition):
+    """Add a column to an existing table if an older schema lacks it."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
 
 
 def init_database():
@@ -40,31 +224,101 @@ def init_database():
             CREATE TABLE IF NOT EXISTS emails (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 subject TEXT,
-                content TEXT,
                 date TEXT,
                 date_parsed DATETIME,
+                date_ts INTEGER,
                 sender TEXT,
                 summary TEXT,
                 sentiment REAL DEFAULT 0.0,
                 embedding BLOB,
                 original_categories TEXT,
+                cluster_id TEXT,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        ensure_column(cursor, 'emails', 'cluster_id', 'TEXT')
+        # UTC epoch seconds of date_parsed, for integer sorting and range filters
+        ensure_column(cursor, 'emails', 'date_ts', 'INTEGER')
+        cursor.execute('''
+            UPDATE emails SET date_ts = CAST(strftime('%s', date_parsed) AS INTEGER)
+            WHERE date_ts IS NULL AND date_parsed IS NOT NULL
+        ''')
         
-        # Email links table (normalized from JSON array)
+        # Email bodies, compressed (see services/bodies.py), kept out of
+        # `emails` so scans of the hot columns never read them
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_links (
+            CREATE TABLE IF NOT EXISTS body_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data BLOB NOT NULL,
+                sample_size INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_bodies (
+                email_id INTEGER PRIMARY KEY,
+                dictionary_id INTEGER,
+                body BLOB NOT NULL,
+                FOREIGN KEY (email_id) REFERENCES emails(id),
+                FOREIGN KEY (dictionary_id) REFERENCES body_dictionaries(id)
+            )
+        ''')
+        cursor.execute('PRAGMA table_info(emails)')
+        bodies_moved = 'content' in {row[1] for row in cursor.fetchall()}
+        if bodies_moved:
+            # Older database with bodies inline; the full-text index was
+            # built on that column and is rebuilt below
+            print("Moving email bodies to compressed storage...")
+            for trigger in ('emails_fts_insert', 'emails_fts_delete', 'emails_fts_update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute('DROP TABLE IF EXISTS emails_fts')
+            print(f"   Moved {move_inline_bodies(cursor)} bodies")
+            cursor.execute('ALTER TABLE emails DROP COLUMN content')
+        # Emails with their body decompressed as `content`
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS emails_full AS
+            SELECT e.*, decompress_body(b.body, d.data) AS content
+            FROM emails e
+            LEFT JOIN email_bodies b ON b.email_id = e.id
+            LEFT JOIN body_dictionaries d ON d.id = b.dictionary_id
+        ''')
+        
+        # Distinct pages, each stored and enriched once. `canonical_url` is the
+        # dedupe key; `url` is the first spelling seen, which is what is fetched
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS urls (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email_id INTEGER NOT NULL,
                 url TEXT NOT NULL,
+                canonical_url TEXT,
                 domain TEXT,
                 title TEXT,
                 description TEXT,
                 content_excerpt TEXT,
                 fetch_status TEXT DEFAULT 'pending',
-                fetched_at DATETIME,
-                FOREIGN KEY (email_id) REFERENCES emails(id)
+                fetched_at DATETIME
+            )
+        ''')
+        # Older urls tables stored the canonical form as `url`
+        ensure_column(cursor, 'urls', 'canonical_url', 'TEXT')
+        cursor.execute('UPDATE urls SET canonical_url = url WHERE canonical_url IS NULL')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_urls_canonical_url ON urls(canonical_url)')
+        
+        # Email links table (normalized from JSON array), mapping emails to
+        # urls; page metadata lives only in `urls`
+        cursor.execute('PRAGMA table_info(email_links)')
+        if 'url' in {row[1] for row in cursor.fetchall()}:
+            # Older layout with a copy of the page per link. Its rows are
+            # attached to urls by services/urls.backfill_url_ids
+            cursor.execute('ALTER TABLE email_links RENAME TO email_links_legacy')
+            for index in ('idx_email_links_domain', 'idx_email_links_url_id', 'idx_email_links_email_id'):
+                cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_links (
+                email_id INTEGER NOT NULL,
+                url_id INTEGER NOT NULL,
+                PRIMARY KEY (email_id, url_id),
+                FOREIGN KEY (email_id) REFERENCES emails(id),
+                FOREIGN KEY (url_id) REFERENCES urls(id)
             )
         ''')
         
@@ -165,6 +419,8 @@ def init_database():
                 FOREIGN KEY (prerequisite_id) REFERENCES modules(id)
             )
         ''')
+        ensure_column(cursor, 'modules', 'estimated_hours', 'INTEGER')
+        ensure_column(cursor, 'modules', 'topics_json', 'TEXT')
         
         # Lessons within modules (Phase 3)
         cursor.execute('''
@@ -212,6 +468,10 @@ def init_database():
                 FOREIGN KEY (lesson_id) REFERENCES lessons(id)
             )
         ''')
+        # Columns the curriculum service records progress with
+        ensure_column(cursor, 'user_progress', 'module_id', 'INTEGER REFERENCES modules(id)')
+        ensure_column(cursor, 'user_progress', 'status', 'TEXT')
+        ensure_column(cursor, 'user_progress', 'score', 'REAL')
         
         # Trend snapshots for analytics
         cursor.execute('''
@@ -225,22 +485,147 @@ def init_database():
             )
         ''')
         
+        # Dedupe keys for incremental imports (Message-ID, body hash, subject+date)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS dedupe_keys (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Generated summaries keyed by content hash, prompt version and model
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                cache_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # MinHash signatures for near-duplicate clustering
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_minhashes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cluster_id TEXT NOT NULL,
+                signature BLOB NOT NULL
+            )
+        ''')
+        
+        # LSH band buckets pointing at signatures
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS minhash_bands (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                minhash_id INTEGER NOT NULL,
+                FOREIGN KEY (minhash_id) REFERENCES email_minhashes(id)
+            )
+        ''')
+        
+        # Emails each pipeline stage still has to process
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_dirty (
+                stage TEXT NOT NULL,
+                email_id INTEGER NOT NULL,
+                PRIMARY KEY (stage, email_id)
+            )
+        ''')
+
+        # Global data version, bumped by every write readers can see
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+
+        # Items changed under each data version (item_id NULL = all of the kind)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_changes (
+                version INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                item_id INTEGER,
+                changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Full-text index over emails. External content: the text lives only
+        # in `emails` and `email_bodies`, and the triggers keep the index in
+        # step. An email is indexed when its body is stored.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'")
+        fts_exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+                subject, summary, content, sender,
+                content='emails_full', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON email_bodies BEGIN
+                INSERT INTO emails_fts (rowid, subject, summary, content, sender)
+                SELECT id, subject, summary, content, sender FROM emails_full WHERE id = new.email_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS emails_fts_delete BEFORE DELETE ON emails BEGIN
+                INSERT INTO emails_fts (emails_fts, rowid, subject, summary, content, sender)
+                SELECT 'delete', id, subject, summary, content, sender FROM emails_full
+                WHERE id = old.id AND id IN (SELECT email_id FROM email_bodies);
+                DELETE FROM email_bodies WHERE email_id = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS emails_fts_update
+            AFTER UPDATE OF subject, summary, sender ON emails
+            WHEN new.id IN (SELECT email_id FROM email_bodies) BEGIN
+                INSERT INTO emails_fts (emails_fts, rowid, subject, summary, content, sender)
+                SELECT 'delete', old.id, old.subject, old.summary, content, old.sender
+                FROM emails_full WHERE id = old.id;
+                INSERT INTO emails_fts (rowid, subject, summary, content, sender)
+                SELECT id, subject, summary, content, sender FROM emails_full WHERE id = new.id;
+            END
+        ''')
+        if not fts_exists:
+            # Subject and summary matches outrank body matches
+            cursor.execute(f"INSERT INTO emails_fts (emails_fts, rank) VALUES ('rank', 'bm25({FTS_WEIGHTS})')")
+            # Index emails stored before the table existed
+            cursor.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+        
         # Create indexes for performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_date ON emails(date_parsed)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_date_ts ON emails(date_ts)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails(sender)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_links_domain ON email_links(domain)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_urls_domain ON urls(domain)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_urls_fetch_status ON urls(fetch_status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_categories_category ON email_categories(category)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_entities_type ON entities(type)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_tools_name ON tools(normalized_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_trend_snapshots_date ON trend_snapshots(date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_emails_cluster ON emails(cluster_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_minhash_bands_bucket ON minhash_bands(band, bucket)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_data_changes_version ON data_changes(version, kind)')
+        # Child-to-parent lookups; the primary keys of these tables only
+        # serve lookups by email. Checked by scripts/check_query_plans.py
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_links_url_id ON email_links(url_id, email_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email_entities_entity ON email_entities(entity_id, email_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tool_mentions_tool ON tool_mentions(tool_id, email_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lesson_sources_email ON lesson_sources(email_id, lesson_id)')
         
         conn.commit()
+        if bodies_moved:
+            # Return the space the inline bodies used to the filesystem
+            cursor.execute('VACUUM')
         print("Database initialized successfully!")
 
 
 def get_email_count():
     """Get total number of emails in database."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM emails')
         return cursor.fetchone()[0]
@@ -248,7 +633,7 @@ def get_email_count():
 
 def get_all_categories():
     """Get all unique categories with counts."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT category, COUNT(*) as count 
@@ -261,31 +646,93 @@ def get_all_categories():
 
 def get_emails_by_category(category, limit=50, offset=0):
     """Get emails for a specific category."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT e.* 
             FROM emails e
             JOIN email_categories ec ON e.id = ec.email_id
             WHERE ec.category = ?
-            ORDER BY e.date_parsed DESC
+            ORDER BY e.date_ts DESC
             LIMIT ? OFFSET ?
         ''', (category, limit, offset))
         return [dict(row) for row in cursor.fetchall()]
 
 
-def search_emails(query, limit=50):
-    """Basic keyword search across emails."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        search_term = f'%{query}%'
+def fts_query(query):
+    """Turn free text into an FTS5 MATCH expression requiring every word.
+
+    Each word is quoted, so operators and punctuation in user input are
+    searched for literally instead of being parsed as FTS5 syntax.
+    """
+    words = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def highlight_snippet(snippet):
+    """HTML-escape a snippet and mark its matched terms with <mark>."""
+    if not snippet:
+        return snippet
+    escaped = html.escape(snippet, quote=False)
+    return escaped.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+def fts_search(cursor, query, limit, columns='e.*', recent=None):
+    """Emails matching `query` as dicts, best bm25 match first, each with a
+    highlighted `snippet`. `columns` selects from `emails e` and must include e.id.
+
+    Every match is ranked. Pass `recent` to rank only the newest `recent`
+    matches instead, which bounds the cost of very common words at the
+    price of missing older, better matches.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    if recent is None:
         cursor.execute('''
-            SELECT * FROM emails 
-            WHERE subject LIKE ? OR content LIKE ? OR summary LIKE ?
-            ORDER BY date_parsed DESC
+            SELECT rowid FROM emails_fts
+            WHERE emails_fts MATCH ?
+            ORDER BY rank
             LIMIT ?
-        ''', (search_term, search_term, search_term, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        ''', (match, limit))
+    else:
+        cursor.execute('''
+            SELECT rowid FROM (
+                SELECT rowid, rank FROM emails_fts
+                WHERE emails_fts MATCH ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            )
+            ORDER BY rank
+            LIMIT ?
+        ''', (match, recent, limit))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return []
+
+    # Snippets only for the rows returned, not for every candidate
+    placeholders = ','.join('?' * len(ids))
+    cursor.execute(f'''
+        SELECT {columns},
+               snippet(emails_fts, -1, '{_MATCH_START}', '{_MATCH_END}', '…', 16) AS snippet
+        FROM emails_fts
+        JOIN emails e ON e.id = emails_fts.rowid
+        WHERE emails_fts MATCH ? AND emails_fts.rowid IN ({placeholders})
+    ''', [match] + ids)
+    rows = {row['id']: dict(row) for row in cursor.fetchall()}
+
+    results = []
+    for email_id in ids:
+        row = rows[email_id]
+        row['snippet'] = highlight_snippet(row['snippet'])
+        results.append(row)
+    return results
+
+
+def search_emails(query, limit=50):
+    """Full-text search across emails, best matches first, with snippets."""
+    with get_read_connection() as conn:
+        return fts_search(conn.cursor(), query, limit)
 
 
 if __name__ == '__main__':
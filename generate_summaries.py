@@ -1,79 +1,89 @@
 import json
 import os
-import time
-from openai import OpenAI
 
-client = OpenAI(
-    api_key=os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY"),
-    base_url=os.environ.get("AI_INTEGRATIONS_OPENAI_BASE_URL")
+from database import init_database
+from services.summarizer import (
+    SummaryEngine,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    SUMMARY_PROMPT_VERSION,
+    SUMMARY_MODEL,
+    email_summary_key
 )
+from services.summary_cache import purge_stale_summaries
+from services.journal import AppendJournal, read_journal, remove_journal
 
-def generate_summary(email):
-    subject = email.get('subject', '')
-    content = email.get('content', '')[:2000]
-    links = email.get('links', [])
-    links_text = '\n'.join(links[:10]) if links else 'No external links'
-    
-    prompt = f"""Based on the following email, write a concise 2-3 sentence summary that captures the main topic and key takeaways. If there are external links, infer their content from the URL patterns and how they're referenced in the email.
-
-Subject: {subject}
-
-Content:
-{content}
+JOURNAL_PATH = 'parsed_emails.summaries.jsonl'
 
-External Links:
-{links_text}
-
-Write a helpful summary (2-3 sentences):"""
+def save_emails(emails):
+    """Atomically write the full email list to parsed_emails.json."""
+    tmp_path = 'parsed_emails.json.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(emails, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, 'parsed_emails.json')
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes AI development newsletter emails. Be concise and informative."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.3
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating summary: {e}")
-        return None
+def merge_journal(emails, journal_path=JOURNAL_PATH):
+    """Apply summaries recorded by an interrupted run; returns how many were applied."""
+    applied = 0
+    for record in read_journal(journal_path):
+        i = record.get('i', -1)
+        if 0 <= i < len(emails) and not emails[i].get('summary') \
+                and email_summary_key(emails[i])[0] == record.get('key'):
+            emails[i]['summary'] = record['summary']
+            applied += 1
+    return applied
 
-def main():
+def main(concurrency=DEFAULT_CONCURRENCY, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+         tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
     with open('parsed_emails.json', 'r', encoding='utf-8') as f:
         emails = json.load(f)
     
-    print(f"Generating summaries for {len(emails)} emails...")
+    # Progress is journaled rather than written back to parsed_emails.json,
+    # so resuming after a crash starts by merging the journal once.
+    resumed = merge_journal(emails)
+    if resumed:
+        print(f"Resumed {resumed} summaries from {JOURNAL_PATH}")
+        save_emails(emails)
+    remove_journal(JOURNAL_PATH)
     
-    processed = 0
-    failed = 0
+    pending = [email for email in emails if not email.get('summary')]
+    print(f"Generating summaries for {len(pending)} of {len(emails)} emails "
+          f"({concurrency} concurrent requests)...")
     
-    for i, email in enumerate(emails):
-        if email.get('summary'):
-            processed += 1
-            continue
-            
-        summary = generate_summary(email)
-        if summary:
-            email['summary'] = summary
-            processed += 1
-        else:
-            email['summary'] = ''
-            failed += 1
-        
-        if (i + 1) % 10 == 0:
-            print(f"Progress: {i + 1}/{len(emails)} ({processed} successful, {failed} failed)")
-            with open('parsed_emails.json', 'w', encoding='utf-8') as f:
-                json.dump(emails, f, indent=2, ensure_ascii=False)
+    index = {id(email): i for i, email in enumerate(emails)}
+    
+    init_database()
+    engine = SummaryEngine(concurrency=concurrency, requests_per_minute=requests_per_minute,
+                           tokens_per_minute=tokens_per_minute)
+    with AppendJournal(JOURNAL_PATH) as journal:
+        def checkpoint(email, summary):
+            if summary:
+                journal.append({'i': index[id(email)], 'key': email_summary_key(email)[0], 'summary': summary})
         
-        time.sleep(0.1)
+        processed, failed = engine.run(pending, on_result=checkpoint)
     
-    with open('parsed_emails.json', 'w', encoding='utf-8') as f:
-        json.dump(emails, f, indent=2, ensure_ascii=False)
+    save_emails(emails)
+    remove_journal(JOURNAL_PATH)
     
     print(f"\nComplete! Generated {processed} summaries ({failed} failed)")
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate AI summaries for parsed emails')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Number of summary requests in flight at once')
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help='Request-per-minute limit')
+    parser.add_argument('--tpm', type=int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help='Token-per-minute limit')
+    parser.add_argument('--purge-cache', action='store_true',
+                        help='Drop cached summaries from older prompt versions or models first')
+    args = parser.parse_args()
+    
+    if args.purge_cache:
+        init_database()
+        removed = purge_stale_summaries(SUMMARY_PROMPT_VERSION, SUMMARY_MODEL)
+        print(f"Removed {removed} stale cached summaries")
+    
+    main(args.concurrency, args.rpm, args.tpm)
@@ -1,12 +1,32 @@
-import mailbox
+import os
 import re
+import mmap
 import email
 from email.header import decode_header
-from collections import defaultdict
+from email.parser import BytesHeaderParser
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 import json
-from html import escape
+from html import escape, unescape
 import quopri
 
+MBOX_SEPARATOR = b'\nFrom '
+PARALLEL_CHUNK_BYTES = 16 * 1024 * 1024
+
+HIDDEN_HTML_ELEMENTS = ('script', 'style', 'head', 'title', 'noscript', 'template', 'svg')
+# Alternatives are ordered so the common case (a tag that is not an anchor,
+# comment or hidden element) is decided on its first character.
+HTML_TOKEN_PATTERN = re.compile(
+    r'<(?:[^>aAsShHtTnN!][^>]*>'
+    r'|[aA](\s[^>]*)>'
+    r'|!--.*?-->'
+    + ''.join(r'|(?i:%s)\b[^>]*>.*?</(?i:%s)\s*>' % (tag, tag) for tag in HIDDEN_HTML_ELEMENTS)
+    + r'|[^>]+>)',
+    re.DOTALL
+)
+HTML_HREF_PATTERN = re.compile(r'\shref\s*=\s*["\']?(https?://[^"\'\s>]+)', re.IGNORECASE)
+
 def decode_mime_header(header):
     """Decode MIME encoded header."""
     if not header:
@@ -23,54 +43,59 @@ def decode_mime_header(header):
     return ''.join(decoded_parts)
 
 def strip_html_tags(html_content):
-    """Remove HTML tags and decode entities."""
-    clean = re.sub(r'<[^>]+>', ' ', html_content)
-    clean = re.sub(r'&nbsp;', ' ', clean)
-    clean = re.sub(r'&amp;', '&', clean)
-    clean = re.sub(r'&lt;', '<', clean)
-    clean = re.sub(r'&gt;', '>', clean)
-    clean = re.sub(r'&quot;', '"', clean)
-    clean = re.sub(r'&#39;', "'", clean)
-    clean = re.sub(r'\s+', ' ', clean)
-    return clean.strip()
+    """Convert HTML to plain text with a single tokenizing pass.
+
+    HTML_TOKEN_PATTERN.split leaves visible text at even indexes and anchor
+    attributes (or None for any other tag) at odd ones. Non-visible elements
+    and comments vanish, every tag becomes a space, anchor ``href`` targets
+    are kept inline so extract_links still sees them, and all named and
+    numeric entities are decoded.
+    """
+    parts = HTML_TOKEN_PATTERN.split(html_content)
+    for i in range(1, len(parts), 2):
+        attrs = parts[i]
+        href = HTML_HREF_PATTERN.search(attrs) if attrs else None
+        parts[i] = href.group(1) if href else ''
+    text = ' '.join(parts)
+    if '&' in text:
+        text = unescape(text)
+    return ' '.join(text.split())
+
+def decode_text_part(part):
+    """Decode a single text part's payload using its declared charset."""
+    payload = part.get_payload(decode=True)
+    if not payload:
+        return ""
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return payload.decode(charset, errors='replace')
+    except:
+        return payload.decode('utf-8', errors='replace')
 
 def extract_text_content(msg):
-    """Extract text content from email message, with HTML fallback."""
+    """Extract text content from email message, with HTML fallback.
+
+    Parts are filtered on content type and disposition before anything is
+    decoded, so images and attachments are never base64-decoded. Once a
+    text/plain part is found, HTML parts are no longer considered.
+    """
     text_content = ""
-    html_content = ""
+    html_part = None
     
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            payload = part.get_payload(decode=True)
-            if payload:
-                charset = part.get_content_charset() or 'utf-8'
-                try:
-                    decoded = payload.decode(charset, errors='replace')
-                except:
-                    decoded = payload.decode('utf-8', errors='replace')
-                
-                if content_type == 'text/plain':
-                    text_content += decoded
-                elif content_type == 'text/html' and not text_content:
-                    html_content = decoded
-    else:
-        payload = msg.get_payload(decode=True)
-        if payload:
-            content_type = msg.get_content_type()
-            charset = msg.get_content_charset() or 'utf-8'
-            try:
-                decoded = payload.decode(charset, errors='replace')
-            except:
-                decoded = payload.decode('utf-8', errors='replace')
-            
-            if content_type == 'text/plain':
-                text_content = decoded
-            elif content_type == 'text/html':
-                html_content = decoded
+    for part in msg.walk():
+        content_type = part.get_content_type()
+        if content_type not in ('text/plain', 'text/html'):
+            continue
+        if part is not msg and part.get_content_disposition() == 'attachment':
+            continue
+        
+        if content_type == 'text/plain':
+            text_content += decode_text_part(part)
+        elif not text_content:
+            html_part = part
     
-    if not text_content and html_content:
-        text_content = strip_html_tags(html_content)
+    if not text_content and html_part is not None:
+        text_content = strip_html_tags(decode_text_part(html_part))
     
     return text_content
 
@@ -85,94 +110,219 @@ def extract_links(text):
             cleaned_urls.append(url)
     return list(set(cleaned_urls))
 
+# Keyword rules for categorize_email: a category applies when any of its
+# keywords appears as a substring of the lowercased subject + content.
+CATEGORY_RULES = [
+    ('Claude & Anthropic', ['claude', 'anthropic', 'claude code']),
+    ('OpenAI & GPT', ['openai', 'gpt', 'chatgpt', 'codex', 'o1', 'gpt-5']),
+    ('Google & Gemini', ['gemini', 'google', 'deepmind']),
+    ('AI Coding IDEs', ['cursor', 'vscode', 'ide', 'editor']),
+    ('Vibe Coding', ['vibe coding', 'vibe-coding', 'vibecoding']),
+    ('Prompt Engineering', ['prompt', 'prompting', 'prompt engineering']),
+    ('AI Agents', ['agent', 'agents', 'agentic']),
+    ('MCP (Model Context Protocol)', ['mcp', 'model context protocol']),
+    ('No-Code/Low-Code AI Builders', ['replit', 'bolt', 'lovable', 'v0', 'builder']),
+    ('Physical AI & Robotics', ['robot', 'humanoid', 'physical ai']),
+    ('AI Visual Tools', ['video', 'image', 'visual', 'design']),
+    ('Learning Resources', ['course', 'tutorial', 'learn', 'training', 'masterclass']),
+    ('AI for Business', ['saas', 'startup', 'business', 'launch']),
+    ('LLM & Models', ['llm', 'model', 'parameter', 'fine-tuning']),
+    ('AI Hardware & Compute', ['nvidia', 'hardware', 'compute']),
+    ('AI Research & Reports', ['research', 'paper', 'study', 'stanford', 'report', 'arxiv', 'publication']),
+    ('AI Tools & Platforms', ['perplexity', 'notebooklm', 'devin', 'windsurf', 'codeium', 'tabnine', 'sourcegraph']),
+    ('AI Audio & Music', ['audio', 'music', 'voice', 'speech', 'tts', 'whisper', 'sound']),
+    ('AI Automation & Workflows', ['automation', 'automate', 'workflow', 'n8n', 'zapier', 'make.com']),
+    ('New AI Tool Announcements', ['introducing', 'launched', 'announcing', 'new tool', 'just released', 'now available', 'check out', 'product hunt']),
+    ('Developer Tips & Lists', ['tips', 'tricks', 'commands', 'cheatsheet', 'best practices', 'how to', 'guide to', 'ways to', 'steps to', 'things you']),
+]
+
 def categorize_email(subject, content):
     """Categorize email based on content."""
-    text = (subject + " " + content).lower()
+    from services.annotator import annotate_text
+    return annotate_text(subject + " " + content)['categories']
+
+def find_message_boundary(mm, pos):
+    """Return the offset of the first ``From `` line at or after pos."""
+    if pos == 0 and mm[:5] == b'From ':
+        return 0
+    idx = mm.find(MBOX_SEPARATOR, max(pos - 1, 0))
+    return len(mm) if idx == -1 else idx + 1
+
+def _iter_message_spans(mm, start, end):
+    """Yield (offset, body_start, stop, next_offset) for each message in a
+    mapped mbox whose ``From `` line falls in [start, end)."""
+    size = len(mm)
+    start = find_message_boundary(mm, start)
+    while start < end:
+        from_line_end = mm.find(b'\n', start)
+        if from_line_end == -1:
+            break
+        next_sep = mm.find(MBOX_SEPARATOR, from_line_end)
+        stop = size if next_sep == -1 else next_sep
+        next_start = size if next_sep == -1 else next_sep + 1
+        yield start, from_line_end + 1, stop, next_start
+        start = next_start
+
+def iter_mbox_messages(filepath, start=0, end=None, skip=None):
+    """Yield (offset, next_offset, raw_bytes) for each message in an mbox file.
+
+    The file is memory-mapped and split on ``From `` separator lines, so only
+    one message is copied out of the map at a time. ``offset`` is the byte
+    position of the message's ``From `` line and ``next_offset`` that of the
+    following message (or the file size). ``start``/``end`` restrict the scan
+    to messages whose ``From `` line falls in that byte range, and messages
+    whose offset is in ``skip`` are passed over without being copied.
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm) if end is None else min(end, len(mm))
+            for offset, body_start, stop, next_offset in _iter_message_spans(mm, start, end):
+                if skip and offset in skip:
+                    continue
+                yield offset, next_offset, mm[body_start:stop]
+
+def parse_message_headers(header_bytes):
+    """Parse just the dedupe-relevant headers from a raw header block."""
+    headers = BytesHeaderParser().parsebytes(header_bytes)
+    return {
+        'subject': decode_mime_header(headers.get('Subject', '')),
+        'date': headers.get('Date', ''),
+        'message_id': (headers.get('Message-ID') or '').strip()
+    }
+
+def iter_mbox_headers(filepath, start=0, end=None):
+    """Yield (offset, headers) for each message, reading only its header block.
+
+    Bodies are never copied out of the map or MIME-decoded, which makes this
+    cheap enough to run over a whole export before deciding what to parse.
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm) if end is None else min(end, len(mm))
+            for offset, body_start, stop, _ in _iter_message_spans(mm, start, end):
+                header_end = mm.find(b'\n\n', body_start, stop)
+                crlf_end = mm.find(b'\n\r\n', body_start, stop)
+                if header_end == -1 or (crlf_end != -1 and crlf_end < header_end):
+                    header_end = crlf_end
+                if header_end == -1:
+                    header_end = stop
+                try:
+                    headers = parse_message_headers(mm[body_start:header_end + 1])
+                except Exception as e:
+                    print(f"Error reading headers at byte {offset}: {e}")
+                    continue
+                yield offset, headers
+
+def split_mbox_ranges(filepath, parts, start=0, end=None):
+    """Split an mbox file (or its [start, end) slice) into at most `parts`
+    byte ranges on message boundaries."""
+    size = os.path.getsize(filepath)
+    end = size if end is None else min(end, size)
+    if start >= end:
+        return []
+    span = end - start
+    with open(filepath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            bounds = sorted({find_message_boundary(mm, start + span * i // parts) for i in range(parts)})
+    bounds.append(end)
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if lo < hi]
+
+def parse_message(message):
+    """Parse a single email message into a record dict, or None if it is empty."""
+    subject = decode_mime_header(message.get('Subject', ''))
+    date = message.get('Date', '')
+    from_addr = decode_mime_header(message.get('From', ''))
+    message_id = (message.get('Message-ID') or '').strip()
     
-    categories = []
+    content = extract_text_content(message)
     
-    if any(word in text for word in ['claude', 'anthropic', 'claude code']):
-        categories.append('Claude & Anthropic')
-    if any(word in text for word in ['openai', 'gpt', 'chatgpt', 'codex', 'o1', 'gpt-5']):
-        categories.append('OpenAI & GPT')
-    if any(word in text for word in ['gemini', 'google', 'deepmind']):
-        categories.append('Google & Gemini')
-    if any(word in text for word in ['cursor', 'vscode', 'ide', 'editor']):
-        categories.append('AI Coding IDEs')
-    if any(word in text for word in ['vibe coding', 'vibe-coding', 'vibecoding']):
-        categories.append('Vibe Coding')
-    if any(word in text for word in ['prompt', 'prompting', 'prompt engineering']):
-        categories.append('Prompt Engineering')
-    if any(word in text for word in ['agent', 'agents', 'agentic']):
-        categories.append('AI Agents')
-    if any(word in text for word in ['mcp', 'model context protocol']):
-        categories.append('MCP (Model Context Protocol)')
-    if any(word in text for word in ['replit', 'bolt', 'lovable', 'v0', 'builder']):
-        categories.append('No-Code/Low-Code AI Builders')
-    if any(word in text for word in ['robot', 'humanoid', 'physical ai']):
-        categories.append('Physical AI & Robotics')
-    if any(word in text for word in ['video', 'image', 'visual', 'design']):
-        categories.append('AI Visual Tools')
-    if any(word in text for word in ['course', 'tutorial', 'learn', 'training', 'masterclass']):
-        categories.append('Learning Resources')
-    if any(word in text for word in ['saas', 'startup', 'business', 'launch']):
-        categories.append('AI for Business')
-    if any(word in text for word in ['llm', 'model', 'parameter', 'fine-tuning']):
-        categories.append('LLM & Models')
-    if any(word in text for word in ['nvidia', 'hardware', 'compute']):
-        categories.append('AI Hardware & Compute')
-    if any(word in text for word in ['research', 'paper', 'study', 'stanford', 'report', 'arxiv', 'publication']):
-        categories.append('AI Research & Reports')
-    if any(word in text for word in ['perplexity', 'notebooklm', 'devin', 'windsurf', 'codeium', 'tabnine', 'sourcegraph']):
-        categories.append('AI Tools & Platforms')
-    if any(word in text for word in ['audio', 'music', 'voice', 'speech', 'tts', 'whisper', 'sound']):
-        categories.append('AI Audio & Music')
-    if any(word in text for word in ['automation', 'automate', 'workflow', 'n8n', 'zapier', 'make.com']):
-        categories.append('AI Automation & Workflows')
-    if any(word in text for word in ['introducing', 'launched', 'announcing', 'new tool', 'just released', 'now available', 'check out', 'product hunt']):
-        categories.append('New AI Tool Announcements')
-    if any(word in text for word in ['tips', 'tricks', 'commands', 'cheatsheet', 'best practices', 'how to', 'guide to', 'ways to', 'steps to', 'things you']):
-        categories.append('Developer Tips & Lists')
+    content = content.split('-------------------------------------------------')[0].strip()
     
-    if not categories:
-        categories.append('General AI')
+    links = extract_links(content)
     
-    return categories
-
-def parse_mbox_file(filepath):
-    """Parse mbox file and extract all emails."""
-    emails = []
+    categories = categorize_email(subject, content)
     
-    mbox = mailbox.mbox(filepath)
+    if not (subject or content.strip()):
+        return None
     
-    for message in mbox:
+    return {
+        'subject': subject,
+        'date': date,
+        'from': from_addr,
+        'message_id': message_id,
+        'content': content,
+        'links': links,
+        'categories': categories
+    }
+
+def iter_parsed_messages(filepath, start=0, end=None, skip=None):
+    """Stream (next_offset, record) pairs from an mbox file.
+
+    ``next_offset`` is the byte position just past the message, i.e. where a
+    later run should resume once this record has been committed. Messages
+    whose offset is in ``skip`` (e.g. known duplicates) are not parsed.
+    """
+    for offset, next_offset, raw in iter_mbox_messages(filepath, start, end, skip):
         try:
-            subject = decode_mime_header(message.get('Subject', ''))
-            date = message.get('Date', '')
-            from_addr = decode_mime_header(message.get('From', ''))
-            
-            content = extract_text_content(message)
-            
-            content = content.split('-------------------------------------------------')[0].strip()
-            
-            links = extract_links(content)
-            
-            categories = categorize_email(subject, content)
-            
-            if subject or content.strip():
-                emails.append({
-                    'subject': subject,
-                    'date': date,
-                    'from': from_addr,
-                    'content': content,
-                    'links': links,
-                    'categories': categories
-                })
+            record = parse_message(email.message_from_bytes(raw))
         except Exception as e:
-            print(f"Error parsing message: {e}")
+            print(f"Error parsing message at byte {offset}: {e}")
             continue
+        if record:
+            yield next_offset, record
+
+def iter_parsed_emails(filepath, start=0, end=None):
+    """Stream parsed email records from an mbox file, one message at a time."""
+    for _, record in iter_parsed_messages(filepath, start, end):
+        yield record
+
+def _parse_range(filepath, start, end, skip=None):
+    """Process-pool worker: parse every message in one byte range."""
+    return list(iter_parsed_messages(filepath, start, end, skip))
+
+def iter_parsed_messages_parallel(filepath, workers=None, start=0, end=None, skip=None):
+    """Parse an mbox file across a process pool, yielding (next_offset, record)
+    pairs in file order.
+
+    The file is cut into ranges of roughly PARALLEL_CHUNK_BYTES on message
+    boundaries. Only a small window of ranges is in flight at once so memory
+    stays bounded even for very large exports. Each worker receives only the
+    ``skip`` offsets that fall inside its range.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(filepath) if end is None else end
+    parts = max(workers, (size - start) // PARALLEL_CHUNK_BYTES + 1)
+    ranges = split_mbox_ranges(filepath, parts, start, size)
+    skip_sorted = sorted(skip) if skip else []
     
-    return emails
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for lo, hi in ranges:
+            range_skip = frozenset(skip_sorted[bisect_left(skip_sorted, lo):bisect_left(skip_sorted, hi)])
+            pending.append(executor.submit(_parse_range, filepath, lo, hi, range_skip))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def iter_parsed_emails_parallel(filepath, workers=None):
+    """Parse an mbox file across a process pool, yielding records in file order."""
+    for _, record in iter_parsed_messages_parallel(filepath, workers):
+        yield record
+
+def parse_mbox_file(filepath, workers=1):
+    """Parse mbox file and extract all emails.
+
+    With workers > 1 (or None for one per CPU) messages are parsed in a
+    process pool; output order always matches the file.
+    """
+    if workers == 1:
+        return list(iter_parsed_emails(filepath))
+    return list(iter_parsed_emails_parallel(filepath, workers))
 
 if __name__ == "__main__":
     emails = parse_mbox_file("attached_assets/AI_1767978834302.mbox")
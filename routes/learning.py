@@ -62,9 +62,9 @@ def api_complete_lesson(lesson_id):
 @learning_bp.route('/lessons/<int:lesson_id>')
 def api_lesson_detail(lesson_id):
     """Get full lesson details including content, links, and related emails."""
-    from database import get_connection
+    from database import get_read_connection
     
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get lesson info
@@ -83,7 +83,7 @@ def api_lesson_detail(lesson_id):
         # Get the source email via lesson_sources table
         cursor.execute('''
             SELECT e.id, e.subject, e.content, e.summary, e.date
-            FROM emails e
+            FROM emails_full e
             JOIN lesson_sources ls ON e.id = ls.email_id
             WHERE ls.lesson_id = ?
             LIMIT 1
@@ -94,9 +94,10 @@ def api_lesson_detail(lesson_id):
         enriched_links = []
         if source_email:
             cursor.execute('''
-                SELECT url, title, description, domain
-                FROM email_links
-                WHERE email_id = ? AND title IS NOT NULL
+                SELECT u.url, u.title, u.description, u.domain
+                FROM email_links el
+                JOIN urls u ON u.id = el.url_id
+                WHERE el.email_id = ? AND u.title IS NOT NULL
                 LIMIT 5
             ''', (source_email['id'],))
             enriched_links = [dict(row) for row in cursor.fetchall()]
@@ -120,7 +121,7 @@ def api_lesson_detail(lesson_id):
             JOIN email_categories ec ON e.id = ec.email_id
             WHERE ec.category = (SELECT title FROM modules WHERE id = ?)
             AND e.id != ?
-            ORDER BY e.date_parsed DESC
+            ORDER BY e.date_ts DESC
             LIMIT 5
         ''', (lesson['module_id'], source_email['id'] if source_email else 0))
         related = [dict(row) for row in cursor.fetchall()]
@@ -144,8 +145,8 @@ def api_get_quiz(lesson_id):
     
     if not questions:
         # Generate quiz on demand if none exists
-        from database import get_connection
-        with get_connection() as conn:
+        from database import get_read_connection
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT title, content FROM lessons WHERE id = ?', (lesson_id,))
             lesson = cursor.fetchone()
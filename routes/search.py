@@ -79,7 +79,7 @@ def api_search_suggest():
         return jsonify([])
     
     # Get entities matching query
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT name, type, mention_count
@@ -133,5 +133,5 @@ def api_embedding_stats():
     return jsonify(stats)
 
 
-# Import get_connection for search suggestions
-from database import get_connection
+# Import get_read_connection for search suggestions
+from database import get_read_connection
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark for AI Knowledge Base.
+Generates synthetic mbox files of the requested sizes and runs each import
+stage against a scratch database, reporting throughput, peak RSS and
+database size per stage. Each stage runs in a fresh process so its peak RSS
+is its own.
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = ['parse', 'migrate', 'tools', 'entities', 'embeddings']
+EMBEDDING_DIMENSIONS = 1536
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its children, in MB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def database_size_mb(db_path):
+    """Size of the database including any WAL file, in MB."""
+    paths = [db_path, db_path + '-wal']
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / (1024 * 1024)
+
+
+def use_local_embeddings():
+    """Swap the embeddings API for random vectors so only the storage path is measured."""
+    import random
+    from services import embeddings
+    rng = random.Random(0)
+    embeddings.get_openai_client = lambda: 'local'
+    embeddings.embed_texts_batch = lambda texts, client=None, batch_size=100: [
+        [rng.uniform(-1, 1) for _ in range(EMBEDDING_DIMENSIONS)] for _ in texts
+    ]
+
+
+def run_stage(stage, workdir, mbox_path, workers, embeddings_mode):
+    """Run one stage against the scratch database. Returns the items processed."""
+    import database
+    database.DATABASE_PATH = os.path.join(workdir, 'knowledge.db')
+    json_path = os.path.join(workdir, 'parsed_emails.json')
+
+    if stage == 'parse':
+        from parse_mbox import parse_mbox_file
+        emails = parse_mbox_file(mbox_path, workers=workers)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(emails, f, ensure_ascii=False)
+        return len(emails)
+
+    if stage == 'migrate':
+        from scripts.migrate_to_sqlite import migrate_emails
+        migrate_emails(json_path)
+        return database.get_email_count()
+
+    if stage == 'tools':
+        from services.tools import populate_tools_table
+        populate_tools_table()
+        return database.get_email_count()
+
+    if stage == 'entities':
+        from services.entities import populate_entities_table
+        populate_entities_table()
+        return database.get_email_count()
+
+    if stage == 'embeddings':
+        if embeddings_mode == 'local':
+            use_local_embeddings()
+        from services.embeddings import generate_all_embeddings
+        return generate_all_embeddings()
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _stage_worker(stage, workdir, mbox_path, workers, embeddings_mode, results):
+    """Child process entry point: run a stage with its output sent to a log."""
+    with open(os.path.join(workdir, 'benchmark.log'), 'a', encoding='utf-8') as log, redirect_stdout(log):
+        print(f"\n=== {stage} ===")
+        started = time.monotonic()
+        try:
+            items = run_stage(stage, workdir, mbox_path, workers, embeddings_mode)
+            error = None
+        except Exception as e:
+            items, error = 0, str(e)
+        seconds = time.monotonic() - started
+    results.put({'items': items, 'seconds': seconds, 'peak_rss_mb': peak_rss_mb(), 'error': error})
+
+
+def benchmark_size(messages, workdir, stages, workers=1, embeddings_mode='skip', seed=0):
+    """Generate a corpus of `messages` messages and time every stage on it."""
+    from scripts.generate_synthetic_mbox import generate_mbox
+
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, 'knowledge.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    mbox_path = os.path.join(workdir, f'synthetic_{messages}.mbox')
+
+    started = time.monotonic()
+    mbox_bytes = generate_mbox(mbox_path, messages, seed=seed)
+    print(f"  Generated {messages} messages ({mbox_bytes / 1024 / 1024:.1f} MB) "
+          f"in {time.monotonic() - started:.1f}s")
+
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for stage in stages:
+        if stage == 'embeddings' and embeddings_mode == 'skip':
+            continue
+        results = context.Queue()
+        process = context.Process(target=_stage_worker,
+                                  args=(stage, workdir, mbox_path, workers, embeddings_mode, results))
+        process.start()
+        process.join()
+        if results.empty():
+            # Killed before reporting, e.g. by the OOM killer
+            result = {'items': 0, 'seconds': 0, 'peak_rss_mb': 0,
+                      'error': f'process exited with code {process.exitcode}'}
+        else:
+            result = results.get()
+
+        result.update({
+            'messages': messages,
+            'stage': stage,
+            'per_second': result['items'] / result['seconds'] if result['seconds'] else 0,
+            'db_mb': database_size_mb(db_path),
+        })
+        rows.append(result)
+        status = f"failed: {result['error']}" if result['error'] else \
+            f"{result['items']} items, {result['per_second']:.0f}/s"
+        print(f"  [{stage}] {result['seconds']:.1f}s, {status}, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB, DB {result['db_mb']:.1f} MB")
+    return rows
+
+
+def print_report(rows):
+    print(f"\n{'Messages':>9} {'Stage':<11} {'Items':>9} {'Seconds':>9} {'Items/s':>9} {'Peak MB':>8} {'DB MB':>8}")
+    for row in rows:
+        print(f"{row['messages']:>9} {row['stage']:<11} {row['items']:>9} {row['seconds']:>9.1f} "
+              f"{row['per_second']:>9.0f} {row['peak_rss_mb']:>8.0f} {row['db_mb']:>8.1f}"
+              + (f"  ({row['error']})" if row['error'] else ''))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the import stages on synthetic corpora')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Corpus sizes (messages) to benchmark')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='Stages to run, in order')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse with N processes (0 = one per CPU)')
+    parser.add_argument('--embeddings', choices=['skip', 'local', 'api'], default='skip',
+                        help='skip the embeddings stage, use random local vectors '
+                             '(measures storage only), or call the real API')
+    parser.add_argument('--workdir', default=None,
+                        help='Directory for corpora and scratch databases (default: a temp dir)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed for the synthetic corpora')
+    parser.add_argument('--json', dest='json_out', default=None,
+                        help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='kb-benchmark-')
+    print(f"Benchmarking in {workdir} (stage output in benchmark.log)")
+
+    all_rows = []
+    for messages in args.sizes:
+        print(f"\n{messages} messages:")
+        all_rows.extend(benchmark_size(messages, os.path.join(workdir, str(messages)), args.stages,
+                                       workers=args.workers or None, embeddings_mode=args.embeddings,
+                                       seed=args.seed))
+    print_report(all_rows)
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(all_rows, f, indent=2)
+        print(f"\nResults written to {args.json_out}")
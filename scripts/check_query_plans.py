@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Query plan check for AI Knowledge Base.
+Collects every SQL statement passed to execute/executemany in database.py,
+services/ and routes/, runs EXPLAIN QUERY PLAN on each against a seeded
+scratch database, and fails if any of them scans a large table in full.
+Run it before deploying schema or query changes:
+
+    python3 scripts/check_query_plans.py
+
+Functions that are meant to read a whole table (rebuilds, corpus-wide
+stats) are listed in EXPECTED_SCANS with the reason.
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+import sqlite3
+import tempfile
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SOURCES = ['database.py', 'services/*.py', 'routes/*.py']
+
+# Tables that grow with the corpus; a full scan of any of them is a regression
+LARGE_TABLES = {
+    'emails', 'email_bodies', 'emails_fts', 'email_links', 'urls', 'email_categories',
+    'email_entities', 'tool_mentions', 'lesson_sources', 'email_minhashes',
+    'minhash_bands', 'pipeline_dirty', 'summary_cache', 'dedupe_keys', 'data_changes',
+}
+
+# (file, function) -> why its statements read whole tables on purpose
+EXPECTED_SCANS = {
+    ('database.py', 'get_email_count'): 'corpus-wide count',
+    ('database.py', 'get_all_categories'): 'counts per category over the corpus',
+    ('services/analytics.py', 'get_overall_stats'): 'corpus-wide counts',
+    ('services/analytics.py', 'get_category_stats'): 'counts per category over the corpus',
+    ('services/analytics.py', 'get_all_categories_alphabetical'): 'counts per category over the corpus',
+    ('services/bodies.py', 'create_dictionary'): 'samples bodies at random',
+    ('services/bodies.py', 'recompress_bodies'): 'rewrites every body',
+    ('services/bodies.py', 'get_body_stats'): 'corpus-wide sizes',
+    ('services/curriculum.py', 'get_category_based_curriculum'): 'counts per category over the corpus',
+    ('services/dedupe.py', 'get_dedupe_key_count'): 'corpus-wide count',
+    ('services/embeddings.py', 'generate_all_embeddings'): 'finds every email still without an embedding',
+    ('services/embeddings.py', 'semantic_search'): 'compares the query with every embedding',
+    ('services/embeddings.py', 'get_embedding_stats'): 'corpus-wide counts',
+    ('services/entities.py', 'populate_entities_table'): 'full rebuild',
+    ('services/link_enricher.py', 'get_enrichment_stats'): 'corpus-wide counts',
+    ('services/near_duplicates.py', 'get_minhash_count'): 'corpus-wide count',
+    ('services/pipeline.py', 'get_dirty_counts'): 'counts per stage',
+    ('services/pipeline.py', 'mark_all_dirty'): 'queues every email',
+    ('services/summary_cache.py', 'purge_stale_summaries'): 'maintenance sweep',
+    ('services/tools.py', 'populate_tools_table'): 'full rebuild',
+}
+
+# Functions that only run against older schemas, during migration
+LEGACY_SCHEMA = {
+    ('services/bodies.py', 'move_inline_bodies'),
+    ('services/urls.py', 'backfill_url_ids'),
+}
+
+EXECUTE_METHODS = {'execute', 'executemany', 'execute_write', 'executemany_write'}
+CHECKED_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'REPLACE', 'UPDATE', 'DELETE')
+SQL_KEYWORDS = {
+    'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'OUTER', 'ON', 'USING', 'GROUP', 'ORDER',
+    'LIMIT', 'HAVING', 'UNION', 'EXCEPT', 'INTERSECT', 'SET', 'VALUES', 'AS', 'NOT', 'INDEXED',
+    'WINDOW', 'RETURNING', 'NATURAL',
+}
+
+
+class Statement:
+    """One SQL statement found in the source, rendered to runnable SQL."""
+
+    def __init__(self, path, line, function, sql):
+        self.path = path
+        self.line = line
+        self.function = function
+        self.sql = sql
+
+    @property
+    def location(self):
+        return f"{self.path}:{self.line} ({self.function})"
+
+
+def _loop_values(name, parents):
+    """Constant strings a loop variable takes, if it loops over a literal tuple."""
+    for node in parents:
+        if (isinstance(node, ast.For) and isinstance(node.target, ast.Name) and node.target.id == name
+                and isinstance(node.iter, (ast.Tuple, ast.List))
+                and all(isinstance(e, ast.Constant) for e in node.iter.elts)):
+            return [e.value for e in node.iter.elts]
+    return None
+
+
+def _render_value(source, node, module_globals, parents):
+    """Possible text for one {...} in an f-string, or None if it can't be known."""
+    text = ast.get_source_segment(source, node)
+    if text.endswith('placeholders'):
+        return ['?, ?']
+    if text == 'where':  # near_duplicates.find_cluster
+        return ['(band = ? AND bucket = ?) OR (band = ? AND bucket = ?)']
+    if text == 'columns':  # fts_search
+        return ['e.*']
+    if isinstance(node, ast.Name):
+        if node.id in module_globals:
+            return [str(module_globals[node.id])]
+        values = _loop_values(node.id, parents)
+        if values is not None:
+            return [str(v) for v in values]
+    return None
+
+
+def _render_sql(source, node, module_globals, parents):
+    """All SQL strings a literal or f-string argument can produce, or None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if not isinstance(node, ast.JoinedStr):
+        return None
+    variants = ['']
+    for part in node.values:
+        if isinstance(part, ast.Constant):
+            variants = [v + part.value for v in variants]
+            continue
+        values = _render_value(source, part.value, module_globals, parents)
+        if values is None:
+            return None
+        variants = [v + value for v in variants for value in values]
+    return variants
+
+
+def _module_globals(path):
+    """Module-level constants of a source file (e.g. FTS_WEIGHTS)."""
+    import importlib
+    module_name = os.path.relpath(path, ROOT)[:-3].replace(os.sep, '.')
+    try:
+        with redirect_stdout(open(os.devnull, 'w')):
+            module = importlib.import_module(module_name)
+    except ImportError:
+        return {}  # optional dependencies such as flask or openai are missing
+    return {k: v for k, v in vars(module).items() if k.isupper() and isinstance(v, (str, int, float))}
+
+
+def find_statements(sources=SOURCES):
+    """Every DML/SELECT statement passed to an execute call. Returns
+    (statements, unresolved) where unresolved lists calls whose SQL is
+    built at runtime and can't be checked."""
+    statements = []
+    unresolved = []
+    for pattern in sources:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            relpath = os.path.relpath(path, ROOT)
+            module_globals = _module_globals(path)
+
+            def visit(node, parents):
+                if isinstance(node, ast.Call) and node.args:
+                    func = node.func
+                    name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+                    if name in EXECUTE_METHODS:
+                        function = next((p.name for p in parents
+                                         if isinstance(p, (ast.FunctionDef, ast.AsyncFunctionDef))), '<module>')
+                        variants = _render_sql(source, node.args[0], module_globals, parents)
+                        if variants is None:
+                            unresolved.append(f"{relpath}:{node.lineno} ({function})")
+                        for sql in variants or []:
+                            if sql.strip().upper().startswith(CHECKED_STATEMENTS):
+                                statements.append(Statement(relpath, node.lineno, function, sql))
+                for child in ast.iter_child_nodes(node):
+                    visit(child, [node] + parents)
+
+            visit(ast.parse(source), [])
+    return statements, unresolved
+
+
+def table_aliases(sql, conn):
+    """Map each name a query plan may show (table, alias, view alias) to its table."""
+    view_sql = ' '.join(row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'"))
+    aliases = {}
+    for match in re.finditer(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?',
+                             f"{sql} {view_sql}", re.IGNORECASE):
+        table, alias = match.group(1), match.group(2)
+        aliases.setdefault(table, table)
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases.setdefault(alias, table)
+    return aliases
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN rows for `sql`, binding NULL for every parameter."""
+    params = []
+    while True:
+        try:
+            return conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        except sqlite3.ProgrammingError as e:
+            # "... The current statement uses N, and there are M supplied."
+            match = re.search(r'uses (\d+)', str(e))
+            if not match or len(params) == int(match.group(1)):
+                raise
+            params = [None] * int(match.group(1))
+
+
+def full_scans(conn, statement):
+    """Plan steps that read a large table in full.
+
+    Walking a whole index counts too, as does an automatic index: SQLite
+    builds one by scanning the table on every run of the query.
+    """
+    aliases = table_aliases(statement.sql, conn)
+    scans = []
+    for row in explain(conn, statement.sql):
+        detail = row[3]
+        match = (re.match(r'SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$', detail)
+                 or re.match(r'SEARCH (\w+) USING AUTOMATIC', detail))
+        if match and aliases.get(match.group(1), match.group(1)) in LARGE_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def seed_database(workdir, messages):
+    """Build a scratch database from a synthetic mbox, with every table populated."""
+    import database
+    from parse_mbox import parse_mbox_file
+    from scripts.generate_synthetic_mbox import generate_mbox
+    from scripts.migrate_to_sqlite import build_trend_snapshots
+    from services.ingest import insert_emails
+    from services.tools import populate_tools_table
+    from services.entities import populate_entities_table
+    from services.curriculum import initialize_curriculum
+
+    database.DATABASE_PATH = os.path.join(workdir, 'knowledge.db')
+    mbox_path = os.path.join(workdir, 'seed.mbox')
+    with redirect_stdout(open(os.devnull, 'w')):
+        generate_mbox(mbox_path, messages)
+        emails = parse_mbox_file(mbox_path)
+        database.init_database()
+        with database.get_connection() as conn:
+            insert_emails(conn.cursor(), emails)
+            conn.commit()
+        populate_tools_table()
+        populate_entities_table()
+        initialize_curriculum()
+        build_trend_snapshots()
+    return database.DATABASE_PATH
+
+
+def check(db_path, verbose=False):
+    """Explain every statement against `db_path`. Returns the number of failures."""
+    from database import open_connection
+    statements, unresolved = find_statements()
+    conn = open_connection(db_path, readonly=True)
+    failures = 0
+    errors = 0
+    expected = 0
+    for statement in statements:
+        if (statement.path, statement.function) in LEGACY_SCHEMA:
+            continue
+        try:
+            scans = full_scans(conn, statement)
+        except sqlite3.Error as e:
+            print(f"ERROR {statement.location}: {e}")
+            errors += 1
+            continue
+        if scans and (statement.path, statement.function) in EXPECTED_SCANS:
+            expected += 1
+        elif scans:
+            failures += 1
+            print(f"FULL SCAN {statement.location}: {', '.join(scans)}")
+            print('    ' + ' '.join(statement.sql.split())[:200])
+        elif verbose:
+            print(f"ok {statement.location}")
+    conn.close()
+
+    print(f"\nChecked {len(statements)} statements: {failures} with full scans, {errors} errors, "
+          f"{expected} expected scans")
+    if unresolved:
+        print(f"Not checked ({len(unresolved)}, SQL built at runtime): {', '.join(unresolved)}")
+    return failures + errors
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fail on full scans of large tables in any query plan')
+    parser.add_argument('--db', default=None,
+                        help='Check against this database instead of seeding a scratch one')
+    parser.add_argument('--messages', type=int, default=500,
+                        help='Synthetic messages to seed the scratch database with')
+    parser.add_argument('--verbose', action='store_true',
+                        help='List statements that pass too')
+    args = parser.parse_args()
+
+    if args.db:
+        failed = check(args.db, args.verbose)
+    else:
+        with tempfile.TemporaryDirectory(prefix='query-plans-') as workdir:
+            print(f"Seeding scratch database with {args.messages} synthetic messages...")
+            failed = check(seed_database(workdir, args.messages), args.verbose)
+    sys.exit(1 if failed else 0)
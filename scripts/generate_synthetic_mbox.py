@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic mbox files for capacity testing.
+Message shape (body length, link count, vocabulary, link hosts, senders) is
+sampled from parsed_emails.json, mixed with HTML-only and multipart messages,
+attachments, exact re-sends and lightly edited near-duplicates.
+"""
+
+import os
+import sys
+import json
+import random
+import time
+from collections import deque
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime, parsedate_to_datetime, parseaddr, formataddr
+from email.charset import Charset, QP
+from datetime import datetime, timedelta, timezone
+from html import escape
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_emails.json')
+
+# Share of messages per body format; the rest are plain text only
+HTML_ONLY_RATIO = 0.15
+MULTIPART_RATIO = 0.60
+ATTACHMENT_RATIO = 0.05
+DUPLICATE_RATIO = 0.05
+NEAR_DUPLICATE_RATIO = 0.03
+TRACKING_LINK_RATIO = 0.2
+
+# Recent messages that re-sends and near-duplicates are drawn from
+DUPLICATE_WINDOW = 500
+ATTACHMENT_SIZES = (4 * 1024, 64 * 1024, 512 * 1024)
+MESSAGES_PER_DAY = 25
+# Bodies are quoted-printable like most mail clients send them
+UTF8_QP = Charset('utf-8')
+UTF8_QP.body_encoding = QP
+
+FOOTER = '-------------------------------------------------\n\nSent from the synthetic corpus generator'
+
+# Used when parsed_emails.json is not available
+FALLBACK_PROFILE = {
+    'words': ('claude code cursor agent agents mcp model prompt gemini openai gpt workflow '
+              'automation launch startup video image voice research paper tutorial build '
+              'ship deploy context window tool tools new just released the a to and of for '
+              'with your you this that is are in on it how why what').split(),
+    'lengths': [120, 280, 280, 450, 900, 2500],
+    'link_counts': [0, 1, 1, 1, 2, 3],
+    'links': ['https://x.com/user/status/2010000000000000000', 'https://www.anthropic.com/news',
+              'https://youtu.be/abcdefghijk', 'https://github.com/org/repo', 'https://t.co/AbCdEfGhIj'],
+    'senders': ['Sample Sender <sender@example.com>'],
+}
+
+
+def load_profile(path=PROFILE_PATH, max_words=50000):
+    """Distributions to sample synthetic messages from, taken from parsed emails."""
+    if not os.path.exists(path):
+        print(f"  {path} not found, using the built-in profile")
+        return FALLBACK_PROFILE
+
+    with open(path, 'r', encoding='utf-8') as f:
+        emails = json.load(f)
+    if not emails:
+        return FALLBACK_PROFILE
+
+    words = []
+    for email in emails:
+        words.extend(email.get('content', '').split())
+        if len(words) >= max_words:
+            break
+    return {
+        'words': [word for word in words if '://' not in word] or FALLBACK_PROFILE['words'],
+        'lengths': [len(email.get('content', '')) for email in emails],
+        'link_counts': [len(email.get('links', [])) for email in emails],
+        'links': [link for email in emails for link in email.get('links', [])] or FALLBACK_PROFILE['links'],
+        'senders': [email['from'] for email in emails if email.get('from')] or FALLBACK_PROFILE['senders'],
+    }
+
+
+class SyntheticMailGenerator:
+    """Produce realistic mbox entries from a profile, reproducibly for a seed."""
+
+    def __init__(self, profile, seed=0, start=None):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.date = start or datetime(2025, 1, 1, 8, 0, tzinfo=timezone(timedelta(hours=-5)))
+        self.recent = deque(maxlen=DUPLICATE_WINDOW)
+        self.hosts = sorted({urlsplit(link).netloc for link in profile['links']} - {''})
+        self.seed = seed
+        self.serial = 0
+        self.count = 0
+
+    def _text(self, length):
+        words = []
+        size = 0
+        while size < length:
+            word = self.rng.choice(self.profile['words'])
+            words.append(word)
+            size += len(word) + 1
+        return ' '.join(words)
+
+    def _link(self):
+        rng = self.rng
+        if rng.random() < 0.5 or not self.hosts:
+            link = rng.choice(self.profile['links'])
+        else:
+            # Unseen pages on known hosts, so the URL count grows with the corpus
+            self.serial += 1
+            link = f"https://{rng.choice(self.hosts)}/{rng.choice(self.profile['words']).strip('.,!?')}-{self.serial}"
+        if rng.random() < TRACKING_LINK_RATIO:
+            link += ('&' if '?' in link else '?') + f"utm_source=newsletter&utm_campaign=c{rng.randrange(100)}"
+        return link
+
+    def _body(self):
+        rng = self.rng
+        text = self._text(rng.choice(self.profile['lengths']))
+        links = [self._link() for _ in range(rng.choice(self.profile['link_counts']))]
+        words = text.split(' ')
+        for link in links:
+            words.insert(rng.randrange(len(words) + 1), link)
+        return ' '.join(words)
+
+    def _boundary(self):
+        return f"{self.rng.getrandbits(96):024x}"
+
+    def _next_date(self):
+        self.date += timedelta(seconds=self.rng.expovariate(MESSAGES_PER_DAY / 86400))
+        return self.date
+
+    def _edit(self, body):
+        """A lightly edited copy: a few words replaced and a forward note."""
+        words = body.split(' ')
+        for _ in range(max(1, len(words) // 50)):
+            words[self.rng.randrange(len(words))] = self.rng.choice(self.profile['words'])
+        return 'Fwd: worth a look\n\n' + ' '.join(words)
+
+    def message(self):
+        """Build the next message and return it as a MIME message."""
+        rng = self.rng
+        roll = rng.random()
+        if self.recent and roll < DUPLICATE_RATIO:
+            # Exact re-send, e.g. the same message exported twice
+            return self.recent[rng.randrange(len(self.recent))]
+        if self.recent and roll < DUPLICATE_RATIO + NEAR_DUPLICATE_RATIO:
+            subject, body, sender = self.recent[rng.randrange(len(self.recent))].synthetic
+            body = self._edit(body)
+            subject = 'Fwd: ' + subject
+        else:
+            body = self._body()
+            subject = ' '.join(body.split()[:12])[:200]
+            sender = rng.choice(self.profile['senders'])
+
+        plain = f"{body}\n\n{FOOTER}\n"
+        html = f"<html><body><div dir=\"ltr\">{escape(body)}</div><div>{escape(FOOTER)}</div></body></html>"
+        format_roll = rng.random()
+        if format_roll < HTML_ONLY_RATIO:
+            msg = MIMEText(html, 'html', UTF8_QP)
+        elif format_roll < HTML_ONLY_RATIO + MULTIPART_RATIO:
+            msg = MIMEMultipart('alternative', boundary=self._boundary())
+            msg.attach(MIMEText(plain, 'plain', UTF8_QP))
+            msg.attach(MIMEText(html, 'html', UTF8_QP))
+        else:
+            msg = MIMEText(plain, 'plain', UTF8_QP)
+        if rng.random() < ATTACHMENT_RATIO:
+            attachment = MIMEApplication(rng.randbytes(rng.choice(ATTACHMENT_SIZES)), 'pdf')
+            attachment.add_header('Content-Disposition', 'attachment',
+                                  filename=f"attachment-{rng.randrange(10 ** 6)}.pdf")
+            msg = MIMEMultipart('mixed', boundary=self._boundary(), _subparts=[msg, attachment])
+
+        address = formataddr(parseaddr(sender), charset='utf-8')
+        msg['From'] = address
+        msg['To'] = address
+        msg['Subject'] = Header(subject, 'utf-8')
+        msg['Date'] = format_datetime(self._next_date())
+        self.count += 1
+        msg['Message-ID'] = f"<{self.count}.{self.seed}@synthetic.example>"
+
+        msg.synthetic = (subject, body, sender)
+        self.recent.append(msg)
+        return msg
+
+
+def mbox_entry(msg):
+    """Serialize a message with its mbox "From " line, escaping body lines."""
+    sender = parseaddr(msg.synthetic[2])[1] or 'synthetic@example.com'
+    sent = parsedate_to_datetime(msg['Date']).astimezone(timezone.utc)
+    envelope = f"From {sender} {sent.strftime('%a %b %d %H:%M:%S %Y')}\n".encode()
+    raw = msg.as_bytes().replace(b'\r\n', b'\n').replace(b'\nFrom ', b'\n>From ')
+    return envelope + raw + b'\n\n'
+
+
+def generate_mbox(path, messages, seed=0, profile=None):
+    """Write `messages` synthetic messages to `path`. Returns the file size."""
+    generator = SyntheticMailGenerator(profile or load_profile(), seed=seed)
+    started = time.monotonic()
+    with open(path, 'wb') as f:
+        for i in range(messages):
+            f.write(mbox_entry(generator.message()))
+            if (i + 1) % 10000 == 0:
+                rate = (i + 1) / (time.monotonic() - started)
+                print(f"  Generated {i + 1}/{messages} messages ({rate:.0f}/s)")
+    return os.path.getsize(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic mbox file for benchmarks')
+    parser.add_argument('--messages', type=int, default=1000,
+                        help='Number of messages to write')
+    parser.add_argument('--output', default='synthetic.mbox',
+                        help='Path of the mbox file to create')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed; the same seed gives the same file')
+    parser.add_argument('--profile', default=PROFILE_PATH,
+                        help='Parsed emails JSON to model messages on')
+    args = parser.parse_args()
+
+    size = generate_mbox(args.output, args.messages, seed=args.seed, profile=load_profile(args.profile))
+    print(f"✅ Wrote {args.messages} messages ({size / 1024 / 1024:.1f} MB) to {args.output}")
@@ -7,49 +7,18 @@ Preserves all existing data and creates normalized tables.
 import json
 import os
 import sys
-from datetime import datetime
-from email.utils import parsedate_to_datetime
-from urllib.parse import urlparse
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database import init_database, get_connection, get_db_path
+from services.ingest import insert_emails
+from services.changes import record_changes, ALL
 
 
-def parse_email_date(date_str):
-    """Parse email date string to datetime, with fallback."""
-    if not date_str:
-        return None
-    try:
-        return parsedate_to_datetime(date_str)
-    except Exception:
-        # Try common date formats
-        formats = [
-            '%a, %d %b %Y %H:%M:%S %z',
-            '%Y-%m-%d %H:%M:%S',
-            '%d %b %Y %H:%M:%S',
-        ]
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str.strip(), fmt)
-            except ValueError:
-                continue
-        return None
-
-
-def extract_domain(url):
-    """Extract domain from URL."""
-    try:
-        parsed = urlparse(url)
-        return parsed.netloc.lower().replace('www.', '')
-    except Exception:
-        return None
-
-
-def migrate_emails():
+def migrate_emails(json_path=None):
     """Migrate all emails from JSON to SQLite."""
-    json_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_emails.json')
+    json_path = json_path or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_emails.json')
     
     if not os.path.exists(json_path):
         print(f"Error: {json_path} not found!")
@@ -83,6 +52,8 @@ def migrate_emails():
             cursor.execute('DELETE FROM email_links')
             cursor.execute('DELETE FROM email_categories')
             cursor.execute('DELETE FROM emails')
+            cursor.execute('DELETE FROM pipeline_dirty')
+            record_changes(cursor, emails=ALL, links=ALL, categories=ALL)
             conn.commit()
         
         print("Migrating emails...")
@@ -90,49 +61,17 @@ def migrate_emails():
         links_count = 0
         categories_count = 0
         
-        for i, email in enumerate(emails):
-            # Parse date
-            date_parsed = parse_email_date(email.get('date', ''))
-            
-            # Insert email
-            cursor.execute('''
-                INSERT INTO emails (subject, content, date, date_parsed, sender, summary, original_categories)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                email.get('subject', ''),
-                email.get('content', ''),
-                email.get('date', ''),
-                date_parsed.isoformat() if date_parsed else None,
-                email.get('from', ''),
-                email.get('summary', ''),
-                json.dumps(email.get('categories', []))
-            ))
-            
-            email_id = cursor.lastrowid
+        for i in range(0, len(emails), 1000):
+            batch = emails[i:i + 1000]
+            insert_emails(cursor, batch)
+            migrated += len(batch)
+            links_count += sum(len(email.get('links', [])) for email in batch)
+            categories_count += sum(len(email.get('categories', [])) for email in batch)
             
-            # Insert links
-            for link in email.get('links', []):
-                domain = extract_domain(link)
-                cursor.execute('''
-                    INSERT INTO email_links (email_id, url, domain)
-                    VALUES (?, ?, ?)
-                ''', (email_id, link, domain))
-                links_count += 1
-            
-            # Insert categories
-            for category in email.get('categories', []):
-                cursor.execute('''
-                    INSERT OR IGNORE INTO email_categories (email_id, category)
-                    VALUES (?, ?)
-                ''', (email_id, category))
-                categories_count += 1
-            
-            migrated += 1
-            
-            # Progress update
-            if (i + 1) % 1000 == 0:
-                print(f"  Progress: {i + 1}/{len(emails)} emails migrated...")
-                conn.commit()  # Commit in batches
+            # Progress update, committing in batches
+            if migrated < len(emails):
+                print(f"  Progress: {migrated}/{len(emails)} emails migrated...")
+                conn.commit()
         
         conn.commit()
         
@@ -154,10 +93,13 @@ def migrate_emails():
             print(f"   - {row['category']}: {row['count']}")
         
         # Print date range
-        cursor.execute('SELECT MIN(date_parsed), MAX(date_parsed) FROM emails WHERE date_parsed IS NOT NULL')
+        cursor.execute('''
+            SELECT DATE(MIN(date_ts), 'unixepoch'), DATE(MAX(date_ts), 'unixepoch')
+            FROM emails WHERE date_ts IS NOT NULL
+        ''')
         date_range = cursor.fetchone()
         if date_range[0] and date_range[1]:
-            print(f"\nDate range: {date_range[0][:10]} to {date_range[1][:10]}")
+            print(f"\nDate range: {date_range[0]} to {date_range[1]}")
     
     return True
 
@@ -176,13 +118,13 @@ def build_trend_snapshots():
         cursor.execute('''
             INSERT INTO trend_snapshots (date, category, email_count)
             SELECT 
-                DATE(e.date_parsed) as date,
+                DATE(e.date_ts, 'unixepoch') as date,
                 ec.category,
                 COUNT(*) as email_count
             FROM emails e
             JOIN email_categories ec ON e.id = ec.email_id
-            WHERE e.date_parsed IS NOT NULL
-            GROUP BY DATE(e.date_parsed), ec.category
+            WHERE e.date_ts IS NOT NULL
+            GROUP BY DATE(e.date_ts, 'unixepoch'), ec.category
         ''')
         
         conn.commit()
@@ -193,6 +135,12 @@ def build_trend_snapshots():
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Migrate parsed_emails.json into the SQLite database')
+    parser.add_argument('--publish', action='store_true',
+                        help='Publish a new snapshot for the web app when done')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("AI Knowledge Base - JSON to SQLite Migration")
     print("=" * 60)
@@ -200,5 +148,8 @@ if __name__ == '__main__':
     if migrate_emails():
         build_trend_snapshots()
         print(f"\n✅ Database ready at: {get_db_path()}")
+        if args.publish:
+            from services.snapshots import publish_snapshot
+            print(f"✅ Published {publish_snapshot()}")
     else:
         print("\n❌ Migration failed or was cancelled.")
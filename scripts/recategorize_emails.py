@@ -10,6 +10,10 @@ import sqlite3
 import time
 from openai import OpenAI
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.writer import submit_write, flush_writes
+from services.changes import record_changes
+
 # Category definitions
 CATEGORIES = {
     # Tier 1: Vendor/Product
@@ -75,8 +79,9 @@ def get_email_data(conn, email_id):
     
     # Get link domains/titles
     cur.execute("""
-        SELECT domain, title FROM email_links 
-        WHERE email_id = ? AND title IS NOT NULL
+        SELECT u.domain, u.title FROM email_links el
+        JOIN urls u ON u.id = el.url_id
+        WHERE el.email_id = ? AND u.title IS NOT NULL
         LIMIT 5
     """, (email_id,))
     email['links'] = [{'domain': row['domain'], 'title': row['title'][:100] if row['title'] else ''} for row in cur.fetchall()]
@@ -121,10 +126,8 @@ Return JSON only:
         print(f"  Error classifying email {email['id']}: {e}")
         return {"primary": "General AI", "secondary": [], "confidence": 0.0}
 
-def update_email_categories(conn, email_id, primary, secondary):
-    """Update email categories in database."""
-    cur = conn.cursor()
-    
+def update_email_categories(cur, email_id, primary, secondary):
+    """Update email categories in database. Runs as a job on the shared writer."""
     # Update original_categories with new primary + secondary
     all_cats = [primary] + secondary
     cur.execute("UPDATE emails SET original_categories = ? WHERE id = ?", 
@@ -138,27 +141,15 @@ def update_email_categories(conn, email_id, primary, secondary):
         cur.execute("INSERT INTO email_categories (email_id, category) VALUES (?, ?)",
                     (email_id, cat))
     
-    conn.commit()
+    # Caches keyed on the data version drop what depended on these
+    record_changes(cur, categories=[email_id])
 
-def main():
-    # Check for API key
-    api_key = os.environ.get('OPENAI_API_KEY')
-    if not api_key:
-        print("Error: OPENAI_API_KEY not set")
-        sys.exit(1)
-    
-    client = OpenAI(api_key=api_key)
-    conn = get_db_connection()
-    
-    # Get all email IDs
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM emails ORDER BY id")
-    email_ids = [row['id'] for row in cur.fetchall()]
-    
+def recategorize(conn, client, email_ids):
+    """Classify `email_ids` and store their new categories.
+
+    Returns {primary_category: count} for the processed emails.
+    """
     total = len(email_ids)
-    print(f"Re-categorizing {total} emails...")
-    
-    stats = {"processed": 0, "errors": 0}
     category_counts = {}
     
     for i, email_id in enumerate(email_ids):
@@ -174,10 +165,9 @@ def main():
             primary = 'General AI'
         secondary = [s for s in secondary if s in CATEGORY_LIST and s != primary]
         
-        update_email_categories(conn, email_id, primary, secondary)
+        submit_write(update_email_categories, email_id, primary, secondary)
         
         # Track stats
-        stats["processed"] += 1
         category_counts[primary] = category_counts.get(primary, 0) + 1
         
         # Progress
@@ -187,10 +177,31 @@ def main():
         # Rate limiting
         time.sleep(0.1)
     
+    flush_writes()
+    return category_counts
+
+def main():
+    # Check for API key
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        print("Error: OPENAI_API_KEY not set")
+        sys.exit(1)
+    
+    client = OpenAI(api_key=api_key)
+    conn = get_db_connection()
+    
+    # Get all email IDs
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM emails ORDER BY id")
+    email_ids = [row['id'] for row in cur.fetchall()]
+    
+    print(f"Re-categorizing {len(email_ids)} emails...")
+    category_counts = recategorize(conn, client, email_ids)
+    
     conn.close()
     
     print(f"\n✅ Re-categorization complete!")
-    print(f"   Processed: {stats['processed']}")
+    print(f"   Processed: {len(email_ids)}")
     print(f"\nCategory distribution:")
     for cat, count in sorted(category_counts.items(), key=lambda x: -x[1]):
         print(f"   {cat}: {count}")
@@ -9,12 +9,14 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_read_connection
+from services.changes import cached_until_changed
 
 
+@cached_until_changed('emails', 'links', 'categories')
 def get_overall_stats():
     """Get overall statistics for the knowledge base."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Total emails
@@ -26,7 +28,7 @@ def get_overall_stats():
         total_links = cursor.fetchone()[0]
         
         # Unique domains
-        cursor.execute('SELECT COUNT(DISTINCT domain) FROM email_links WHERE domain IS NOT NULL')
+        cursor.execute('SELECT COUNT(DISTINCT domain) FROM urls WHERE domain IS NOT NULL')
         unique_domains = cursor.fetchone()[0]
         
         # Total categories
@@ -34,7 +36,10 @@ def get_overall_stats():
         total_categories = cursor.fetchone()[0]
         
         # Date range
-        cursor.execute('SELECT MIN(date_parsed), MAX(date_parsed) FROM emails WHERE date_parsed IS NOT NULL')
+        cursor.execute('''
+            SELECT DATE(MIN(date_ts), 'unixepoch'), DATE(MAX(date_ts), 'unixepoch')
+            FROM emails WHERE date_ts IS NOT NULL
+        ''')
         date_range = cursor.fetchone()
         
         # Emails with summaries
@@ -47,17 +52,18 @@ def get_overall_stats():
             'unique_domains': unique_domains,
             'total_categories': total_categories,
             'date_range': {
-                'start': date_range[0][:10] if date_range[0] else None,
-                'end': date_range[1][:10] if date_range[1] else None
+                'start': date_range[0],
+                'end': date_range[1]
             },
             'emails_with_summaries': emails_with_summaries,
             'summary_coverage': round(emails_with_summaries / total_emails * 100, 1) if total_emails > 0 else 0
         }
 
 
+@cached_until_changed('categories')
 def get_category_stats():
     """Get category breakdown with counts (sorted by count)."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT category, COUNT(*) as count 
@@ -68,9 +74,10 @@ def get_category_stats():
         return [{'category': row['category'], 'count': row['count']} for row in cursor.fetchall()]
 
 
+@cached_until_changed('categories')
 def get_all_categories_alphabetical():
     """Get all categories alphabetically with counts."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT category, COUNT(*) as count 
@@ -86,7 +93,7 @@ def get_trending_topics(days=7, limit=10):
     Get topics that have increased in mentions recently.
     Compares recent period to previous period.
     """
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get the most recent date in the database
@@ -144,7 +151,7 @@ def get_trending_topics(days=7, limit=10):
 
 def get_topic_timeline(days=30):
     """Get email counts by category over time for charting."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get the most recent date
@@ -215,28 +222,27 @@ def get_topic_timeline(days=30):
 
 def get_whats_hot(limit=10):
     """Get the most discussed topics in the last 7 days."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get the most recent date
-        cursor.execute('SELECT MAX(date_parsed) FROM emails')
-        max_date_row = cursor.fetchone()
-        if not max_date_row[0]:
+        cursor.execute('SELECT MAX(date_ts) FROM emails')
+        max_ts = cursor.fetchone()[0]
+        if max_ts is None:
             return []
         
-        max_date = datetime.fromisoformat(max_date_row[0])
-        week_ago = (max_date - timedelta(days=7)).isoformat()
+        week_ago = max_ts - int(timedelta(days=7).total_seconds())
         
         cursor.execute('''
             SELECT 
                 ec.category,
                 COUNT(*) as count,
-                MAX(e.date_parsed) as latest
+                DATE(MAX(e.date_ts), 'unixepoch') as latest
             FROM emails e
-            JOIN email_categories ec ON e.id = ec.email_id
-            WHERE e.date_parsed >= ?
+            CROSS JOIN email_categories ec ON e.id = ec.email_id  -- drive from the date range
+            WHERE e.date_ts >= ?
             GROUP BY ec.category
-            ORDER BY count DESC
+            ORDER BY count DESC, ec.category
             LIMIT ?
         ''', (week_ago, limit))
         
@@ -244,7 +250,7 @@ def get_whats_hot(limit=10):
             {
                 'category': row['category'],
                 'count': row['count'],
-                'latest': row['latest'][:10] if row['latest'] else None
+                'latest': row['latest']
             }
             for row in cursor.fetchall()
         ]
@@ -252,17 +258,16 @@ def get_whats_hot(limit=10):
 
 def get_recent_emails(limit=10):
     """Get the most recent emails."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT 
                 e.id, e.subject, e.summary, e.date_parsed,
-                GROUP_CONCAT(DISTINCT ec.category) as categories
+                (SELECT GROUP_CONCAT(DISTINCT ec.category) FROM email_categories ec
+                 WHERE ec.email_id = e.id) as categories
             FROM emails e
-            LEFT JOIN email_categories ec ON e.id = ec.email_id
-            WHERE e.date_parsed IS NOT NULL
-            GROUP BY e.id
-            ORDER BY e.date_parsed DESC
+            WHERE e.date_ts IS NOT NULL
+            ORDER BY e.date_ts DESC
             LIMIT ?
         ''', (limit,))
         
@@ -280,13 +285,14 @@ def get_recent_emails(limit=10):
 
 def get_top_domains(limit=15):
     """Get top domains by link count."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT domain, COUNT(*) as count
-            FROM email_links
-            WHERE domain IS NOT NULL AND domain != ''
-            GROUP BY domain
+            SELECT u.domain, COUNT(*) as count
+            FROM email_links el
+            JOIN urls u ON u.id = el.url_id
+            WHERE u.domain IS NOT NULL AND u.domain != ''
+            GROUP BY u.domain
             ORDER BY count DESC
             LIMIT ?
         ''', (limit,))
@@ -0,0 +1,158 @@
+"""
+Single-pass text annotator for AI Knowledge Base.
+Finds categories, tool mentions and entities in one scan of an email.
+
+All literal keywords from CATEGORY_RULES, KNOWN_ENTITIES and the leading
+literal of each TOOLS_DICTIONARY pattern are compiled into one trie-shaped
+regex. Scanning it with a zero-width lookahead reports the longest keyword
+starting at every position; shorter keywords at the same position are its
+prefixes, so they are recovered from a precomputed table. Tool patterns are
+then only verified at positions where their literal was seen.
+"""
+
+import os
+import sys
+import re
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _is_word_char(ch):
+    """Match the definition of \\w used by the re module."""
+    return ch.isalnum() or ch == '_'
+
+
+def _at_word_boundary(text, i):
+    """True where \\b would match in `text` at index `i`."""
+    before = _is_word_char(text[i - 1]) if i > 0 else False
+    after = _is_word_char(text[i]) if i < len(text) else False
+    return before != after
+
+
+def _literal_prefix(pattern):
+    """Leading literal every match of a ``\\b...`` tool pattern must start with."""
+    match = re.match(r'\\b([a-z0-9]+)', pattern)
+    if not match:
+        return None
+    literal = match.group(1)
+    if pattern[match.end():match.end() + 1] in ('?', '*', '{'):
+        literal = literal[:-1]
+    return literal or None
+
+
+def _trie_regex(words):
+    """Build a regex alternation shaped like a trie over `words`."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class TextAnnotator:
+    """Compiled multi-pattern matcher over the category, tool and entity dictionaries."""
+
+    def __init__(self, category_rules, tools_dictionary, known_entities):
+        self.categories = [name for name, _ in category_rules]
+        self.tools = list(tools_dictionary.items())
+        self.entities = list(known_entities.items())
+
+        # keyword -> list of (kind, index, compiled tool pattern or None)
+        self.actions = {}
+        self.unanchored_tools = []
+
+        for idx, (_, keywords) in enumerate(category_rules):
+            for keyword in keywords:
+                self.actions.setdefault(keyword, []).append(('category', idx, None))
+
+        for idx, (name, _) in enumerate(self.entities):
+            self.actions.setdefault(name.lower(), []).append(('entity', idx, None))
+
+        for idx, (_, info) in enumerate(self.tools):
+            for pattern in info['patterns']:
+                compiled = re.compile(pattern, re.IGNORECASE)
+                literal = _literal_prefix(pattern)
+                if literal:
+                    self.actions.setdefault(literal, []).append(('tool', idx, compiled))
+                else:
+                    self.unanchored_tools.append((idx, compiled))
+
+        # Every keyword that is a prefix of `keyword` (itself included), so
+        # the longest match at a position also yields the shorter ones.
+        self.prefixes = {
+            keyword: [keyword[:i] for i in range(1, len(keyword) + 1) if keyword[:i] in self.actions]
+            for keyword in self.actions
+        }
+        self.scanner = re.compile('(?=(' + _trie_regex(self.actions) + '))')
+
+    def annotate(self, text):
+        """Return categories, tool mentions and entities found in `text`."""
+        text = text.lower()
+        categories = set()
+        tools = set()
+        entities = set()
+
+        for match in self.scanner.finditer(text):
+            pos = match.start()
+            for keyword in self.prefixes[match.group(1)]:
+                for kind, idx, compiled in self.actions[keyword]:
+                    if kind == 'category':
+                        categories.add(idx)
+                    elif kind == 'entity':
+                        if idx not in entities and _at_word_boundary(text, pos) \
+                                and _at_word_boundary(text, pos + len(keyword)):
+                            entities.add(idx)
+                    elif idx not in tools and compiled.match(text, pos):
+                        tools.add(idx)
+
+        for idx, compiled in self.unanchored_tools:
+            if idx not in tools and compiled.search(text):
+                tools.add(idx)
+
+        category_names = [self.categories[i] for i in sorted(categories)] or ['General AI']
+        return {
+            'categories': category_names,
+            'tools': [
+                {
+                    'name': name,
+                    'category': info['category'],
+                    'company': info['company']
+                }
+                for name, info in (self.tools[i] for i in sorted(tools))
+            ],
+            'entities': [
+                {
+                    'name': name,
+                    'type': entity_type,
+                    'extraction_method': 'pattern'
+                }
+                for name, entity_type in (self.entities[i] for i in sorted(entities))
+            ]
+        }
+
+
+@lru_cache(maxsize=1)
+def get_annotator():
+    """Build the annotator once per process from the current dictionaries."""
+    from parse_mbox import CATEGORY_RULES
+    from services.tools import TOOLS_DICTIONARY
+    from services.entities import KNOWN_ENTITIES
+    return TextAnnotator(CATEGORY_RULES, TOOLS_DICTIONARY, KNOWN_ENTITIES)
+
+
+def annotate_text(text):
+    """Annotate text with categories, tool mentions and entities in one pass."""
+    return get_annotator().annotate(text)
@@ -0,0 +1,231 @@
+"""
+Compressed email body storage for AI Knowledge Base.
+Bodies live in `email_bodies` as raw deflate streams, apart from the small
+hot columns of `emails`, so scans over emails never page bodies in. Since
+newsletters repeat the same boilerplate, bodies are compressed against a
+shared preset dictionary trained from a sample of the corpus.
+
+Read bodies through the `emails_full` view, which decompresses `content`
+only for the rows and columns a query actually selects.
+"""
+
+import os
+import sys
+import zlib
+import random
+from functools import lru_cache
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# zlib only looks back 32 KB, so a larger dictionary would go unused
+DICTIONARY_SIZE = 32 * 1024
+# Bodies needed before a dictionary is worth training, and how many to sample
+MIN_TRAINING_BODIES = 200
+TRAINING_SAMPLE_SIZE = 2000
+# Shared word n-grams of this length make up the dictionary
+NGRAM_WORDS = 4
+COMPRESSION_LEVEL = 9
+# Negative wbits: raw deflate, no header or checksum (6 bytes per body)
+WBITS = -15
+
+
+@lru_cache(maxsize=8)
+def _primed_compressor(dictionary):
+    """A compressor with `dictionary` already loaded. Loading a 32 KB
+    dictionary costs more than compressing a typical body, so each body
+    gets a copy of this instead."""
+    if dictionary:
+        return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, WBITS, zdict=dictionary)
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, WBITS)
+
+
+def compress_body(text, dictionary=None):
+    """Compress a body, optionally against a preset dictionary."""
+    compressor = _primed_compressor(dictionary).copy()
+    return compressor.compress((text or '').encode('utf-8')) + compressor.flush()
+
+
+def decompress_body(body, dictionary=None):
+    """Inverse of compress_body. Also registered as an SQL function."""
+    if body is None:
+        return None
+    if dictionary:
+        decompressor = zlib.decompressobj(WBITS, zdict=dictionary)
+    else:
+        decompressor = zlib.decompressobj(WBITS)
+    return (decompressor.decompress(body) + decompressor.flush()).decode('utf-8')
+
+
+def train_dictionary(texts, size=DICTIONARY_SIZE):
+    """Build a preset dictionary from the word n-grams most shared across `texts`.
+
+    An n-gram is worth its length times the number of other bodies that
+    contain it. The most valuable go last, where deflate reaches them with
+    the shortest distances.
+    """
+    counts = Counter()
+    for text in texts:
+        words = (text or '').split()
+        counts.update({' '.join(words[i:i + NGRAM_WORDS]) for i in range(len(words) - NGRAM_WORDS + 1)})
+
+    ranked = sorted(((len(gram) * (count - 1), gram) for gram, count in counts.items() if count > 1),
+                    reverse=True)
+    chosen = []
+    total = 0
+    for _, gram in ranked:
+        total += len(gram.encode('utf-8')) + 1
+        if total > size:
+            break
+        chosen.append(gram)
+    return ' '.join(reversed(chosen)).encode('utf-8')
+
+
+def current_dictionary(cursor):
+    """(id, data) of the newest dictionary, or (None, None) if none is trained."""
+    cursor.execute('SELECT id, data FROM body_dictionaries ORDER BY id DESC LIMIT 1')
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def create_dictionary(cursor, extra_texts=()):
+    """Train a dictionary from `extra_texts` plus a sample of stored bodies.
+
+    Returns (id, data), or (None, None) with too few bodies to learn from.
+    """
+    # Sample ids first so only the sampled bodies are decompressed
+    cursor.execute('''
+        SELECT content FROM emails_full
+        WHERE id IN (SELECT email_id FROM email_bodies ORDER BY random() LIMIT ?)
+    ''', (TRAINING_SAMPLE_SIZE,))
+    texts = list(extra_texts) + [row[0] for row in cursor.fetchall()]
+    if len(texts) < MIN_TRAINING_BODIES:
+        return None, None
+    texts = random.Random(0).sample(texts, min(len(texts), TRAINING_SAMPLE_SIZE))
+    data = train_dictionary(texts)
+    cursor.execute('INSERT INTO body_dictionaries (data, sample_size) VALUES (?, ?)', (data, len(texts)))
+    return cursor.lastrowid, data
+
+
+def store_bodies(cursor, rows):
+    """Store (email_id, text) bodies for newly inserted emails.
+
+    Storing a body is what adds its email to the full-text index (see the
+    triggers in init_database). Trains the first dictionary once enough
+    bodies exist. Runs inside the caller's transaction.
+    """
+    if not rows:
+        return
+    dictionary_id, dictionary = current_dictionary(cursor)
+    if dictionary_id is None:
+        dictionary_id, dictionary = create_dictionary(cursor, [text for _, text in rows])
+    cursor.executemany('INSERT INTO email_bodies (email_id, dictionary_id, body) VALUES (?, ?, ?)', [
+        (email_id, dictionary_id, compress_body(text, dictionary)) for email_id, text in rows
+    ])
+
+
+def recompress_bodies(cursor, dictionary_id, dictionary, batch_size=1000):
+    """Rewrite every body against `dictionary` and drop unused dictionaries."""
+    cursor.execute('SELECT MAX(email_id) FROM email_bodies')
+    max_id = cursor.fetchone()[0] or 0
+    rewritten = 0
+    for start in range(0, max_id + 1, batch_size):
+        cursor.execute('''
+            SELECT b.email_id, b.body, d.data
+            FROM email_bodies b
+            LEFT JOIN body_dictionaries d ON d.id = b.dictionary_id
+            WHERE b.email_id >= ? AND b.email_id < ?
+              AND (b.dictionary_id IS NULL OR b.dictionary_id != ?)
+        ''', (start, start + batch_size, dictionary_id))
+        rows = [(dictionary_id, compress_body(decompress_body(body, old), dictionary), email_id)
+                for email_id, body, old in cursor.fetchall()]
+        cursor.executemany('UPDATE email_bodies SET dictionary_id = ?, body = ? WHERE email_id = ?', rows)
+        rewritten += len(rows)
+    cursor.execute('''
+        DELETE FROM body_dictionaries
+        WHERE id NOT IN (SELECT DISTINCT dictionary_id FROM email_bodies WHERE dictionary_id IS NOT NULL)
+    ''')
+    return rewritten
+
+
+def move_inline_bodies(cursor, batch_size=1000):
+    """Move bodies from the legacy `emails.content` column into `email_bodies`.
+
+    Used by init_database on databases created before bodies were split
+    out; the caller drops the column afterwards.
+    """
+    cursor.execute('''
+        SELECT content FROM emails
+        WHERE id IN (SELECT id FROM emails WHERE content IS NOT NULL ORDER BY random() LIMIT ?)
+    ''', (TRAINING_SAMPLE_SIZE,))
+    sample = [row[0] for row in cursor.fetchall()]
+    dictionary_id, dictionary = None, None
+    if len(sample) >= MIN_TRAINING_BODIES:
+        dictionary = train_dictionary(sample)
+        cursor.execute('INSERT INTO body_dictionaries (data, sample_size) VALUES (?, ?)',
+                       (dictionary, len(sample)))
+        dictionary_id = cursor.lastrowid
+
+    cursor.execute('SELECT MAX(id) FROM emails')
+    max_id = cursor.fetchone()[0] or 0
+    moved = 0
+    for start in range(0, max_id + 1, batch_size):
+        cursor.execute('SELECT id, content FROM emails WHERE id >= ? AND id < ?', (start, start + batch_size))
+        rows = [(email_id, dictionary_id, compress_body(content, dictionary))
+                for email_id, content in cursor.fetchall()]
+        cursor.executemany('INSERT OR IGNORE INTO email_bodies (email_id, dictionary_id, body) VALUES (?, ?, ?)',
+                           rows)
+        moved += len(rows)
+    return moved
+
+
+def get_body_stats():
+    """Raw and stored body sizes."""
+    from database import get_read_connection
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0)
+            FROM emails_full WHERE content IS NOT NULL
+        ''')
+        count, raw = cursor.fetchone()
+        cursor.execute('SELECT COALESCE(SUM(LENGTH(body)), 0), COUNT(dictionary_id) FROM email_bodies')
+        stored, with_dictionary = cursor.fetchone()
+        cursor.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM body_dictionaries')
+        dictionaries, dictionary_bytes = cursor.fetchone()
+        return {
+            'bodies': count,
+            'with_dictionary': with_dictionary,
+            'raw_bytes': raw,
+            'stored_bytes': stored,
+            'ratio': round(raw / stored, 2) if stored else 0,
+            'dictionaries': dictionaries,
+            'dictionary_bytes': dictionary_bytes,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    from database import get_connection
+    parser = argparse.ArgumentParser(description='Manage compressed email body storage')
+    parser.add_argument('--train', action='store_true',
+                        help='Train a new dictionary from the current bodies and recompress them all')
+    args = parser.parse_args()
+
+    if args.train:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            dictionary_id, dictionary = create_dictionary(cursor)
+            if dictionary_id is None:
+                print(f"Need at least {MIN_TRAINING_BODIES} bodies to train a dictionary.")
+            else:
+                print(f"Trained dictionary {dictionary_id} ({len(dictionary)} bytes)")
+                print(f"Recompressed {recompress_bodies(cursor, dictionary_id, dictionary)} bodies")
+            conn.commit()
+
+    stats = get_body_stats()
+    print(f"\n=== Body Storage ===")
+    print(f"  Bodies: {stats['bodies']} ({stats['with_dictionary']} compressed with a dictionary)")
+    print(f"  Raw: {stats['raw_bytes'] / 1024 / 1024:.1f} MB, stored: {stats['stored_bytes'] / 1024 / 1024:.1f} MB "
+          f"({stats['ratio']}x)")
+    print(f"  Dictionaries: {stats['dictionaries']} ({stats['dictionary_bytes'] / 1024:.0f} KB)")
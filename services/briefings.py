@@ -8,7 +8,7 @@ import sys
 from datetime import datetime, timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection
 from services.analytics import get_overall_stats, get_trending_topics, get_whats_hot, get_recent_emails
 from services.tools import get_tool_rankings
 
@@ -185,7 +185,7 @@ def save_briefing(briefing_data):
 
 def get_latest_briefing():
     """Get the most recent briefing from cache."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM briefings
@@ -0,0 +1,82 @@
+"""
+Bulk inserts for AI Knowledge Base.
+Table rebuilds buffer their rows and hand them to `executemany` in sized
+batches, so a rebuild makes one statement call per batch instead of one
+per row. Parent rows take ids from allocate_ids up front, which lets their
+child rows be built in the same pass without a `lastrowid` per parent.
+"""
+
+# Rows held before a buffer is written out
+BATCH_SIZE = 5000
+# Values bound per `IN (...)` lookup, well under SQLite's variable limit
+LOOKUP_CHUNK = 500
+
+
+def allocate_ids(cursor, table, count):
+    """Reserve `count` consecutive ids for explicit inserts into `table`.
+
+    Takes the write lock first if the transaction does not hold it yet, so
+    no other connection can claim the same ids before the caller inserts
+    them. Returns a range of ids.
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute('BEGIN IMMEDIATE')
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+    last = cursor.fetchone()[0]
+    # AUTOINCREMENT tables never hand out the ids of deleted rows again
+    cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+    row = cursor.fetchone()
+    if row and row[0] > last:
+        last = row[0]
+    return range(last + 1, last + 1 + count)
+
+
+def lookup_ids(cursor, table, column, values):
+    """{value: id} for the rows of `table` whose unique `column` is in `values`,
+    resolved with one `IN (...)` query per LOOKUP_CHUNK values."""
+    values = list(values)
+    ids = {}
+    for i in range(0, len(values), LOOKUP_CHUNK):
+        batch = values[i:i + LOOKUP_CHUNK]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT {column}, id FROM {table} WHERE {column} IN ({placeholders})', batch)
+        ids.update(cursor.fetchall())
+    return ids
+
+
+class BulkInserter:
+    """Buffer parameter rows for one INSERT and run them with executemany.
+
+    Use as a context manager; leaving the block writes whatever is still
+    buffered. Runs inside the caller's transaction.
+    """
+
+    def __init__(self, cursor, sql, batch_size=BATCH_SIZE):
+        self.cursor = cursor
+        self.sql = sql
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
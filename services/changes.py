@@ -0,0 +1,183 @@
+"""
+Data version and change log for AI Knowledge Base.
+Every write that changes what readers see bumps one global data version and
+logs, under the new version, which items of which kind it changed. A cached
+result stamped with a version stays valid while the version is unchanged.
+When the version moves on, get_changes_since tells the cache what changed
+in between, so it only drops entries that depend on those kinds or items.
+
+Item ids in the log, by kind:
+  emails, categories, embeddings  emails.id
+  links                           urls.id
+  tools                           tools.id
+  entities                        entities.id
+A NULL item id stands for every item of the kind (a full rebuild).
+"""
+
+import os
+import sys
+import sqlite3
+import functools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection, get_read_connection
+
+KINDS = ('emails', 'links', 'categories', 'tools', 'entities', 'embeddings')
+
+# Item ids value meaning "every item of this kind"
+ALL = None
+
+# Versions whose log entries prune_changes keeps; a cache stamped before
+# that is simply recomputed
+KEEP_VERSIONS = 1000
+
+
+def record_changes(cursor, **changes):
+    """Bump the data version and log the changed items under it.
+
+    Keyword arguments map a kind to its changed item ids, or to ALL, e.g.
+    record_changes(cursor, emails=ids, categories=ids). Kinds with no ids
+    are left out. Runs inside the caller's transaction, so the version
+    moves only if the change commits. Returns the new version, or None if
+    nothing changed.
+    """
+    rows = []
+    for kind, item_ids in changes.items():
+        if kind not in KINDS:
+            raise ValueError(f"Unknown change kind: {kind}")
+        if item_ids is ALL:
+            rows.append((kind, None))
+        else:
+            rows.extend((kind, item_id) for item_id in item_ids)
+    if not rows:
+        return None
+
+    cursor.execute('UPDATE data_version SET version = version + 1')
+    cursor.execute('SELECT version FROM data_version')
+    version = cursor.fetchone()[0]
+    cursor.executemany('INSERT INTO data_changes (version, kind, item_id) VALUES (?, ?, ?)',
+                       [(version, kind, item_id) for kind, item_id in rows])
+    return version
+
+
+def get_data_version():
+    """Current data version of what readers see, or None on a database
+    (or snapshot) from before versioning."""
+    with get_read_connection() as conn:
+        try:
+            row = conn.execute('SELECT version FROM data_version').fetchone()
+        except sqlite3.OperationalError:
+            return None
+    return row[0] if row else None
+
+
+def _log_reaches(cursor, version):
+    """Whether the log still holds every change made after `version`."""
+    # Versions are only taken by committed changes, so they have no gaps
+    # unless prune_changes removed them
+    cursor.execute('SELECT MIN(version) FROM data_changes WHERE version > ?', (version,))
+    first = cursor.fetchone()[0]
+    return first is None or first == version + 1
+
+
+def get_changed_kinds(version):
+    """Kinds changed after `version`. All kinds if the log was pruned past it."""
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        if not _log_reaches(cursor, version):
+            return set(KINDS)
+        cursor.execute('SELECT DISTINCT kind FROM data_changes WHERE version > ?', (version,))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def get_changes_since(version, kinds=KINDS):
+    """Items of `kinds` changed after `version`.
+
+    Returns {kind: set of item ids, or ALL}; unchanged kinds are left out.
+    Every kind is ALL if the log was pruned past `version`.
+    """
+    changes = {}
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        if not _log_reaches(cursor, version):
+            return {kind: ALL for kind in kinds}
+        placeholders = ','.join('?' * len(kinds))
+        cursor.execute(f'''
+            SELECT kind, item_id FROM data_changes
+            WHERE version > ? AND kind IN ({placeholders})
+        ''', [version] + list(kinds))
+        for kind, item_id in cursor.fetchall():
+            if item_id is None:
+                changes[kind] = ALL
+            elif changes.setdefault(kind, set()) is not ALL:
+                changes[kind].add(item_id)
+    return changes
+
+
+def cached_until_changed(*kinds):
+    """Memoize a read function until data of any of `kinds` changes.
+
+    Results are keyed by the call's arguments and stamped with the data
+    version they were read at. Once the version moves on, a result is kept
+    if none of `kinds` changed since its stamp. Meant for small results
+    (stats, rankings) that callers do not modify; the function must read
+    through get_read_connection, as get_data_version does.
+    """
+    def decorator(fn):
+        results = {}
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            version = get_data_version()
+            if version is None:
+                return fn(*args, **kwargs)
+            key = (args, tuple(sorted(kwargs.items())))
+            cached = results.get(key)
+            if cached is not None:
+                stamp, value = cached
+                # A newer stamp means the app went back to an older snapshot
+                if stamp == version or (stamp < version and not get_changed_kinds(stamp) & set(kinds)):
+                    results[key] = (version, value)
+                    return value
+            # Stamped with the version read before the query, so a change
+            # committed in between makes the next call check again
+            value = fn(*args, **kwargs)
+            results[key] = (version, value)
+            return value
+
+        wrapper.cache_clear = results.clear
+        return wrapper
+    return decorator
+
+
+def prune_changes(keep=KEEP_VERSIONS):
+    """Drop log entries older than the newest `keep` versions. Returns rows deleted."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM data_changes WHERE version <= (SELECT version FROM data_version) - ?',
+                       (keep,))
+        deleted = cursor.rowcount
+        conn.commit()
+    return deleted
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Show the data version and recent changes')
+    parser.add_argument('--since', type=int, default=None,
+                        help='List what changed after this version')
+    parser.add_argument('--prune', action='store_true',
+                        help=f'Drop change log entries older than the newest {KEEP_VERSIONS} versions')
+    args = parser.parse_args()
+
+    if args.prune:
+        print(f"Pruned {prune_changes()} change log entries")
+
+    with get_connection() as conn:
+        version = conn.execute('SELECT version FROM data_version').fetchone()[0]
+        first = conn.execute('SELECT MIN(version) FROM data_changes').fetchone()[0]
+    print(f"Data version: {version} (log from version {first if first is not None else version})")
+
+    if args.since is not None:
+        for kind, item_ids in sorted(get_changes_since(args.since).items()):
+            print(f"  {kind}: {'all' if item_ids is ALL else len(item_ids)}")
@@ -8,7 +8,9 @@ import sys
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection
+from services.bulk import allocate_ids
+from services.writer import submit_write
 
 
 def get_category_based_curriculum():
@@ -16,7 +18,7 @@ def get_category_based_curriculum():
     Generate curriculum modules based on actual email categories.
     Creates learning paths from the 27 granular categories.
     """
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get all categories with at least 3 emails
@@ -105,20 +107,24 @@ def initialize_curriculum():
         # Get category-based curriculum
         curriculum = get_category_based_curriculum()
         
-        for module in curriculum:
-            cursor.execute('''
-                INSERT INTO modules (title, description, order_index, estimated_hours, topics_json)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
+        module_ids = allocate_ids(cursor, 'modules', len(curriculum))
+        cursor.executemany('''
+            INSERT INTO modules (id, title, description, order_index, estimated_hours, topics_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (
+                module_id,
                 module['title'],
                 module['description'],
                 module['order'],
                 module['estimated_hours'],
                 str([module['category']])
-            ))
-            module_id = cursor.lastrowid
-            
-            # Create lessons from emails in this category
+            )
+            for module_id, module in zip(module_ids, curriculum)
+        ])
+        
+        # Create lessons from emails in each category
+        for module_id, module in zip(module_ids, curriculum):
             create_lessons_for_category(cursor, module_id, module['category'], module['target_lessons'])
         
         conn.commit()
@@ -126,46 +132,163 @@ def initialize_curriculum():
         return len(curriculum)
 
 
-def create_lessons_for_category(cursor, module_id, category, max_lessons):
-    """Create lessons from emails in a specific category."""
+def lesson_text(email, idx, category):
+    """Title and content of the lesson built from one source email."""
+    # Create a rich lesson title
+    title = email['subject'][:80] if email['subject'] else f"Lesson {idx + 1}: {category}"
     
-    # Get emails in this category
+    # Use summary as lesson content (enriched data is fetched at runtime)
+    content = email['summary'] if email['summary'] else f"Learn about {category} concepts and applications."
+    return title, content
+
+
+def select_lesson_emails(cursor, category, max_lessons):
+    """The most recent emails in a category, one per lesson."""
     cursor.execute('''
         SELECT e.id, e.subject, e.summary, e.date_parsed
         FROM emails e
         JOIN email_categories ec ON e.id = ec.email_id
         WHERE ec.category = ?
         GROUP BY e.id
-        ORDER BY e.date_parsed DESC
+        ORDER BY e.date_ts DESC
         LIMIT ?
     ''', (category, max_lessons))
+    return cursor.fetchall()
+
+
+def create_lessons_for_category(cursor, module_id, category, max_lessons):
+    """Create lessons from emails in a specific category."""
     
-    emails = cursor.fetchall()
+    # Get emails in this category
+    emails = select_lesson_emails(cursor, category, max_lessons)
+    insert_lessons(cursor, module_id, category, list(enumerate(emails)))
+
+
+def insert_lessons(cursor, module_id, category, positioned_emails):
+    """Insert one lesson per (index, email) pair, linked to its source email."""
+    lesson_ids = allocate_ids(cursor, 'lessons', len(positioned_emails))
+    lesson_rows = []
+    for lesson_id, (idx, email) in zip(lesson_ids, positioned_emails):
+        title, content = lesson_text(email, idx, category)
+        lesson_rows.append((lesson_id, module_id, title, content, idx + 1))
     
+    cursor.executemany('''
+        INSERT INTO lessons (id, module_id, title, content, order_index)
+        VALUES (?, ?, ?, ?, ?)
+    ''', lesson_rows)
+    
+    # Link source emails
+    cursor.executemany('''
+        INSERT OR IGNORE INTO lesson_sources (lesson_id, email_id)
+        VALUES (?, ?)
+    ''', [(lesson_id, email['id']) for lesson_id, (_, email) in zip(lesson_ids, positioned_emails)])
+
+
+def delete_lessons(cursor, lesson_ids):
+    """Delete lessons together with their sources, quizzes and progress."""
+    if not lesson_ids:
+        return
+    placeholders = ','.join('?' * len(lesson_ids))
+    for table in ('lesson_sources', 'quiz_questions', 'user_progress'):
+        cursor.execute(f'DELETE FROM {table} WHERE lesson_id IN ({placeholders})', lesson_ids)
+    cursor.execute(f'DELETE FROM lessons WHERE id IN ({placeholders})', lesson_ids)
+
+
+def sync_lessons_for_category(cursor, module_id, category, max_lessons):
+    """Bring a module's lessons in line with the current emails in its category.
+
+    Lessons whose source email is still selected are kept, with their
+    quizzes and progress; the rest are replaced.
+    """
+    emails = select_lesson_emails(cursor, category, max_lessons)
+    cursor.execute('''
+        SELECT l.id, ls.email_id
+        FROM lessons l
+        LEFT JOIN lesson_sources ls ON ls.lesson_id = l.id
+        WHERE l.module_id = ?
+    ''', (module_id,))
+    existing = {}
+    stale = []
+    for row in cursor.fetchall():
+        if row['email_id'] is None or row['email_id'] in existing:
+            stale.append(row['id'])
+        else:
+            existing[row['email_id']] = row['id']
+
+    wanted = {email['id'] for email in emails}
+    stale.extend(lesson_id for email_id, lesson_id in existing.items() if email_id not in wanted)
+    delete_lessons(cursor, stale)
+
+    updates = []
+    new_lessons = []
     for idx, email in enumerate(emails):
-        # Create a rich lesson title
-        title = email['subject'][:80] if email['subject'] else f"Lesson {idx + 1}: {category}"
-        
-        # Use summary as lesson content (enriched data is fetched at runtime)
-        content = email['summary'] if email['summary'] else f"Learn about {category} concepts and applications."
-        
-        cursor.execute('''
-            INSERT INTO lessons (module_id, title, content, order_index)
-            VALUES (?, ?, ?, ?)
-        ''', (module_id, title, content, idx + 1))
-        
-        lesson_id = cursor.lastrowid
-        
-        # Link source email
-        cursor.execute('''
-            INSERT OR IGNORE INTO lesson_sources (lesson_id, email_id)
-            VALUES (?, ?)
-        ''', (lesson_id, email['id']))
+        if email['id'] in existing:
+            title, content = lesson_text(email, idx, category)
+            updates.append((title, content, idx + 1, existing[email['id']]))
+        else:
+            new_lessons.append((idx, email))
+    cursor.executemany('UPDATE lessons SET title = ?, content = ?, order_index = ? WHERE id = ?', updates)
+    insert_lessons(cursor, module_id, category, new_lessons)
+
+
+def refresh_curriculum(cursor, email_ids):
+    """Update only the modules whose category gained or lost `email_ids`.
+
+    Unlike initialize_curriculum this keeps lessons, quizzes and progress
+    that are unaffected. Runs inside the caller's transaction.
+    """
+    placeholders = ','.join('?' * len(email_ids))
+    cursor.execute(f'''
+        SELECT DISTINCT category FROM email_categories WHERE email_id IN ({placeholders})
+        UNION
+        SELECT DISTINCT m.title FROM lesson_sources ls
+        JOIN lessons l ON l.id = ls.lesson_id
+        JOIN modules m ON m.id = l.module_id
+        WHERE ls.email_id IN ({placeholders})
+    ''', email_ids + email_ids)
+    categories = [row[0] for row in cursor.fetchall()]
+    if not categories:
+        return 0
+
+    curriculum = {module['category']: module for module in get_category_based_curriculum()}
+    for category in categories:
+        module = curriculum.get(category)
+        cursor.execute('SELECT id FROM modules WHERE title = ?', (category,))
+        row = cursor.fetchone()
+
+        if module is None:
+            # Category fell below the module threshold
+            if row:
+                cursor.execute('SELECT id FROM lessons WHERE module_id = ?', (row['id'],))
+                delete_lessons(cursor, [r['id'] for r in cursor.fetchall()])
+                cursor.execute('DELETE FROM modules WHERE id = ?', (row['id'],))
+            continue
+
+        if row:
+            module_id = row['id']
+        else:
+            cursor.execute('''
+                INSERT INTO modules (title, description, order_index, estimated_hours, topics_json)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                module['title'],
+                module['description'],
+                module['order'],
+                module['estimated_hours'],
+                str([module['category']])
+            ))
+            module_id = cursor.lastrowid
+        sync_lessons_for_category(cursor, module_id, category, module['target_lessons'])
+
+    # Module order follows category size, which the new emails may have changed
+    cursor.executemany('UPDATE modules SET order_index = ? WHERE title = ?',
+                       [(module['order'], module['title']) for module in curriculum.values()])
+    return len(categories)
 
 
 def get_curriculum():
     """Get all modules with lesson counts."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -191,7 +314,8 @@ def get_curriculum():
 
 def get_module_details(module_id):
     """Get detailed module information including lessons."""
-    with get_connection() as conn:
+    # Progress is written by the app, so read it from the live database
+    with get_connection(readonly=True) as conn:
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM modules WHERE id = ?', (module_id,))
@@ -230,29 +354,32 @@ def get_module_details(module_id):
         }
 
 
+def record_lesson_progress(cursor, lesson_id, score):
+    """Write a completed-lesson progress row. Returns False if the lesson is gone."""
+    # Get module_id for the lesson
+    cursor.execute('SELECT module_id FROM lessons WHERE id = ?', (lesson_id,))
+    lesson = cursor.fetchone()
+    if not lesson:
+        return False
+    
+    cursor.execute('''
+        INSERT OR REPLACE INTO user_progress (lesson_id, module_id, status, score, completed_at)
+        VALUES (?, ?, 'completed', ?, ?)
+    ''', (lesson_id, lesson['module_id'], score, datetime.now().isoformat()))
+    return True
+
+
 def mark_lesson_complete(lesson_id, score=None):
     """Mark a lesson as complete and record progress."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Get module_id for the lesson
-        cursor.execute('SELECT module_id FROM lessons WHERE id = ?', (lesson_id,))
-        lesson = cursor.fetchone()
-        if not lesson:
-            return False
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_progress (lesson_id, module_id, status, score, completed_at)
-            VALUES (?, ?, 'completed', ?, ?)
-        ''', (lesson_id, lesson['module_id'], score, datetime.now().isoformat()))
-        
-        conn.commit()
-        return True
+    # Joins the shared writer's next batch instead of taking the write lock
+    # separately from the background jobs running in this process
+    return submit_write(record_lesson_progress, lesson_id, score).result()
 
 
 def get_user_progress_summary():
     """Get overall learning progress summary."""
-    with get_connection() as conn:
+    # Progress is written by the app, so read it from the live database
+    with get_connection(readonly=True) as conn:
         cursor = conn.cursor()
         
         # Total lessons
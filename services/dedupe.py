@@ -0,0 +1,132 @@
+"""
+Deduplication index for AI Knowledge Base.
+Stores Message-ID, normalized body and subject+date keys in SQLite so imports
+can check candidates without loading the existing corpus into memory.
+"""
+
+import os
+import sys
+import re
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection
+
+# Bodies shorter than this (after normalization) are too generic to dedupe on
+MIN_BODY_LENGTH = 64
+
+# Keys per IN (...) query, kept under SQLite's default variable limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def subject_date_hash(email):
+    """Legacy dedupe key: MD5 of lowercased subject + date."""
+    key = f"{email.get('subject', '')}{email.get('date', '')}".lower().strip()
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def normalize_body(text):
+    """Lowercase and collapse whitespace so trivially re-wrapped copies match."""
+    return re.sub(r'\s+', ' ', (text or '').lower()).strip()
+
+
+def email_dedupe_keys(email):
+    """Return the dedupe keys for a parsed email record, strongest first."""
+    keys = []
+
+    message_id = (email.get('message_id') or '').strip().lower()
+    if message_id:
+        keys.append(('message_id', 'mid:' + hashlib.sha1(message_id.encode()).hexdigest()))
+
+    body = normalize_body(email.get('content'))
+    if len(body) >= MIN_BODY_LENGTH:
+        keys.append(('body', 'body:' + hashlib.sha1(body.encode()).hexdigest()))
+
+    keys.append(('subject_date', 'sd:' + subject_date_hash(email)))
+    return keys
+
+
+def find_known_keys(cursor, keys):
+    """Return the subset of `keys` already present in the dedupe index."""
+    keys = list(keys)
+    known = set()
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        batch = keys[i:i + LOOKUP_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT key FROM dedupe_keys WHERE key IN ({placeholders})', batch)
+        known.update(row[0] for row in cursor.fetchall())
+    return known
+
+
+def filter_new_emails(cursor, emails, pending_keys=None):
+    """Split a batch of candidates into (new, duplicates) with one indexed lookup.
+
+    `pending_keys` holds keys of emails accepted earlier in this run but not
+    yet recorded; it is updated with the keys of the new emails returned.
+    """
+    if pending_keys is None:
+        pending_keys = set()
+
+    email_keys = [[key for _, key in email_dedupe_keys(email)] for email in emails]
+    known = find_known_keys(cursor, {key for keys in email_keys for key in keys})
+
+    new, duplicates = [], []
+    for email, keys in zip(emails, email_keys):
+        if any(key in known or key in pending_keys for key in keys):
+            duplicates.append(email)
+        else:
+            new.append(email)
+            pending_keys.update(keys)
+    return new, duplicates
+
+
+def record_dedupe_keys(cursor, emails):
+    """Add the dedupe keys of committed emails to the index."""
+    cursor.executemany(
+        'INSERT OR IGNORE INTO dedupe_keys (key, kind) VALUES (?, ?)',
+        [(key, kind) for email in emails for kind, key in email_dedupe_keys(email)]
+    )
+
+
+def get_dedupe_key_count():
+    """Get the number of keys in the dedupe index."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM dedupe_keys')
+        return cursor.fetchone()[0]
+
+
+def backfill_dedupe_index(emails):
+    """Seed the dedupe index from already-imported emails."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        record_dedupe_keys(cursor, emails)
+        conn.commit()
+    print(f"  Indexed dedupe keys for {len(emails)} existing emails")
+
+
+def prescan_known_offsets(cursor, filepath, start=0, end=None):
+    """Return byte offsets of messages whose headers already match the index.
+
+    Only Message-ID, Subject and Date are read, so known duplicates can be
+    skipped before their bodies are MIME-parsed. A header-level match implies
+    a full-record match, so nothing new is ever skipped.
+    """
+    from parse_mbox import iter_mbox_headers
+
+    known_offsets = set()
+    batch = []
+
+    def flush():
+        offset_keys = [(offset, [key for _, key in email_dedupe_keys(headers)]) for offset, headers in batch]
+        known = find_known_keys(cursor, {key for _, keys in offset_keys for key in keys})
+        known_offsets.update(offset for offset, keys in offset_keys if any(key in known for key in keys))
+        batch.clear()
+
+    for offset, headers in iter_mbox_headers(filepath, start, end):
+        batch.append((offset, headers))
+        if len(batch) >= LOOKUP_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return known_offsets
@@ -10,7 +10,9 @@ import struct
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection, fts_search
+from services.writer import submit_write, executemany_write
+from services.changes import record_changes, cached_until_changed, ALL
 
 
 def get_openai_client():
@@ -119,56 +121,87 @@ def generate_all_embeddings(limit=None):
     with get_connection() as conn:
         cursor = conn.cursor()
         
+        # Near-duplicates reuse an embedding already computed for their cluster
+        cursor.execute('''
+            UPDATE emails SET embedding = (
+                SELECT e2.embedding FROM emails e2
+                WHERE e2.cluster_id = emails.cluster_id AND e2.embedding IS NOT NULL
+                LIMIT 1
+            )
+            WHERE embedding IS NULL AND cluster_id IS NOT NULL
+              AND EXISTS (
+                SELECT 1 FROM emails e2
+                WHERE e2.cluster_id = emails.cluster_id AND e2.embedding IS NOT NULL
+              )
+        ''')
+        copied = cursor.rowcount
+        if copied:
+            record_changes(cursor, embeddings=ALL)
+        conn.commit()
+        if copied:
+            print(f"  Reused cluster embeddings for {copied} near-duplicate emails")
+        
         # Get emails without embeddings
         if limit:
             cursor.execute('''
-                SELECT id, subject, content, summary 
-                FROM emails 
+                SELECT id, subject, content, summary, cluster_id 
+                FROM emails_full 
                 WHERE embedding IS NULL
                 LIMIT ?
             ''', (limit,))
         else:
             cursor.execute('''
-                SELECT id, subject, content, summary 
-                FROM emails 
+                SELECT id, subject, content, summary, cluster_id 
+                FROM emails_full 
                 WHERE embedding IS NULL
             ''')
         
-        emails = cursor.fetchall()
+        rows = cursor.fetchall()
         
-        if not emails:
+        if not rows:
             print("All emails already have embeddings.")
-            return 0
+            return copied
         
-        print(f"Processing {len(emails)} emails...")
+        # Embed one representative per near-duplicate cluster
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['cluster_id'] or f"id:{row['id']}", []).append(row)
+        emails = [members[0] for members in groups.values()]
+        
+        print(f"Processing {len(emails)} emails ({len(rows) - len(emails)} near-duplicates share them)...")
         
         # Prepare texts for embedding
         texts = []
         for email in emails:
             # Combine subject + summary for embedding (more focused than full content)
-            text = f"{email['subject'] or ''}\n\n{email['summary'] or email['content'][:500] or ''}"
+            text = f"{email['subject'] or ''}\n\n{email['summary'] or (email['content'] or '')[:500]}"
             texts.append(text)
         
         # Generate embeddings in batches
         embeddings = embed_texts_batch(texts, client)
+    
+    # Store embeddings through the shared writer, which commits them in batches
+    updated = 0
+    pending = []
+    embedded_ids = []
+    for members, embedding in zip(groups.values(), embeddings):
+        if embedding:
+            blob = embedding_to_blob(embedding)
+            pending.append(executemany_write('''
+                UPDATE emails SET embedding = ? WHERE id = ?
+            ''', [(blob, member['id']) for member in members]))
+            updated += len(members)
+            embedded_ids.extend(member['id'] for member in members)
         
-        # Store embeddings
-        updated = 0
-        for email, embedding in zip(emails, embeddings):
-            if embedding:
-                blob = embedding_to_blob(embedding)
-                cursor.execute('''
-                    UPDATE emails SET embedding = ? WHERE id = ?
-                ''', (blob, email['id']))
-                updated += 1
-            
-            if updated % 100 == 0 and updated > 0:
-                print(f"  Progress: {updated}/{len(emails)} embeddings stored...")
-                conn.commit()
-        
-        conn.commit()
-        print(f"\n✅ Generated {updated} embeddings successfully!")
-        return updated
+        if updated % 100 < len(members) and updated > 0:
+            print(f"  Progress: {updated}/{len(rows)} embeddings queued...")
+    
+    # Logged after the embeddings it names, never before them
+    pending.append(submit_write(lambda cursor: record_changes(cursor, embeddings=embedded_ids)))
+    for future in pending:
+        future.result()
+    print(f"\n✅ Generated {updated} embeddings successfully!")
+    return copied + updated
 
 
 def semantic_search(query, limit=10):
@@ -183,7 +216,7 @@ def semantic_search(query, limit=10):
     if query_embedding is None:
         return keyword_search(query, limit)
     
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get all emails with embeddings
@@ -213,8 +246,10 @@ def semantic_search(query, limit=10):
         # Fetch links for top results (with enriched data)
         for r in results:
             cursor.execute('''
-                SELECT url, domain, title, description 
-                FROM email_links WHERE email_id = ? LIMIT 5
+                SELECT u.url, u.domain, u.title, u.description 
+                FROM email_links el
+                JOIN urls u ON u.id = el.url_id
+                WHERE el.email_id = ? LIMIT 5
             ''', (r['id'],))
             r['links'] = [{
                 'url': row['url'],
@@ -227,32 +262,27 @@ def semantic_search(query, limit=10):
 
 
 def keyword_search(query, limit=10):
-    """Fallback keyword search when embeddings unavailable."""
-    with get_connection() as conn:
+    """Full-text keyword search (bm25-ranked), also the fallback when
+    embeddings are unavailable."""
+    with get_read_connection() as conn:
         cursor = conn.cursor()
-        search_term = f'%{query}%'
-        
-        cursor.execute('''
-            SELECT id, subject, summary, date_parsed
-            FROM emails
-            WHERE subject LIKE ? OR content LIKE ? OR summary LIKE ?
-            ORDER BY date_parsed DESC
-            LIMIT ?
-        ''', (search_term, search_term, search_term, limit))
         
         results = []
-        for row in cursor.fetchall():
+        for row in fts_search(cursor, query, limit, 'e.id, e.subject, e.summary, e.date_parsed'):
             r = {
                 'id': row['id'],
                 'subject': row['subject'],
                 'summary': row['summary'],
+                'snippet': row['snippet'],
                 'date': row['date_parsed'][:10] if row['date_parsed'] else None,
                 'similarity': None  # Keyword search doesn't have similarity
             }
             # Fetch links with enriched data
             cursor.execute('''
-                SELECT url, domain, title, description 
-                FROM email_links WHERE email_id = ? LIMIT 5
+                SELECT u.url, u.domain, u.title, u.description 
+                FROM email_links el
+                JOIN urls u ON u.id = el.url_id
+                WHERE el.email_id = ? LIMIT 5
             ''', (row['id'],))
             r['links'] = [{
                 'url': link['url'],
@@ -265,9 +295,10 @@ def keyword_search(query, limit=10):
         return results
 
 
+@cached_until_changed('emails', 'embeddings')
 def get_embedding_stats():
     """Get statistics about embeddings in the database."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('SELECT COUNT(*) FROM emails')
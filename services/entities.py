@@ -6,11 +6,12 @@ Uses LLM to extract entities (tools, companies, concepts, people) from emails.
 import os
 import sys
 import json
-import re
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection
+from services.bulk import allocate_ids, lookup_ids, BulkInserter
+from services.changes import record_changes, ALL
 
 
 # Known entity patterns for quick extraction (no API needed)
@@ -70,19 +71,8 @@ KNOWN_ENTITIES = {
 
 def extract_entities_pattern(text):
     """Extract entities using pattern matching (no API needed)."""
-    text_lower = text.lower()
-    found = []
-    
-    for entity_name, entity_type in KNOWN_ENTITIES.items():
-        pattern = re.escape(entity_name.lower())
-        if re.search(r'\b' + pattern + r'\b', text_lower):
-            found.append({
-                'name': entity_name,
-                'type': entity_type,
-                'extraction_method': 'pattern'
-            })
-    
-    return found
+    from services.annotator import annotate_text
+    return annotate_text(text)['entities']
 
 
 def extract_entities_llm(text, openai_client=None):
@@ -152,7 +142,7 @@ def populate_entities_table(use_llm=False, batch_size=50):
         conn.commit()
         
         # Get all emails
-        cursor.execute('SELECT id, subject, content, date_parsed FROM emails')
+        cursor.execute('SELECT id, subject, content, date_ts FROM emails_full')
         emails = cursor.fetchall()
         
         entity_stats = {}  # name -> {type, first_seen, last_seen, count, email_ids}
@@ -175,15 +165,15 @@ def populate_entities_table(use_llm=False, batch_size=50):
             else:
                 entities = extract_entities_pattern(text)
             
-            date_parsed = email['date_parsed']
+            date_ts = email['date_ts']
             
             for entity in entities:
                 name = entity['name']
                 if name not in entity_stats:
                     entity_stats[name] = {
                         'type': entity['type'],
-                        'first_seen': date_parsed,
-                        'last_seen': date_parsed,
+                        'first_seen': date_ts,
+                        'last_seen': date_ts,
                         'count': 0,
                         'email_ids': []
                     }
@@ -191,36 +181,42 @@ def populate_entities_table(use_llm=False, batch_size=50):
                 entity_stats[name]['count'] += 1
                 entity_stats[name]['email_ids'].append(email['id'])
                 
-                if date_parsed:
-                    if entity_stats[name]['first_seen'] is None or date_parsed < entity_stats[name]['first_seen']:
-                        entity_stats[name]['first_seen'] = date_parsed
-                    if entity_stats[name]['last_seen'] is None or date_parsed > entity_stats[name]['last_seen']:
-                        entity_stats[name]['last_seen'] = date_parsed
+                if date_ts is not None:
+                    if entity_stats[name]['first_seen'] is None or date_ts < entity_stats[name]['first_seen']:
+                        entity_stats[name]['first_seen'] = date_ts
+                    if entity_stats[name]['last_seen'] is None or date_ts > entity_stats[name]['last_seen']:
+                        entity_stats[name]['last_seen'] = date_ts
             
             if (i + 1) % 100 == 0:
                 print(f"  Processed {i + 1}/{len(emails)} emails...")
         
-        # Insert entities
-        for name, stats in entity_stats.items():
-            cursor.execute('''
-                INSERT INTO entities (name, type, first_seen, last_seen, mention_count)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
+        # Insert entities, with ids allocated up front for their mappings;
+        # first/last seen are stored as UTC datetimes
+        entity_ids = allocate_ids(cursor, 'entities', len(entity_stats))
+        cursor.executemany('''
+            INSERT INTO entities (id, name, type, first_seen, last_seen, mention_count)
+            VALUES (?, ?, ?, DATETIME(?, 'unixepoch'), DATETIME(?, 'unixepoch'), ?)
+        ''', [
+            (
+                entity_id,
                 name,
                 stats['type'],
                 stats['first_seen'],
                 stats['last_seen'],
                 stats['count']
-            ))
-            entity_id = cursor.lastrowid
-            
-            # Insert email-entity mappings
-            for email_id in stats['email_ids']:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO email_entities (email_id, entity_id)
-                    VALUES (?, ?)
-                ''', (email_id, entity_id))
+            )
+            for entity_id, (name, stats) in zip(entity_ids, entity_stats.items())
+        ])
+        
+        # Insert email-entity mappings
+        with BulkInserter(cursor, '''
+            INSERT OR IGNORE INTO email_entities (email_id, entity_id)
+            VALUES (?, ?)
+        ''') as mappings:
+            for entity_id, stats in zip(entity_ids, entity_stats.values()):
+                mappings.extend((email_id, entity_id) for email_id in stats['email_ids'])
         
+        record_changes(cursor, entities=ALL)
         conn.commit()
         
         print(f"\n✅ Entity extraction complete!")
@@ -237,9 +233,51 @@ def populate_entities_table(use_llm=False, batch_size=50):
         return len(entity_stats)
 
 
+def update_email_entities(cursor, email_ids):
+    """Re-extract entities (pattern matching) for `email_ids` and refresh only
+    the entities involved. Runs inside the caller's transaction."""
+    placeholders = ','.join('?' * len(email_ids))
+    cursor.execute(f'SELECT DISTINCT entity_id FROM email_entities WHERE email_id IN ({placeholders})', email_ids)
+    entity_ids = {row[0] for row in cursor.fetchall()}
+    cursor.execute(f'DELETE FROM email_entities WHERE email_id IN ({placeholders})', email_ids)
+
+    cursor.execute(f'SELECT id, subject, content FROM emails_full WHERE id IN ({placeholders})', email_ids)
+    mentions = []
+    types = {}
+    for email in cursor.fetchall():
+        text = f"{email['subject'] or ''}\n{email['content'] or ''}"
+        for entity in extract_entities_pattern(text):
+            types.setdefault(entity['name'], entity['type'])
+            mentions.append((email['id'], entity['name']))
+
+    # One insert for new entities and one lookup for every name involved
+    cursor.executemany('INSERT OR IGNORE INTO entities (name, type) VALUES (?, ?)', list(types.items()))
+    ids = lookup_ids(cursor, 'entities', 'name', types)
+    entity_ids.update(ids.values())
+    cursor.executemany('INSERT OR IGNORE INTO email_entities (email_id, entity_id) VALUES (?, ?)',
+                       [(email_id, ids[name]) for email_id, name in mentions])
+
+    if not entity_ids:
+        return 0
+    entity_placeholders = ','.join('?' * len(entity_ids))
+    cursor.execute(f'''
+        UPDATE entities SET
+            mention_count = (SELECT COUNT(*) FROM email_entities ee WHERE ee.entity_id = entities.id),
+            first_seen = (SELECT DATETIME(MIN(e.date_ts), 'unixepoch') FROM email_entities ee
+                          JOIN emails e ON e.id = ee.email_id WHERE ee.entity_id = entities.id),
+            last_seen = (SELECT DATETIME(MAX(e.date_ts), 'unixepoch') FROM email_entities ee
+                         JOIN emails e ON e.id = ee.email_id WHERE ee.entity_id = entities.id)
+        WHERE id IN ({entity_placeholders})
+    ''', list(entity_ids))
+    cursor.execute(f'DELETE FROM entities WHERE id IN ({entity_placeholders}) AND mention_count = 0',
+                   list(entity_ids))
+    record_changes(cursor, entities=entity_ids)
+    return len(entity_ids)
+
+
 def get_entity_list(entity_type=None, limit=50):
     """Get list of entities, optionally filtered by type."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         if entity_type:
@@ -261,7 +299,7 @@ def get_entity_list(entity_type=None, limit=50):
 
 def get_entity_details(entity_name):
     """Get detailed information about an entity."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM entities WHERE name = ?', (entity_name,))
@@ -275,7 +313,7 @@ def get_entity_details(entity_name):
             FROM emails e
             JOIN email_entities ee ON e.id = ee.email_id
             WHERE ee.entity_id = ?
-            ORDER BY e.date_parsed DESC
+            ORDER BY e.date_ts DESC
             LIMIT 20
         ''', (entity['id'],))
         
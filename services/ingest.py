@@ -0,0 +1,137 @@
+"""
+Incremental SQLite ingest for AI Knowledge Base.
+Inserts new emails with their links and categories, and refreshes only the
+trend snapshots for the days they fall on.
+"""
+
+import os
+import sys
+import json
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.bodies import store_bodies
+from services.bulk import allocate_ids
+from services.urls import link_rows_for_email, insert_email_links
+from services.pipeline import mark_dirty
+from services.changes import record_changes
+
+
+# Newsletters arrive in bursts with identical Date headers, and a corpus has
+# far fewer distinct date strings than emails
+DATE_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_email_date(date_str):
+    """Parse email date string to datetime, with fallback. Memoized."""
+    if not date_str:
+        return None
+    try:
+        return parsedate_to_datetime(date_str)
+    except Exception:
+        # Try common date formats
+        formats = [
+            '%a, %d %b %Y %H:%M:%S %z',
+            '%Y-%m-%d %H:%M:%S',
+            '%d %b %Y %H:%M:%S',
+        ]
+        for fmt in formats:
+            try:
+                return datetime.strptime(date_str.strip(), fmt)
+            except ValueError:
+                continue
+        return None
+
+
+def email_timestamp(date_str):
+    """UTC epoch seconds for an email date string, or None if unparseable.
+
+    Dates without a zone are taken as UTC.
+    """
+    parsed = parse_email_date(date_str)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def insert_emails(cursor, emails):
+    """Insert parsed email records with their links and categories.
+
+    Bodies go to compressed storage, links are canonicalized and mapped to
+    shared `urls` rows, and the new emails are queued for every pipeline stage and logged as a data
+    change. Runs inside the caller's transaction; returns the new email ids.
+    """
+    email_ids = list(allocate_ids(cursor, 'emails', len(emails)))
+    email_rows = []
+    body_rows = []
+    link_rows = []
+    category_rows = []
+
+    for email_id, email in zip(email_ids, emails):
+        date_parsed = parse_email_date(email.get('date', ''))
+        email_rows.append((
+            email_id,
+            email.get('subject', ''),
+            email.get('date', ''),
+            date_parsed.isoformat() if date_parsed else None,
+            email_timestamp(email.get('date', '')),
+            email.get('from', ''),
+            email.get('summary', ''),
+            json.dumps(email.get('categories', [])),
+            email.get('cluster_id')
+        ))
+        body_rows.append((email_id, email.get('content', '')))
+        link_rows.extend(link_rows_for_email(email_id, email.get('links', [])))
+        category_rows.extend((email_id, category) for category in email.get('categories', []))
+
+    # Emails go first: storing a body indexes it through the emails_full view
+    cursor.executemany('''
+        INSERT INTO emails (id, subject, date, date_parsed, date_ts, sender, summary, original_categories, cluster_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', email_rows)
+    store_bodies(cursor, body_rows)
+    url_ids = insert_email_links(cursor, link_rows)
+    cursor.executemany('INSERT OR IGNORE INTO email_categories (email_id, category) VALUES (?, ?)', category_rows)
+    mark_dirty(cursor, email_ids)
+    record_changes(cursor, emails=email_ids, links=url_ids,
+                   categories={email_id for email_id, _ in category_rows})
+    return email_ids
+
+
+def refresh_trend_snapshots(cursor, email_ids):
+    """Recompute trend snapshots for the days touched by `email_ids` only."""
+    if not email_ids:
+        return
+    placeholders = ','.join('?' * len(email_ids))
+    cursor.execute(f'''
+        SELECT DISTINCT DATE(date_ts, 'unixepoch') FROM emails
+        WHERE id IN ({placeholders}) AND date_ts IS NOT NULL
+    ''', email_ids)
+    dates = [row[0] for row in cursor.fetchall()]
+    if not dates:
+        return
+
+    # Snapshot days are UTC days, so the affected emails are exactly those
+    # in [first day, last day + 1) that fall on one of `dates`
+    lo = int(datetime.fromisoformat(min(dates)).replace(tzinfo=timezone.utc).timestamp())
+    hi = int((datetime.fromisoformat(max(dates)) + timedelta(days=1)).replace(tzinfo=timezone.utc).timestamp())
+
+    date_placeholders = ','.join('?' * len(dates))
+    cursor.execute(f'DELETE FROM trend_snapshots WHERE date IN ({date_placeholders})', dates)
+    cursor.execute(f'''
+        INSERT INTO trend_snapshots (date, category, email_count)
+        SELECT
+            DATE(e.date_ts, 'unixepoch') as date,
+            ec.category,
+            COUNT(*) as email_count
+        FROM emails e
+        JOIN email_categories ec ON e.id = ec.email_id
+        WHERE e.date_ts >= ? AND e.date_ts < ?
+          AND DATE(e.date_ts, 'unixepoch') IN ({date_placeholders})
+        GROUP BY DATE(e.date_ts, 'unixepoch'), ec.category
+    ''', [lo, hi] + dates)
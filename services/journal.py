@@ -0,0 +1,69 @@
+"""
+Append-only JSONL journal for AI Knowledge Base.
+Records progress of long runs one line at a time, fsyncing in batches, so a
+crash loses at most the last unsynced batch instead of requiring the main
+store to be rewritten after every few items.
+"""
+
+import os
+import json
+import time
+
+SYNC_EVERY = 50
+SYNC_INTERVAL_SECONDS = 2.0
+
+
+class AppendJournal:
+    """Append JSON records to a file, fsyncing every `sync_every` records
+    or `sync_interval` seconds, whichever comes first."""
+
+    def __init__(self, path, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL_SECONDS):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.file = open(path, 'a', encoding='utf-8')
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk."""
+        if self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_journal(path):
+    """Yield records from a journal, ignoring a torn final line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Only the last write can be partial after a crash
+                continue
+
+
+def remove_journal(path):
+    """Delete a journal once its records have been merged into the main store."""
+    if os.path.exists(path):
+        os.remove(path)
@@ -12,6 +12,9 @@ from urllib.parse import urlparse
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import get_connection
+from services.urls import backfill_url_ids
+from services.writer import submit_write, flush_writes
+from services.changes import record_changes
 
 # Rate limiting
 REQUESTS_PER_SECOND = 1
@@ -151,8 +154,19 @@ def extract_twitter_info(url):
     return {'status': 'skipped', 'error': 'could not parse twitter url'}
 
 
-def enrich_single_link(link_id, url):
-    """Enrich a single link and update the database."""
+def store_link_metadata(cursor, values):
+    """Write fetched metadata to a canonical URL, shared by every email linking to it."""
+    cursor.execute('''
+        UPDATE urls 
+        SET title = ?, description = ?, content_excerpt = ?, 
+            fetch_status = ?, fetched_at = ?
+        WHERE id = ?
+    ''', values)
+    record_changes(cursor, links=[values[-1]])
+
+
+def enrich_single_link(url_id, url):
+    """Enrich a single canonical URL; every email linking to it sees the result."""
     domain = get_domain(url)
     
     # Handle Twitter/X links specially
@@ -172,22 +186,16 @@ def enrich_single_link(link_id, url):
         result = fetch_url_metadata(url)
     
     # Update database
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE email_links 
-            SET title = ?, description = ?, content_excerpt = ?, 
-                fetch_status = ?, fetched_at = ?
-            WHERE id = ?
-        ''', (
-            result.get('title'),
-            result.get('description'),
-            result.get('content_excerpt'),
-            result.get('status', 'failed'),
-            datetime.now().isoformat(),
-            link_id
-        ))
-        conn.commit()
+    values = (
+        result.get('title'),
+        result.get('description'),
+        result.get('content_excerpt'),
+        result.get('status', 'failed'),
+        datetime.now().isoformat(),
+        url_id
+    )
+    # Queued on the shared writer; enrich_pending_links flushes at the end
+    submit_write(store_link_metadata, values)
     
     return result
 
@@ -195,23 +203,29 @@ def enrich_single_link(link_id, url):
 def enrich_pending_links(limit=100, category=None):
     """
     Enrich links that haven't been fetched yet.
+    Each distinct canonical URL is fetched once, however many emails link to it.
     Optionally filter by email category.
     """
     with get_connection() as conn:
+        attached = backfill_url_ids(conn)
+        if attached:
+            print(f"Attached {attached} existing links to canonical URLs")
+        
         cursor = conn.cursor()
         
         if category:
             cursor.execute('''
-                SELECT el.id, el.url 
-                FROM email_links el
+                SELECT DISTINCT u.id, u.url 
+                FROM urls u
+                JOIN email_links el ON el.url_id = u.id
                 JOIN email_categories ec ON el.email_id = ec.email_id
-                WHERE (el.fetch_status = 'pending' OR el.fetch_status IS NULL)
+                WHERE (u.fetch_status = 'pending' OR u.fetch_status IS NULL)
                 AND ec.category = ?
                 LIMIT ?
             ''', (category, limit))
         else:
             cursor.execute('''
-                SELECT id, url FROM email_links 
+                SELECT id, url FROM urls 
                 WHERE fetch_status = 'pending' OR fetch_status IS NULL
                 LIMIT ?
             ''', (limit,))
@@ -223,11 +237,11 @@ def enrich_pending_links(limit=100, category=None):
     results = {'success': 0, 'failed': 0, 'skipped': 0}
     
     for i, link in enumerate(links):
-        link_id, url = link['id'], link['url']
+        url_id, url = link['id'], link['url']
         
         print(f"[{i+1}/{len(links)}] {url[:60]}...", end=' ')
         
-        result = enrich_single_link(link_id, url)
+        result = enrich_single_link(url_id, url)
         status = result.get('status', 'failed')
         results[status] = results.get(status, 0) + 1
         
@@ -237,28 +251,33 @@ def enrich_pending_links(limit=100, category=None):
         else:
             print(f"✗ {result.get('error', 'unknown')}")
     
+    flush_writes()
     return results
 
 
 def get_enrichment_stats():
-    """Get statistics about link enrichment progress."""
+    """Get statistics about link enrichment progress (per distinct URL)."""
     with get_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('SELECT COUNT(*) FROM email_links')
+        mentions = cursor.fetchone()[0]
+        
+        cursor.execute('SELECT COUNT(*) FROM urls')
         total = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM email_links WHERE fetch_status = 'success'")
+        cursor.execute("SELECT COUNT(*) FROM urls WHERE fetch_status = 'success'")
         success = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM email_links WHERE fetch_status = 'failed'")
+        cursor.execute("SELECT COUNT(*) FROM urls WHERE fetch_status = 'failed'")
         failed = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM email_links WHERE fetch_status = 'pending' OR fetch_status IS NULL")
+        cursor.execute("SELECT COUNT(*) FROM urls WHERE fetch_status = 'pending' OR fetch_status IS NULL")
         pending = cursor.fetchone()[0]
         
         return {
             'total_links': total,
+            'email_link_mentions': mentions,
             'enriched': success,
             'failed': failed,
             'pending': pending,
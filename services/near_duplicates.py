@@ -0,0 +1,182 @@
+"""
+Near-duplicate detection for AI Knowledge Base.
+Assigns each email a cluster ID using MinHash over word shingles of its
+normalized body, so re-sends, forwards and lightly edited variants share one
+cluster and downstream stages can collapse them.
+
+Each signature holds NUM_PERMUTATIONS minimum hash values; the fraction of
+positions two signatures agree on estimates the Jaccard similarity of their
+shingle sets. Signatures are split into BANDS bands (LSH), and emails that
+agree on a whole band are candidates, verified against SIMILARITY_THRESHOLD.
+"""
+
+import os
+import sys
+import re
+import random
+import struct
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection
+from services.bulk import allocate_ids
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SIMILARITY_THRESHOLD = 0.85
+
+# Bodies with fewer words than this are too generic to cluster on
+MIN_WORDS = 20
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# XOR with a fixed random mask acts as one hash permutation; seeded so
+# signatures stay comparable across runs
+_rng = random.Random(1729)
+PERMUTATION_MASKS = [_rng.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def body_shingle_hashes(text):
+    """64-bit hashes of the overlapping SHINGLE_SIZE-word shingles of a body."""
+    words = WORD_PATTERN.findall((text or '').lower())
+    if len(words) < MIN_WORDS:
+        return []
+    return list({_hash64(' '.join(words[i:i + SHINGLE_SIZE]))
+                 for i in range(len(words) - SHINGLE_SIZE + 1)})
+
+
+def minhash_signature(text):
+    """MinHash signature of `text`, or None if it is too short to fingerprint."""
+    hashes = body_shingle_hashes(text)
+    if not hashes:
+        return None
+    return [min(map(mask.__xor__, hashes)) for mask in PERMUTATION_MASKS]
+
+
+def estimated_similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def signature_bands(signature):
+    """One signed 64-bit bucket value per LSH band."""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'>{ROWS_PER_BAND}Q', *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def pack_signature(signature):
+    return struct.pack(f'>{NUM_PERMUTATIONS}Q', *signature)
+
+
+def unpack_signature(blob):
+    return list(struct.unpack(f'>{NUM_PERMUTATIONS}Q', blob))
+
+
+def new_cluster_id(signature):
+    """Name a new cluster after the signature of its first member."""
+    return hashlib.sha1(pack_signature(signature)).hexdigest()[:16]
+
+
+def find_cluster(cursor, signature, buckets):
+    """Cluster ID of the most similar indexed near-duplicate, or None."""
+    where = ' OR '.join('(band = ? AND bucket = ?)' for _ in buckets)
+    params = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+    cursor.execute(f'''
+        SELECT DISTINCT m.cluster_id, m.signature
+        FROM minhash_bands b JOIN email_minhashes m ON m.id = b.minhash_id
+        WHERE {where}
+    ''', params)
+    best = None
+    for row in cursor.fetchall():
+        similarity = estimated_similarity(signature, unpack_signature(row[1]))
+        if similarity >= SIMILARITY_THRESHOLD and (best is None or similarity > best[0]):
+            best = (similarity, row[0])
+    return best[1] if best else None
+
+
+def assign_clusters(cursor, emails):
+    """Set 'cluster_id' on each email and return the index entries to record.
+
+    Emails are matched against the index and against earlier emails in the
+    same batch. Emails too short to fingerprint get no cluster. Only reads
+    the database; pass the returned entries to record_clusters once the
+    batch is committed. Each entry is (signature, buckets, cluster_id, new).
+    """
+    entries = []
+    batch_buckets = {}
+
+    for email in emails:
+        signature = minhash_signature(email.get('content'))
+        if signature is None:
+            email.pop('cluster_id', None)
+            continue
+        buckets = signature_bands(signature)
+
+        cluster_id = None
+        best = SIMILARITY_THRESHOLD
+        for band, bucket in enumerate(buckets):
+            for other, other_cluster in batch_buckets.get((band, bucket), ()):
+                similarity = estimated_similarity(signature, other)
+                if similarity >= best:
+                    best, cluster_id = similarity, other_cluster
+        if cluster_id is None:
+            cluster_id = find_cluster(cursor, signature, buckets)
+        is_new = cluster_id is None
+        if is_new:
+            cluster_id = new_cluster_id(signature)
+
+        email['cluster_id'] = cluster_id
+        for band, bucket in enumerate(buckets):
+            batch_buckets.setdefault((band, bucket), []).append((signature, cluster_id))
+        entries.append((signature, buckets, cluster_id, is_new))
+    return entries
+
+
+def count_near_duplicates(entries):
+    """How many entries from assign_clusters joined an existing cluster."""
+    return sum(1 for entry in entries if not entry[3])
+
+
+def record_clusters(cursor, entries):
+    """Add signatures returned by assign_clusters to the index."""
+    minhash_ids = allocate_ids(cursor, 'email_minhashes', len(entries))
+    cursor.executemany(
+        'INSERT INTO email_minhashes (id, cluster_id, signature) VALUES (?, ?, ?)',
+        [(minhash_id, cluster_id, pack_signature(signature))
+         for minhash_id, (signature, _, cluster_id, _) in zip(minhash_ids, entries)]
+    )
+    cursor.executemany(
+        'INSERT INTO minhash_bands (band, bucket, minhash_id) VALUES (?, ?, ?)',
+        [(band, bucket, minhash_id)
+         for minhash_id, (_, buckets, _, _) in zip(minhash_ids, entries)
+         for band, bucket in enumerate(buckets)]
+    )
+
+
+def get_minhash_count():
+    """Get the number of signatures in the near-duplicate index."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM email_minhashes')
+        return cursor.fetchone()[0]
+
+
+def backfill_near_duplicate_index(emails):
+    """Cluster already-imported emails and seed the index with them."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        entries = assign_clusters(cursor, emails)
+        record_clusters(cursor, entries)
+        conn.commit()
+    clusters = len({email['cluster_id'] for email in emails if email.get('cluster_id')})
+    print(f"  Clustered {len(entries)} existing emails into {clusters} near-duplicate clusters")
@@ -0,0 +1,260 @@
+"""
+Incremental processing pipeline for AI Knowledge Base.
+Runs the post-ingest steps as stages of a dependency graph. Ingest marks each
+new email dirty for every stage; a stage processes only its dirty emails and
+then clears them, and stages whose dependencies have finished run
+concurrently. A failed stage keeps its emails dirty for the next run and
+its dependents are skipped. A stage that cannot run here at all (no API key)
+also keeps its emails dirty, but its dependents run on the data already
+there, e.g. the keyword categories assigned at ingest.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection, init_database
+
+# Emails handled per stage transaction; progress is kept between batches
+BATCH_SIZE = 500
+DEFAULT_WORKERS = 4
+LINK_ENRICH_LIMIT = 500
+
+
+class StageUnavailable(RuntimeError):
+    """A stage cannot run in this environment, e.g. without an API key."""
+
+
+def mark_dirty(cursor, email_ids, stages=None):
+    """Queue `email_ids` for the given stages (all stages by default)."""
+    stages = STAGES if stages is None else stages
+    cursor.executemany(
+        'INSERT OR IGNORE INTO pipeline_dirty (stage, email_id) VALUES (?, ?)',
+        [(stage, email_id) for stage in stages for email_id in email_ids]
+    )
+
+
+def get_dirty_ids(stage):
+    """Email ids waiting for `stage`, oldest first."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT email_id FROM pipeline_dirty WHERE stage = ? ORDER BY email_id', (stage,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def clear_dirty(cursor, stage, email_ids):
+    cursor.executemany(
+        'DELETE FROM pipeline_dirty WHERE stage = ? AND email_id = ?',
+        [(stage, email_id) for email_id in email_ids]
+    )
+
+
+def get_dirty_counts():
+    """{stage: number of emails waiting} for every stage."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT stage, COUNT(*) FROM pipeline_dirty GROUP BY stage')
+        counts = dict(cursor.fetchall())
+    return {stage: counts.get(stage, 0) for stage in STAGES}
+
+
+def mark_all_dirty(stages):
+    """Queue every email for `stages`, e.g. after changing extraction rules."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO pipeline_dirty (stage, email_id)
+            SELECT ?, id FROM emails
+        ''', [(stage,) for stage in stages])
+        conn.commit()
+
+
+def run_tools(email_ids):
+    from services.tools import update_tool_mentions
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        update_tool_mentions(cursor, email_ids)
+        clear_dirty(cursor, 'tools', email_ids)
+        conn.commit()
+
+
+def run_entities(email_ids):
+    from services.entities import update_email_entities
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        update_email_entities(cursor, email_ids)
+        clear_dirty(cursor, 'entities', email_ids)
+        conn.commit()
+
+
+def run_embeddings(email_ids):
+    from services.embeddings import get_openai_client, generate_all_embeddings
+    if get_openai_client() is None:
+        raise StageUnavailable('no OpenAI API key available')
+    # Embeds every email still missing one, which covers the dirty ones
+    generate_all_embeddings()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        clear_dirty(cursor, 'embeddings', email_ids)
+        conn.commit()
+
+
+def run_links(email_ids):
+    from services.link_enricher import enrich_pending_links
+    # New links are queued in `urls`; pages not reached within the limit
+    # stay pending there for the next run
+    enrich_pending_links(limit=LINK_ENRICH_LIMIT)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        clear_dirty(cursor, 'links', email_ids)
+        conn.commit()
+
+
+def run_categorize(email_ids):
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise StageUnavailable('OPENAI_API_KEY not set')
+    from openai import OpenAI
+    from scripts.recategorize_emails import recategorize
+    with get_connection() as conn:
+        recategorize(conn, OpenAI(api_key=api_key), email_ids)
+        cursor = conn.cursor()
+        # New categories change the trend counts and lesson selection
+        mark_dirty(cursor, email_ids, ['trends', 'curriculum'])
+        clear_dirty(cursor, 'categorize', email_ids)
+        conn.commit()
+
+
+def run_trends(email_ids):
+    from services.ingest import refresh_trend_snapshots
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        refresh_trend_snapshots(cursor, email_ids)
+        clear_dirty(cursor, 'trends', email_ids)
+        conn.commit()
+
+
+def run_curriculum(email_ids):
+    from services.curriculum import refresh_curriculum
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        refresh_curriculum(cursor, email_ids)
+        clear_dirty(cursor, 'curriculum', email_ids)
+        conn.commit()
+
+
+# Stage name -> (runner, stages it depends on, emails per call or None for all).
+# Categorization reads tool mentions and link titles; trends and the
+# curriculum are built from categories, and fall back to the ingest-time
+# keyword categories when categorization is unavailable.
+STAGES = {
+    'tools': (run_tools, (), BATCH_SIZE),
+    'entities': (run_entities, (), BATCH_SIZE),
+    'embeddings': (run_embeddings, (), None),
+    'links': (run_links, (), None),
+    'categorize': (run_categorize, ('tools', 'links'), BATCH_SIZE),
+    'trends': (run_trends, ('categorize',), BATCH_SIZE),
+    'curriculum': (run_curriculum, ('categorize',), BATCH_SIZE),
+}
+
+
+def run_stage(stage):
+    """Run one stage over its dirty emails. Returns the number processed."""
+    runner, _, batch_size = STAGES[stage]
+    email_ids = get_dirty_ids(stage)
+    if not email_ids:
+        print(f"  [{stage}] up to date")
+        return 0
+
+    started = time.monotonic()
+    batch_size = batch_size or len(email_ids)
+    for i in range(0, len(email_ids), batch_size):
+        runner(email_ids[i:i + batch_size])
+    print(f"  [{stage}] {len(email_ids)} emails in {time.monotonic() - started:.1f}s")
+    return len(email_ids)
+
+
+def run_pipeline(stages=None, workers=DEFAULT_WORKERS):
+    """Run `stages` (default: all) in dependency order, independent ones in parallel.
+
+    Dependencies outside `stages`, or unavailable in this environment, are
+    treated as satisfied. Returns
+    {stage: 'done' | 'unavailable' | 'failed' | 'skipped'}.
+    """
+    init_database()
+    selected = [stage for stage in STAGES if stages is None or stage in stages]
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while len(status) < len(selected):
+            for stage in selected:
+                if stage in status or stage in running.values():
+                    continue
+                deps = [dep for dep in STAGES[stage][1] if dep in selected]
+                if any(status.get(dep) in ('failed', 'skipped') for dep in deps):
+                    print(f"  [{stage}] skipped: depends on a stage that did not finish")
+                    status[stage] = 'skipped'
+                elif all(status.get(dep) in ('done', 'unavailable') for dep in deps):
+                    running[executor.submit(run_stage, stage)] = stage
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    future.result()
+                    status[stage] = 'done'
+                except StageUnavailable as e:
+                    print(f"  [{stage}] unavailable: {e}")
+                    status[stage] = 'unavailable'
+                except Exception as e:
+                    print(f"  [{stage}] failed: {e}")
+                    status[stage] = 'failed'
+
+    # Stages log their changes; keep that log from growing without bound
+    from services.changes import prune_changes
+    prune_changes()
+    return status
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Process new emails through every pipeline stage')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES),
+                        help='Only run these stages')
+    parser.add_argument('--skip', nargs='+', choices=list(STAGES), default=[],
+                        help='Leave these stages for a later run')
+    parser.add_argument('--all', action='store_true',
+                        help='Mark every email dirty for the selected stages first')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Number of stages run at once')
+    parser.add_argument('--status', action='store_true',
+                        help='Show how many emails each stage is waiting on')
+    parser.add_argument('--publish', action='store_true',
+                        help='Publish a new snapshot for the web app when done')
+    args = parser.parse_args()
+
+    init_database()
+    if args.status:
+        for stage, count in get_dirty_counts().items():
+            print(f"  {stage}: {count} pending")
+        sys.exit(0)
+
+    selected = [stage for stage in (args.stages or STAGES) if stage not in args.skip]
+    if args.all:
+        mark_all_dirty(selected)
+
+    print("Running pipeline...")
+    started = time.monotonic()
+    results = run_pipeline(selected, workers=args.workers)
+    print(f"\nPipeline finished in {time.monotonic() - started:.1f}s")
+    for stage, result in results.items():
+        print(f"  {stage}: {result}")
+
+    if args.publish:
+        from services.snapshots import publish_snapshot
+        print(f"\nPublished {publish_snapshot()}")
@@ -10,7 +10,7 @@ import random
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection
 
 
 def get_openai_client():
@@ -104,17 +104,16 @@ def store_quiz_questions(lesson_id, questions):
         # Clear existing questions for this lesson
         cursor.execute('DELETE FROM quiz_questions WHERE lesson_id = ?', (lesson_id,))
         
-        for i, q in enumerate(questions):
+        for q in questions:
             cursor.execute('''
-                INSERT INTO quiz_questions (lesson_id, question_text, options_json, correct_answer, explanation, order_index)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO quiz_questions (lesson_id, question, options, correct_answer, explanation)
+                VALUES (?, ?, ?, ?, ?)
             ''', (
                 lesson_id,
                 q['question'],
                 json.dumps(q['options']),
                 q['correct_answer'],
-                q.get('explanation', ''),
-                i + 1
+                q.get('explanation', '')
             ))
         
         conn.commit()
@@ -123,19 +122,20 @@ def store_quiz_questions(lesson_id, questions):
 
 def get_quiz_for_lesson(lesson_id):
     """Get quiz questions for a specific lesson."""
-    with get_connection() as conn:
+    # Quizzes are generated on demand by the app, so read the live database
+    with get_connection(readonly=True) as conn:
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT * FROM quiz_questions WHERE lesson_id = ? ORDER BY order_index
+            SELECT * FROM quiz_questions WHERE lesson_id = ? ORDER BY id
         ''', (lesson_id,))
         
         questions = []
         for row in cursor.fetchall():
             questions.append({
                 'id': row['id'],
-                'question': row['question_text'],
-                'options': json.loads(row['options_json']),
+                'question': row['question'],
+                'options': json.loads(row['options']),
                 'correct_answer': row['correct_answer'],
                 'explanation': row['explanation']
             })
@@ -187,7 +187,7 @@ def grade_quiz(lesson_id, answers):
 
 def generate_all_quizzes(force=False):
     """Generate quizzes for all lessons that don't have them."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         if force:
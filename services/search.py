@@ -5,9 +5,10 @@ Combines semantic search with AI-powered answer synthesis.
 
 import os
 import sys
+from datetime import datetime, timedelta, timezone
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_read_connection
 from services.embeddings import semantic_search, keyword_search, get_openai_client
 
 
@@ -145,7 +146,7 @@ def get_related_searches(query, limit=5):
         return []
     
     # Get entities from the result emails
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         email_ids = [r['id'] for r in results]
         placeholders = ','.join('?' * len(email_ids))
@@ -169,6 +170,27 @@ def get_related_searches(query, limit=5):
         ]
 
 
+def filter_timestamp(value, end_of_day=False):
+    """UTC epoch seconds for a date filter value, None if missing or invalid.
+
+    A bare date ('2025-01-31') with `end_of_day` gives the start of the next
+    day, so the whole day is included by an exclusive upper bound.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end_of_day and len(value) == 10:
+        parsed += timedelta(days=1)
+    elif end_of_day:
+        parsed += timedelta(seconds=1)
+    return int(parsed.timestamp())
+
+
 def search_with_filters(query, filters=None, limit=10):
     """
     Search with optional filters for category, date range, entity.
@@ -179,8 +201,10 @@ def search_with_filters(query, filters=None, limit=10):
         return base_results[:limit]
     
     filtered = []
+    date_from = filter_timestamp(filters.get('date_from'))
+    date_to = filter_timestamp(filters.get('date_to'), end_of_day=True)
     
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         for result in base_results:
@@ -196,21 +220,14 @@ def search_with_filters(query, filters=None, limit=10):
                     include = False
             
             # Date filter
-            if include and 'date_from' in filters:
-                cursor.execute('''
-                    SELECT date_parsed FROM emails WHERE id = ?
-                ''', (result['id'],))
+            if include and (date_from is not None or date_to is not None):
+                cursor.execute('SELECT date_ts FROM emails WHERE id = ?', (result['id'],))
                 row = cursor.fetchone()
-                if row and row['date_parsed'] and row['date_parsed'] < filters['date_from']:
-                    include = False
-            
-            if include and 'date_to' in filters:
-                cursor.execute('''
-                    SELECT date_parsed FROM emails WHERE id = ?
-                ''', (result['id'],))
-                row = cursor.fetchone()
-                if row and row['date_parsed'] and row['date_parsed'] > filters['date_to']:
-                    include = False
+                if row and row['date_ts'] is not None:
+                    if date_from is not None and row['date_ts'] < date_from:
+                        include = False
+                    if date_to is not None and row['date_ts'] >= date_to:
+                        include = False
             
             # Entity filter
             if include and 'entity' in filters:
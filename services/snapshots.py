@@ -0,0 +1,129 @@
+"""
+Published database snapshots for AI Knowledge Base.
+Ingestion deletes and rebuilds tables in the database while the web app is
+serving from it. Instead, the app reads a published snapshot: a consistent
+copy of the database taken with SQLite's backup API once an ingest run
+finishes, and never written again. Request handlers open it immutable, so
+they take no locks and never see a half-built table.
+
+Publishing swaps the `current.db` symlink to the new copy in one rename.
+Connections opened afterwards read the new snapshot; requests already
+running finish on the old one.
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import (
+    get_db_path, get_connection, get_snapshot_dir, get_serving_path, SERVING_LINK_NAME
+)
+
+# Snapshots kept on disk, the serving one included; older ones are deleted
+KEEP_SNAPSHOTS = 3
+
+
+def snapshot_prefix():
+    """File name prefix of this database's snapshots, e.g. 'knowledge-'."""
+    return os.path.splitext(os.path.basename(get_db_path()))[0] + '-'
+
+
+def list_snapshots():
+    """Paths of the published snapshots, oldest first."""
+    snapshot_dir = get_snapshot_dir()
+    if not os.path.isdir(snapshot_dir):
+        return []
+    prefix = snapshot_prefix()
+    return [os.path.join(snapshot_dir, name) for name in sorted(os.listdir(snapshot_dir))
+            if name.startswith(prefix) and name.endswith('.db')]
+
+
+def set_serving_snapshot(path):
+    """Point the web app at `path` (a snapshot file), or at the database itself if None."""
+    link = os.path.join(get_snapshot_dir(), SERVING_LINK_NAME)
+    if path is None:
+        if os.path.lexists(link):
+            os.remove(link)
+        return
+    # Build the new link beside the old one, then rename it over the old one
+    staging = f"{link}.{os.getpid()}"
+    if os.path.lexists(staging):
+        os.remove(staging)
+    os.symlink(os.path.basename(path), staging)
+    os.replace(staging, link)
+
+
+def prune_snapshots(keep=KEEP_SNAPSHOTS):
+    """Delete all but the newest `keep` snapshots, never the serving one.
+
+    Readers still holding a deleted snapshot open keep reading it until
+    they close it.
+    """
+    serving = get_serving_path()
+    removed = 0
+    for path in list_snapshots()[:-keep]:
+        if path != serving:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def publish_snapshot():
+    """Copy the database to a new snapshot and start serving it. Returns its path."""
+    snapshot_dir = get_snapshot_dir()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, f"{snapshot_prefix()}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.db")
+    staging = path + '.tmp'
+
+    with get_connection() as source:
+        target = sqlite3.connect(staging)
+        try:
+            # Reads one consistent state of the database; writers carry on
+            source.backup(target)
+            # An immutable reader never looks at a -wal file, so the
+            # snapshot must be a single self-contained file
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+
+    os.replace(staging, path)
+    set_serving_snapshot(path)
+    prune_snapshots()
+    return path
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Manage the database snapshots the web app serves')
+    parser.add_argument('--publish', action='store_true',
+                        help='Copy the database to a new snapshot and serve it')
+    parser.add_argument('--rollback', action='store_true',
+                        help='Serve the snapshot published before the current one')
+    parser.add_argument('--disable', action='store_true',
+                        help='Serve the database itself again')
+    args = parser.parse_args()
+
+    if args.publish:
+        print(f"Published {publish_snapshot()}")
+    elif args.rollback:
+        snapshots = list_snapshots()
+        serving = get_serving_path()
+        older = [path for path in snapshots if serving is None or path < serving]
+        if not older:
+            print("No earlier snapshot to roll back to.")
+        else:
+            set_serving_snapshot(older[-1])
+            print(f"Serving {older[-1]}")
+    elif args.disable:
+        set_serving_snapshot(None)
+        print("Serving the database directly.")
+
+    serving = get_serving_path()
+    print(f"\n=== Snapshots ===")
+    for path in list_snapshots():
+        marker = '*' if path == serving else ' '
+        print(f"  {marker} {os.path.basename(path)} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+    if serving is None:
+        print("  (serving the database directly)")
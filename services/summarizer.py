@@ -0,0 +1,306 @@
+"""
+Summary generation for AI Knowledge Base.
+Holds the summary prompt and runs requests on a thread pool under request-
+and token-per-minute limits, retrying rate-limited and server errors with
+jittered backoff. Results are cached by content, prompt version and model.
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection
+from services.summary_cache import (
+    summary_content_hash,
+    summary_cache_key,
+    get_cached_summaries,
+    store_summaries
+)
+
+SUMMARY_MODEL = "gpt-4.1-mini"
+
+# Bump whenever SUMMARY_SYSTEM_PROMPT or SUMMARY_PROMPT_TEMPLATE changes so
+# cached summaries from the old prompt are no longer reused
+SUMMARY_PROMPT_VERSION = 1
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes AI development newsletter emails. Be concise and informative."
+
+SUMMARY_PROMPT_TEMPLATE = """Based on the following email, write a concise 2-3 sentence summary that captures the main topic and key takeaways. If there are external links, infer their content from the URL patterns and how they're referenced in the email.
+
+Subject: {subject}
+
+Content:
+{content}
+
+External Links:
+{links_text}
+
+Write a helpful summary (2-3 sentences):"""
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 60.0
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+# Completion budget requested per summary plus a rough allowance for the
+# system message and chat framing
+SUMMARY_MAX_TOKENS = 150
+PROMPT_OVERHEAD_TOKENS = 100
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Cached summaries are written in batches of this many results
+CACHE_COMMIT_EVERY = 10
+
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """Shared OpenAI client; retries and backoff are handled by SummaryEngine."""
+    from openai import OpenAI
+    return OpenAI(
+        api_key=os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY"),
+        base_url=os.environ.get("AI_INTEGRATIONS_OPENAI_BASE_URL"),
+        max_retries=0
+    )
+
+
+def summary_inputs(email):
+    """The parts of an email the summary prompt is built from."""
+    return email.get('subject', ''), email.get('content', '')[:2000], email.get('links', [])[:10]
+
+
+def build_summary_prompt(email):
+    """Fill the summary prompt template for one email."""
+    subject, content, links = summary_inputs(email)
+    links_text = '\n'.join(links) if links else 'No external links'
+    return SUMMARY_PROMPT_TEMPLATE.format(subject=subject, content=content, links_text=links_text)
+
+
+def email_summary_key(email):
+    """Return (cache_key, content_hash) for an email under the current prompt and model.
+
+    Emails in a near-duplicate cluster share the cluster's key, so a re-send
+    or lightly edited variant reuses the first member's summary.
+    """
+    if email.get('cluster_id'):
+        content_hash = 'cluster:' + email['cluster_id']
+    else:
+        content_hash = summary_content_hash(*summary_inputs(email))
+    return summary_cache_key(content_hash, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL), content_hash
+
+
+def request_summary(email):
+    """Request an AI summary for one email; API errors propagate."""
+    response = get_openai_client().chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": build_summary_prompt(email)}
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.3
+    )
+    return response.choices[0].message.content.strip()
+
+
+def generate_summary(email):
+    """Generate AI summary for a single email, or None on error."""
+    try:
+        return request_summary(email)
+    except Exception as e:
+        print(f"Error generating summary: {e}")
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute`."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def estimate_summary_tokens(email):
+    """Rough token cost of one summary request (about 4 characters per token)."""
+    subject, content, links = summary_inputs(email)
+    chars = len(subject) + len(content) + sum(len(link) for link in links)
+    return chars // 4 + PROMPT_OVERHEAD_TOKENS + SUMMARY_MAX_TOKENS
+
+
+def is_retryable(error):
+    """True for rate limits, server errors and transient connection failures."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'RateLimitError')
+
+
+def retry_after_seconds(error):
+    """Server-suggested wait from a Retry-After header, if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class SummaryEngine:
+    """Summarize many emails concurrently within API rate limits.
+
+    `request_fn(email)` must return the summary text or raise the API error,
+    so the engine can tell retryable failures from permanent ones. With
+    `use_cache` the summary cache is consulted first and emails sharing the
+    same prompt input are summarized once.
+    """
+
+    def __init__(self, request_fn=None, concurrency=DEFAULT_CONCURRENCY,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES, use_cache=True):
+        self.request_fn = request_fn or request_summary
+        self.use_cache = use_cache
+        self.concurrency = max(1, concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.cooldown_until = 0.0
+        self.lock = threading.Lock()
+        self.retries = 0
+
+    def _wait_for_cooldown(self):
+        delay = self.cooldown_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _summarize(self, email):
+        """Worker: one email, retried with backoff. Returns text or None."""
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_cooldown()
+            self.requests.acquire()
+            self.tokens.acquire(estimate_summary_tokens(email))
+            try:
+                return self.request_fn(email)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    print(f"Error generating summary: {e}")
+                    return None
+                delay = retry_after_seconds(e) or backoff_delay(attempt)
+                with self.lock:
+                    self.retries += 1
+                    # A 429 means the shared quota is exhausted, so every
+                    # worker backs off rather than just this one.
+                    if getattr(e, 'status_code', None) == 429:
+                        self.cooldown_until = max(self.cooldown_until, time.monotonic() + delay)
+                time.sleep(delay)
+        return None
+
+    def run(self, emails, on_result=None):
+        """Summarize `emails` in place, setting each one's 'summary' field.
+
+        `on_result(email, summary)` is called from the calling thread as each
+        API request finishes (summary is None on failure), e.g. to checkpoint.
+        Cache hits are applied up front without a callback.
+        Returns (succeeded, failed).
+        """
+        if not self.use_cache:
+            groups = {id(email): (None, [email]) for email in emails}
+            return self._run_groups(groups, on_result, None)
+
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            groups = {}
+            for email in emails:
+                key, content_hash = email_summary_key(email)
+                groups.setdefault(key, (content_hash, []))[1].append(email)
+
+            succeeded = 0
+            cached = get_cached_summaries(cursor, groups)
+            for key, summary in cached.items():
+                for email in groups.pop(key)[1]:
+                    email['summary'] = summary
+                    succeeded += 1
+            if cached:
+                print(f"  Summary cache: {succeeded} of {len(emails)} emails already summarized")
+
+            ok, failed = self._run_groups(groups, on_result, conn)
+        return succeeded + ok, failed
+
+    def _run_groups(self, groups, on_result, conn):
+        """Request one summary per group and fan it out to the group's emails."""
+        total = sum(len(members) for _, members in groups.values())
+        done = succeeded = failed = 0
+        started = last_report = time.monotonic()
+        pending_rows = []
+
+        def flush():
+            if conn is not None and pending_rows:
+                store_summaries(conn.cursor(), pending_rows)
+                conn.commit()
+                pending_rows.clear()
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = {
+                executor.submit(self._summarize, members[0]): (key, content_hash, members)
+                for key, (content_hash, members) in groups.items()
+            }
+            for future in as_completed(futures):
+                key, content_hash, members = futures[future]
+                summary = future.result()
+                if summary and conn is not None:
+                    pending_rows.append((key, content_hash, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL, summary))
+                    if len(pending_rows) >= CACHE_COMMIT_EVERY:
+                        flush()
+                for email in members:
+                    email['summary'] = summary or ''
+                    if summary:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    if on_result:
+                        on_result(email, summary)
+                done += len(members)
+
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL_SECONDS or done == total:
+                    last_report = now
+                    rate = done / max(now - started, 1e-9)
+                    eta = (total - done) / rate if rate else 0
+                    print(f"  Progress: {done}/{total} ({succeeded} successful, {failed} failed, "
+                          f"{self.retries} retries) {rate:.1f}/s, ETA {eta:.0f}s")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            flush()
+
+        return succeeded, failed
@@ -0,0 +1,60 @@
+"""
+Summary cache for AI Knowledge Base.
+Stores generated summaries keyed by the hash of the normalized prompt input,
+the prompt template version and the model, so re-imports and re-sent
+newsletters reuse earlier results instead of calling the API again.
+"""
+
+import os
+import sys
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_connection
+from services.dedupe import normalize_body
+
+# Keys per IN (...) query, kept under SQLite's default variable limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def summary_content_hash(subject, content, links):
+    """SHA-1 of the normalized text a summary prompt is built from."""
+    text = '\n'.join([normalize_body(subject), normalize_body(content)] + list(links))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def summary_cache_key(content_hash, prompt_version, model):
+    """Cache key for one (content, prompt version, model) combination."""
+    return f"{model}:v{prompt_version}:{content_hash}"
+
+
+def get_cached_summaries(cursor, keys):
+    """Return {key: summary} for the keys already in the cache."""
+    keys = list(keys)
+    cached = {}
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        batch = keys[i:i + LOOKUP_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT cache_key, summary FROM summary_cache WHERE cache_key IN ({placeholders})', batch)
+        cached.update((row[0], row[1]) for row in cursor.fetchall())
+    return cached
+
+
+def store_summaries(cursor, rows):
+    """Insert (cache_key, content_hash, prompt_version, model, summary) rows."""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO summary_cache (cache_key, content_hash, prompt_version, model, summary)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def purge_stale_summaries(prompt_version, model):
+    """Drop cached summaries from other prompt versions or models."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'DELETE FROM summary_cache WHERE prompt_version != ? OR model != ?',
+            (prompt_version, model)
+        )
+        conn.commit()
+        return cursor.rowcount
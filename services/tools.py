@@ -5,12 +5,13 @@ Extracts and tracks mentions of AI tools, products, and platforms.
 
 import os
 import sys
-import re
 from datetime import datetime
 from collections import defaultdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import get_connection, get_read_connection
+from services.bulk import allocate_ids, lookup_ids, BulkInserter
+from services.changes import record_changes, cached_until_changed, ALL
 
 
 # Tool/Product dictionary with variations and categories
@@ -171,20 +172,8 @@ TOOLS_DICTIONARY = {
 
 def extract_tool_mentions(text):
     """Extract mentions of known tools from text."""
-    text_lower = text.lower()
-    mentions = []
-    
-    for tool_name, tool_info in TOOLS_DICTIONARY.items():
-        for pattern in tool_info['patterns']:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                mentions.append({
-                    'name': tool_name,
-                    'category': tool_info['category'],
-                    'company': tool_info['company']
-                })
-                break  # Only count once per tool
-    
-    return mentions
+    from services.annotator import annotate_text
+    return annotate_text(text)['tools']
 
 
 def populate_tools_table():
@@ -199,7 +188,7 @@ def populate_tools_table():
         cursor.execute('DELETE FROM tools')
         
         # Get all emails
-        cursor.execute('SELECT id, subject, content, date_parsed FROM emails')
+        cursor.execute('SELECT id, subject, content, date_ts FROM emails_full')
         emails = cursor.fetchall()
         
         tool_stats = defaultdict(lambda: {
@@ -212,7 +201,7 @@ def populate_tools_table():
         for email in emails:
             text = f"{email['subject'] or ''} {email['content'] or ''}"
             mentions = extract_tool_mentions(text)
-            date_parsed = email['date_parsed']
+            date_ts = email['date_ts']
             
             for mention in mentions:
                 tool_name = mention['name']
@@ -221,34 +210,40 @@ def populate_tools_table():
                 tool_stats[tool_name]['category'] = mention['category']
                 tool_stats[tool_name]['company'] = mention['company']
                 
-                if date_parsed:
-                    if tool_stats[tool_name]['first_mention'] is None or date_parsed < tool_stats[tool_name]['first_mention']:
-                        tool_stats[tool_name]['first_mention'] = date_parsed
-                    if tool_stats[tool_name]['last_mention'] is None or date_parsed > tool_stats[tool_name]['last_mention']:
-                        tool_stats[tool_name]['last_mention'] = date_parsed
+                if date_ts is not None:
+                    if tool_stats[tool_name]['first_mention'] is None or date_ts < tool_stats[tool_name]['first_mention']:
+                        tool_stats[tool_name]['first_mention'] = date_ts
+                    if tool_stats[tool_name]['last_mention'] is None or date_ts > tool_stats[tool_name]['last_mention']:
+                        tool_stats[tool_name]['last_mention'] = date_ts
         
-        # Insert tools
-        for tool_name, stats in tool_stats.items():
-            cursor.execute('''
-                INSERT INTO tools (name, normalized_name, category, first_mention, last_mention, mention_count)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+        # Insert tools, with ids allocated up front for their mentions;
+        # first/last mention are stored as UTC datetimes
+        tool_ids = allocate_ids(cursor, 'tools', len(tool_stats))
+        cursor.executemany('''
+            INSERT INTO tools (id, name, normalized_name, category, first_mention, last_mention, mention_count)
+            VALUES (?, ?, ?, ?, DATETIME(?, 'unixepoch'), DATETIME(?, 'unixepoch'), ?)
+        ''', [
+            (
+                tool_id,
                 tool_name,
                 tool_name.lower().replace(' ', '_'),
                 stats['category'],
                 stats['first_mention'],
                 stats['last_mention'],
                 stats['count']
-            ))
-            tool_id = cursor.lastrowid
-            
-            # Insert tool mentions
-            for email_id in stats['email_ids']:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO tool_mentions (email_id, tool_id)
-                    VALUES (?, ?)
-                ''', (email_id, tool_id))
+            )
+            for tool_id, (tool_name, stats) in zip(tool_ids, tool_stats.items())
+        ])
         
+        # Insert tool mentions
+        with BulkInserter(cursor, '''
+            INSERT OR IGNORE INTO tool_mentions (email_id, tool_id)
+            VALUES (?, ?)
+        ''') as mentions:
+            for tool_id, stats in zip(tool_ids, tool_stats.values()):
+                mentions.extend((email_id, tool_id) for email_id in stats['email_ids'])
+        
+        record_changes(cursor, tools=ALL)
         conn.commit()
         
         print(f"   Found {len(tool_stats)} unique tools")
@@ -257,9 +252,57 @@ def populate_tools_table():
         return len(tool_stats)
 
 
+def update_tool_mentions(cursor, email_ids):
+    """Re-scan `email_ids` for tool mentions and refresh only the tools involved.
+
+    Runs inside the caller's transaction. Tools left without mentions are
+    removed, matching what populate_tools_table would produce.
+    """
+    placeholders = ','.join('?' * len(email_ids))
+    cursor.execute(f'SELECT DISTINCT tool_id FROM tool_mentions WHERE email_id IN ({placeholders})', email_ids)
+    tool_ids = {row[0] for row in cursor.fetchall()}
+    cursor.execute(f'DELETE FROM tool_mentions WHERE email_id IN ({placeholders})', email_ids)
+
+    cursor.execute(f'SELECT id, subject, content FROM emails_full WHERE id IN ({placeholders})', email_ids)
+    mentions = []
+    categories = {}
+    for email in cursor.fetchall():
+        text = f"{email['subject'] or ''} {email['content'] or ''}"
+        for mention in extract_tool_mentions(text):
+            categories.setdefault(mention['name'], mention['category'])
+            mentions.append((email['id'], mention['name']))
+
+    # One insert for new tools and one lookup for every name involved
+    cursor.executemany('''
+        INSERT OR IGNORE INTO tools (name, normalized_name, category)
+        VALUES (?, ?, ?)
+    ''', [(name, name.lower().replace(' ', '_'), category) for name, category in categories.items()])
+    ids = lookup_ids(cursor, 'tools', 'name', categories)
+    tool_ids.update(ids.values())
+    cursor.executemany('INSERT OR IGNORE INTO tool_mentions (email_id, tool_id) VALUES (?, ?)',
+                       [(email_id, ids[name]) for email_id, name in mentions])
+
+    if not tool_ids:
+        return 0
+    tool_placeholders = ','.join('?' * len(tool_ids))
+    cursor.execute(f'''
+        UPDATE tools SET
+            mention_count = (SELECT COUNT(*) FROM tool_mentions tm WHERE tm.tool_id = tools.id),
+            first_mention = (SELECT DATETIME(MIN(e.date_ts), 'unixepoch') FROM tool_mentions tm
+                             JOIN emails e ON e.id = tm.email_id WHERE tm.tool_id = tools.id),
+            last_mention = (SELECT DATETIME(MAX(e.date_ts), 'unixepoch') FROM tool_mentions tm
+                            JOIN emails e ON e.id = tm.email_id WHERE tm.tool_id = tools.id)
+        WHERE id IN ({tool_placeholders})
+    ''', list(tool_ids))
+    cursor.execute(f'DELETE FROM tools WHERE id IN ({tool_placeholders}) AND mention_count = 0', list(tool_ids))
+    record_changes(cursor, tools=tool_ids)
+    return len(tool_ids)
+
+
+@cached_until_changed('tools')
 def get_tool_rankings(limit=20):
     """Get tools ranked by mention count."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT name, category, mention_count, first_mention, last_mention
@@ -282,7 +325,7 @@ def get_tool_rankings(limit=20):
 
 def get_tool_comparison():
     """Get tool comparison matrix data for the dashboard."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         # Get tools with recent activity
@@ -315,7 +358,7 @@ def get_tool_comparison():
 
 def get_tools_by_category():
     """Get tools grouped by category."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT category, name, mention_count
@@ -335,7 +378,7 @@ def get_tools_by_category():
 
 def get_tool_details(tool_name):
     """Get detailed information about a specific tool."""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM tools WHERE name = ?', (tool_name,))
@@ -350,7 +393,7 @@ def get_tool_details(tool_name):
             JOIN tool_mentions tm ON e.id = tm.email_id
             JOIN tools t ON tm.tool_id = t.id
             WHERE t.name = ?
-            ORDER BY e.date_parsed DESC
+            ORDER BY e.date_ts DESC
             LIMIT 20
         ''', (tool_name,))
         
@@ -0,0 +1,219 @@
+"""
+URL canonicalization for AI Knowledge Base.
+Reduces the many spellings of one page (tracking parameters, redirector
+wrappers, host/scheme variants) to a single canonical URL. Each page is
+stored once in the `urls` table, keyed by its canonical URL, and shared by
+every email that links to it. The canonical form is only a dedupe key; the
+first spelling seen is kept as the URL that is fetched and shown.
+"""
+
+import os
+import sys
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, unquote_plus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.changes import record_changes
+
+# Query parameters that only identify the campaign or click, never the page
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'twclid',
+    'mc_cid', 'mc_eid', '_hsenc', '_hsmi', 'mkt_tok', 'igshid', 'ref_src',
+    'ref_url', 'oly_anon_id', 'oly_enc_id', 'vero_id', 'rb_clickid', 's_cid',
+    'ck_subscriber_id', 'trk', 'trkcampaign', 'lipi', 'rcm',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+# Share-sheet parameters that are only tracking on specific hosts
+HOST_TRACKING_PARAMS = {
+    'x.com': {'s', 't'},
+    'twitter.com': {'s', 't'},
+    'youtube.com': {'si', 'feature'},
+    'youtu.be': {'si', 'feature'},
+    'linkedin.com': {'trackingid', 'refid'},
+    'open.spotify.com': {'si'},
+}
+
+# Redirector endpoints that carry the real destination in a query parameter
+REDIRECTORS = {
+    ('google.com', '/url'): ('q', 'url'),
+    ('l.facebook.com', '/l.php'): ('u',),
+    ('lm.facebook.com', '/l.php'): ('u',),
+    ('l.instagram.com', '/'): ('u',),
+    ('youtube.com', '/redirect'): ('q',),
+    ('out.reddit.com', None): ('url',),
+    ('slack-redir.net', '/link'): ('url',),
+    ('linkedin.com', '/redir/redirect'): ('url',),
+}
+SAFELINKS_SUFFIX = '.safelinks.protection.outlook.com'
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+MAX_UNWRAP_DEPTH = 3
+
+
+def _normalize_host(netloc, scheme):
+    """Lowercase host, drop credentials, trailing dot, www and scheme's default port."""
+    host = netloc.rsplit('@', 1)[-1].lower()
+    port = None
+    if host.count(':') == 1:
+        host, port = host.split(':')
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS[scheme]:
+        return f'{host}:{port}'
+    return host
+
+
+def _redirect_target(host, path, params):
+    """Destination URL wrapped by a known redirector, or None."""
+    if host.endswith(SAFELINKS_SUFFIX):
+        keys = ('url',)
+    else:
+        keys = REDIRECTORS.get((host, path)) or REDIRECTORS.get((host, None))
+    if not keys:
+        return None
+    values = dict(params)
+    for key in keys:
+        target = values.get(key, '')
+        if target.startswith(('http://', 'https://')):
+            return target
+    return None
+
+
+def canonicalize_url(url):
+    """Canonical form of `url`, or None if it is not an http(s) URL.
+
+    Unwraps known redirectors, upgrades http to https, lowercases the host
+    and drops www and the scheme's own default port, removes tracking
+    parameters and the fragment, and sorts the remaining query parameters,
+    which keep their original encoding. The result identifies the page but
+    is not necessarily fetchable.
+    """
+    url = (url or '').strip()
+    for _ in range(MAX_UNWRAP_DEPTH + 1):
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return None
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.netloc:
+            return None
+
+        host = _normalize_host(parts.netloc, scheme)
+        path = parts.path or '/'
+        params = parse_qsl(parts.query, keep_blank_values=True)
+
+        target = _redirect_target(host, path, params)
+        if target is None:
+            break
+        url = target
+
+    host_params = HOST_TRACKING_PARAMS.get(host, set())
+    kept = []
+    for param in parts.query.split('&'):
+        key = unquote_plus(param.split('=', 1)[0]).lower()
+        if param and key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES) \
+                and key not in host_params:
+            kept.append(param)
+    return urlunsplit(('https', host, path, '&'.join(sorted(kept)), ''))
+
+
+def url_domain(canonical_url):
+    """Domain of a canonical URL (host without port)."""
+    return urlsplit(canonical_url).hostname
+
+
+def get_url_ids(cursor, urls):
+    """Insert any new pages and return {canonical_url: id} for all of them.
+
+    `urls` maps each canonical URL to a spelling of it; a new page keeps
+    that spelling as its `url`, an existing one keeps the spelling it has.
+    """
+    cursor.executemany(
+        'INSERT OR IGNORE INTO urls (canonical_url, url, domain) VALUES (?, ?, ?)',
+        [(canonical, url, url_domain(canonical)) for canonical, url in urls.items()]
+    )
+    canonicals = list(urls)
+    ids = {}
+    for i in range(0, len(canonicals), 500):
+        batch = canonicals[i:i + 500]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(f'SELECT id, canonical_url FROM urls WHERE canonical_url IN ({placeholders})', batch)
+        ids.update((row[1], row[0]) for row in cursor.fetchall())
+    return ids
+
+
+def link_rows_for_email(email_id, links):
+    """(email_id, canonical_url, url) triples for an email, one per distinct
+    page, with the first spelling of each page in the email."""
+    seen = set()
+    rows = []
+    for link in links:
+        canonical = canonicalize_url(link)
+        if canonical and canonical not in seen:
+            seen.add(canonical)
+            rows.append((email_id, canonical, link.strip()))
+    return rows
+
+
+def first_spellings(pairs):
+    """{canonical_url: url} keeping the first url seen for each canonical URL."""
+    spellings = {}
+    for canonical, url in pairs:
+        spellings.setdefault(canonical, url)
+    return spellings
+
+
+def insert_email_links(cursor, link_rows):
+    """Insert email_links rows for (email_id, canonical_url, url) triples.
+
+    Rows only map an email to its `urls` entry, which holds the page's
+    metadata, so a page enriched once serves every email.
+    Returns the ids of the URLs linked to.
+    """
+    url_ids = get_url_ids(cursor, first_spellings((canonical, url) for _, canonical, url in link_rows))
+    cursor.executemany(
+        'INSERT OR IGNORE INTO email_links (email_id, url_id) VALUES (?, ?)',
+        [(email_id, url_ids[canonical]) for email_id, canonical, _ in link_rows]
+    )
+    return set(url_ids.values())
+
+
+def backfill_url_ids(conn):
+    """Attach links stored in the pre-urls layout to canonical URLs.
+
+    init_database renames the old email_links table, which kept a copy of
+    the page on every row, to email_links_legacy. Its rows become
+    (email_id, url_id) mappings, metadata already fetched for a link is
+    carried over to its URL so it is not fetched again, and the old table
+    is dropped. Links that are not http(s) URLs are dropped with it.
+    Returns the number of links attached.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'email_links_legacy'")
+    if cursor.fetchone() is None:
+        return 0
+    cursor.execute('''
+        SELECT email_id, url, title, description, content_excerpt, fetch_status, fetched_at
+        FROM email_links_legacy
+    ''')
+    links = [(link, canonicalize_url(link['url'])) for link in cursor.fetchall()]
+    links = [(link, url) for link, url in links if url]
+    url_ids = get_url_ids(cursor, first_spellings((url, link['url'].strip()) for link, url in links))
+
+    cursor.executemany('''
+        UPDATE urls SET title = ?, description = ?, content_excerpt = ?, fetch_status = ?, fetched_at = ?
+        WHERE id = ? AND (fetch_status = 'pending' OR fetch_status IS NULL)
+    ''', [
+        (link['title'], link['description'], link['content_excerpt'], link['fetch_status'],
+         link['fetched_at'], url_ids[url])
+        for link, url in links if link['fetch_status'] and link['fetch_status'] != 'pending'
+    ])
+    cursor.executemany(
+        'INSERT OR IGNORE INTO email_links (email_id, url_id) VALUES (?, ?)',
+        [(link['email_id'], url_ids[url]) for link, url in links]
+    )
+    cursor.execute('DROP TABLE email_links_legacy')
+    record_changes(cursor, links=set(url_ids.values()))
+    conn.commit()
+    return len(links)
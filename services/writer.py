@@ -0,0 +1,161 @@
+"""
+Single database writer for AI Knowledge Base.
+Background jobs (link enrichment, embeddings, categorization) and web
+progress updates submit their writes here instead of committing on their
+own. One thread applies them, grouping whatever is queued into a single
+transaction, so the write lock is taken once per batch rather than once
+per row and readers see far fewer commits.
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_db_path, open_connection
+
+# Jobs waiting beyond this block their submitters until the writer catches up
+QUEUE_SIZE = 1000
+# A transaction closes after this many jobs or this long after its first job
+MAX_BATCH_JOBS = 500
+BATCH_WINDOW_SECONDS = 0.05
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """Apply submitted write jobs on one thread in grouped transactions.
+
+    A job is `fn(cursor, *args)` and must not commit. Each runs inside its
+    own savepoint, so a failing job is rolled back and reported through its
+    future without affecting the rest of the batch.
+    """
+
+    def __init__(self, path, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.pid = os.getpid()
+        self.transactions = 0
+        self.applied = 0
+        # Opened here so a bad path fails the caller instead of the thread
+        self.conn = open_connection(path)
+        self.conn.isolation_level = None  # transactions are managed explicitly
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args):
+        """Queue a write job; blocks while the queue is full. Returns a Future."""
+        future = Future()
+        self.jobs.put((future, fn, args))
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until every job submitted so far is committed."""
+        self.submit(lambda cursor: None).result(timeout)
+
+    def close(self):
+        """Commit outstanding jobs and stop the writer thread."""
+        if self.thread.is_alive():
+            self.jobs.put(_STOP)
+            self.thread.join()
+
+    def _next_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+        while len(batch) < MAX_BATCH_JOBS and batch[-1] is not _STOP:
+            try:
+                batch.append(self.jobs.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self.conn
+        cursor = conn.cursor()
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+
+            done = []
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                for future, fn, args in batch:
+                    cursor.execute('SAVEPOINT job')
+                    try:
+                        result = fn(cursor, *args)
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO job')
+                        cursor.execute('RELEASE job')
+                        print(f"Database write failed: {e}")
+                        future.set_exception(e)
+                        continue
+                    cursor.execute('RELEASE job')
+                    done.append((future, result))
+                cursor.execute('COMMIT')
+            except sqlite3.Error as e:
+                # The transaction itself failed (e.g. the lock timed out)
+                if conn.in_transaction:
+                    conn.rollback()
+                print(f"Database write batch failed: {e}")
+                for future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.transactions += 1
+            self.applied += len(done)
+            for future, result in done:
+                future.set_result(result)
+        conn.close()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer():
+    """The writer for the current database, started on first use."""
+    path = get_db_path()
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None or writer.pid != os.getpid():
+            writer = _writers[path] = DatabaseWriter(path)
+        return writer
+
+
+def submit_write(fn, *args):
+    """Queue `fn(cursor, *args)` on the shared writer. Returns a Future."""
+    return get_writer().submit(fn, *args)
+
+
+def execute_write(sql, params=()):
+    """Queue a single statement. Returns a Future of the cursor's rowcount."""
+    return submit_write(lambda cursor: cursor.execute(sql, params).rowcount)
+
+
+def executemany_write(sql, rows):
+    """Queue a statement for many parameter rows. Returns a Future."""
+    rows = list(rows)
+    return submit_write(lambda cursor: cursor.executemany(sql, rows).rowcount)
+
+
+def flush_writes(timeout=None):
+    """Wait until all queued writes for the current database are committed."""
+    get_writer().flush(timeout)
+
+
+@atexit.register
+def close_writers():
+    """Commit anything still queued before the process exits."""
+    with _writers_lock:
+        writers = [w for w in _writers.values() if w.pid == os.getpid()]
+    for writer in writers:
+        writer.close()